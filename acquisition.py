@@ -0,0 +1,96 @@
+## @file acquisition.py
+# Définition de la classe Acquisition. Elle exécute la lecture des capteurs en parallèle avec une échéance commune et une annulation coopérative.
+##
+
+from queue import Queue, Empty
+from threading import Thread, Event
+from time import monotonic
+
+## Classe Acquisition.
+# Cette classe lance chaque lecture de capteur dans un thread et récupère les résultats dès qu'ils arrivent.
+# Dès que chaque grandeur requise a au moins une mesure valide, ou à l'échéance, les lectures encore en cours sont annulées :
+# le temps d'éveil est borné par le capteur valide le plus lent plutôt que par la somme des délais de chaque capteur.
+# Une lecture est une fonction qui reçoit l'instance Acquisition, interroge running() entre deux essais, attend avec wait() et renvoie la liste de ses mesures.
+class Acquisition:
+
+    ## Constructeur.
+    # @param logger Logger principal.
+    # @param timeout Temps maximal de l'acquisition en secondes, commun à toutes les lectures.
+    def __init__(self, logger, timeout):
+        ## Logger principal.
+        self.logger = logger
+        ## Instant de début de l'acquisition.
+        self.start_time = monotonic()
+        ## Échéance commune à toutes les lectures.
+        self.deadline = self.start_time + timeout
+        ## Événement d'annulation des lectures.
+        self.cancelled = Event()
+        ## File des résultats (nom, mesures) des lectures terminées.
+        self.queue = Queue()
+        ## Noms des lectures lancées et pas encore terminées.
+        self.pending = set()
+        ## Noms des grandeurs requises pour terminer l'acquisition avant l'échéance.
+        self.required = set()
+        ## Mesures reçues, indexées par nom de lecture.
+        self.results = {}
+
+    ## Indique si une lecture doit continuer.
+    # @return Retourne False si l'acquisition est annulée ou si l'échéance est dépassée.
+    def running(self):
+        return not self.cancelled.is_set() and monotonic() < self.deadline
+
+    ## Renvoie le temps restant avant l'échéance.
+    # @return Retourne le temps restant en secondes, 0 si l'échéance est dépassée.
+    def remaining(self):
+        return max(0, self.deadline - monotonic())
+
+    ## Attend entre deux essais d'une lecture. L'attente est interrompue par l'annulation et ne dépasse pas l'échéance.
+    # @param duration Durée de l'attente en secondes.
+    # @return Retourne True si la lecture peut continuer après l'attente.
+    def wait(self, duration):
+        self.cancelled.wait(min(duration, self.remaining()))
+        return self.running()
+
+    ## Lance une lecture dans un thread.
+    # @param name Nom de la grandeur lue.
+    # @param reader Fonction de lecture, appelée avec l'instance Acquisition et renvoyant la liste des mesures.
+    # @param required True si l'acquisition doit attendre une mesure valide de cette grandeur.
+    def submit(self, name, reader, required = True):
+        self.pending.add(name)
+        if required:
+            self.required.add(name)
+        Thread(target = self.run, args = (name, reader), daemon = True).start()
+
+    ## Exécute une lecture et transmet son résultat.
+    # @param name Nom de la grandeur lue.
+    # @param reader Fonction de lecture.
+    def run(self, name, reader):
+        samples = []
+        try:
+            samples = reader(self) or []
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de lire la grandeur " + name)
+        self.queue.put((name, samples))
+
+    ## Indique si chaque grandeur requise a au moins une mesure.
+    # @return Retourne True si l'acquisition peut se terminer.
+    def complete(self):
+        return all(self.results.get(name) for name in self.required)
+
+    ## Récupère les résultats au fur et à mesure jusqu'à ce que chaque grandeur requise soit mesurée, que toutes les lectures soient terminées
+    # ou que l'échéance soit atteinte, puis annule les lectures encore en cours.
+    # @return Retourne un dictionnaire associant chaque nom de grandeur à la liste de ses mesures (vide si la lecture n'a pas abouti).
+    def collect(self):
+        while self.pending and not (self.required and self.complete()):
+            try:
+                name, samples = self.queue.get(timeout = self.remaining())
+            except Empty:
+                break
+            self.pending.discard(name)
+            self.results[name] = samples
+            self.logger.info("Lecture " + name + " terminée en " + str(round(monotonic() - self.start_time, 3)) + " s (" + str(len(samples)) + " mesure(s))")
+        if self.pending:
+            self.logger.info("Lectures annulées : " + ", ".join(sorted(self.pending)))
+        self.cancelled.set()
+        return {name: self.results.get(name, []) for name in self.pending | set(self.results)}
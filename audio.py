@@ -0,0 +1,190 @@
+## @file audio.py
+# Définition des sorties audio du bulletin radio : carte son ALSA, fichier WAV ou sortie nulle.
+# Chaque sortie joue un fichier WAV en mémoire et ne rend la main qu'une fois le son entièrement joué, en bloquant sans consommer de CPU.
+##
+
+import io
+import shutil
+import subprocess
+import wave
+from abc import ABC, abstractmethod
+from array import array
+from time import sleep
+
+try:
+    import alsaaudio
+except ImportError: # pyalsaaudio est facultatif : la sortie ALSA passe alors par aplay
+    alsaaudio = None
+
+## Décode un fichier WAV en mémoire.
+# @param wav Le contenu du fichier WAV.
+# @return Retourne un tuple (fréquence d'échantillonnage, nombre de canaux, octets par échantillon, données PCM).
+def decode(wav):
+    with wave.open(io.BytesIO(wav), "rb") as wavfile:
+        return (wavfile.getframerate(), wavfile.getnchannels(), wavfile.getsampwidth(), wavfile.readframes(wavfile.getnframes()))
+
+## Convertit des échantillons PCM 16 bits en mono à une autre fréquence d'échantillonnage (moyenne des canaux, échantillon le plus proche).
+# @param pcm Les échantillons PCM 16 bits little-endian.
+# @param rate La fréquence d'échantillonnage en Hz.
+# @param channels Le nombre de canaux.
+# @param target_rate La fréquence d'échantillonnage voulue en Hz.
+# @return Retourne les échantillons PCM 16 bits mono.
+def resample(pcm, rate, channels, target_rate):
+    samples = array("h")
+    samples.frombytes(pcm)
+    if channels > 1:
+        samples = array("h", (sum(samples[i:i + channels]) // channels for i in range(0, len(samples) - channels + 1, channels)))
+    if rate != target_rate:
+        samples = array("h", (samples[i * rate // target_rate] for i in range(len(samples) * target_rate // rate)))
+    return samples.tobytes()
+
+## Classe AudioSink.
+# Cette classe est la base des sorties audio : play() décode le fichier WAV et confie les échantillons à write(), propre à chaque sortie.
+class AudioSink(ABC):
+
+    ## Constructeur.
+    # @param logger Logger principal.
+    def __init__(self, logger):
+        ## Logger principal.
+        self.logger = logger
+        ## Durée totale jouée depuis la création de la sortie, en secondes.
+        self.played = 0
+
+    ## Joue un fichier WAV et attend la fin de la lecture.
+    # @param wav Le contenu du fichier WAV.
+    def play(self, wav):
+        (rate, channels, width, pcm) = decode(wav)
+        self.write(pcm, rate, channels, width)
+        self.played += len(pcm) / (rate * channels * width)
+
+    ## Joue des échantillons PCM et attend la fin de la lecture.
+    # @param pcm Les échantillons PCM little-endian.
+    # @param rate La fréquence d'échantillonnage en Hz.
+    # @param channels Le nombre de canaux.
+    # @param width Le nombre d'octets par échantillon.
+    @abstractmethod
+    def write(self, pcm, rate, channels, width):
+        pass
+
+    ## Libère la sortie à la fin du bulletin.
+    def close(self):
+        pass
+
+## Classe AlsaSink.
+# Cette classe joue le son sur la carte son par ALSA. Avec pyalsaaudio, les échantillons sont écrits période par période en mode bloquant
+# puis la sortie est vidée (drain) ; sans pyalsaaudio, ils sont envoyés à aplay, dont on attend la fin.
+class AlsaSink(AudioSink):
+
+    ## Nombre d'échantillons par période ALSA.
+    PERIOD = 1024
+    ## Formats ALSA de aplay selon le nombre d'octets par échantillon.
+    FORMATS = {1: "U8", 2: "S16_LE", 3: "S24_3LE", 4: "S32_LE"}
+
+    ## Constructeur.
+    # @param logger Logger principal.
+    # @param device Nom du périphérique ALSA. La valeur par défaut est "default".
+    def __init__(self, logger, device = "default"):
+        super().__init__(logger)
+        ## Nom du périphérique ALSA.
+        self.device = device
+        if alsaaudio is None and shutil.which("aplay") is None:
+            raise Exception("Ni pyalsaaudio ni aplay ne sont disponibles pour la sortie audio ALSA")
+
+    ## Joue des échantillons PCM sur la carte son et attend la fin de la lecture.
+    # @param pcm Les échantillons PCM little-endian.
+    # @param rate La fréquence d'échantillonnage en Hz.
+    # @param channels Le nombre de canaux.
+    # @param width Le nombre d'octets par échantillon.
+    def write(self, pcm, rate, channels, width):
+        if alsaaudio is None:
+            duration = len(pcm) / (rate * channels * width)
+            subprocess.run(["aplay", "-q", "-D", self.device, "-t", "raw", "-f", self.FORMATS[width], "-r", str(rate), "-c", str(channels)],
+                           input = pcm, check = True, timeout = duration + 10)
+            return
+        formats = {1: alsaaudio.PCM_FORMAT_U8, 2: alsaaudio.PCM_FORMAT_S16_LE, 3: alsaaudio.PCM_FORMAT_S24_3LE, 4: alsaaudio.PCM_FORMAT_S32_LE}
+        device = alsaaudio.PCM(alsaaudio.PCM_PLAYBACK, alsaaudio.PCM_NORMAL, device = self.device, channels = channels, rate = rate,
+                               format = formats[width], periodsize = self.PERIOD)
+        try:
+            period = self.PERIOD * channels * width
+            for start in range(0, len(pcm), period):
+                device.write(pcm[start:start + period])
+            if hasattr(device, "drain"): # pyalsaaudio 0.10 et suivants ; sinon close() vide la sortie
+                device.drain()
+        finally:
+            device.close()
+
+## Classe WavSink.
+# Cette classe enregistre dans un fichier WAV tout ce qui est joué pendant un bulletin, par exemple pour vérifier le bulletin en simulation.
+# Les sons sont convertis en mono 16 bits à la fréquence du fichier, comme le ferait le périphérique ALSA "default".
+class WavSink(AudioSink):
+
+    ## Constructeur.
+    # @param logger Logger principal.
+    # @param filename Fichier WAV de sortie, réécrit à chaque bulletin.
+    # @param rate Fréquence d'échantillonnage du fichier en Hz. La valeur par défaut est 16000 (voix mbrola françaises).
+    def __init__(self, logger, filename, rate = 16000):
+        super().__init__(logger)
+        ## Fichier WAV de sortie.
+        self.filename = filename
+        ## Fréquence d'échantillonnage du fichier.
+        self.rate = rate
+        ## Fichier WAV ouvert pendant le bulletin.
+        self.wavfile = None
+
+    ## Ajoute des échantillons PCM au fichier.
+    # @param pcm Les échantillons PCM little-endian.
+    # @param rate La fréquence d'échantillonnage en Hz.
+    # @param channels Le nombre de canaux.
+    # @param width Le nombre d'octets par échantillon.
+    def write(self, pcm, rate, channels, width):
+        if width != 2:
+            raise Exception("Seuls les sons 16 bits peuvent être enregistrés dans " + self.filename)
+        if self.wavfile is None:
+            self.wavfile = wave.open(self.filename, "wb")
+            self.wavfile.setnchannels(1)
+            self.wavfile.setsampwidth(2)
+            self.wavfile.setframerate(self.rate)
+        self.wavfile.writeframes(resample(pcm, rate, channels, self.rate))
+
+    ## Termine le fichier WAV.
+    def close(self):
+        if self.wavfile is not None:
+            self.wavfile.close()
+            self.wavfile = None
+            self.logger.info("Bulletin enregistré dans " + self.filename)
+
+## Classe NullSink.
+# Cette classe ignore le son, en respectant éventuellement sa durée pour reproduire le temps d'émission.
+class NullSink(AudioSink):
+
+    ## Constructeur.
+    # @param logger Logger principal.
+    # @param realtime True pour attendre la durée du son. La valeur par défaut est False.
+    def __init__(self, logger, realtime = False):
+        super().__init__(logger)
+        ## True pour attendre la durée du son.
+        self.realtime = realtime
+
+    ## Ignore des échantillons PCM.
+    # @param pcm Les échantillons PCM little-endian.
+    # @param rate La fréquence d'échantillonnage en Hz.
+    # @param channels Le nombre de canaux.
+    # @param width Le nombre d'octets par échantillon.
+    def write(self, pcm, rate, channels, width):
+        if self.realtime:
+            sleep(len(pcm) / (rate * channels * width))
+
+## Crée une sortie audio.
+# @param output Type de sortie : "alsa", "wav" ou "null".
+# @param logger Logger principal.
+# @param filename Fichier de la sortie "wav".
+# @param device Périphérique de la sortie "alsa". La valeur par défaut est "default".
+# @return Retourne la sortie audio.
+def openSink(output, logger, filename = None, device = "default"):
+    if output == "alsa":
+        return AlsaSink(logger, device)
+    if output == "wav":
+        return WavSink(logger, filename)
+    if output == "null":
+        return NullSink(logger)
+    raise Exception("Sortie audio inconnue : " + str(output))
@@ -0,0 +1,191 @@
+## @file bmp085.py
+# Définition de la classe Bmp085. Elle pilote le baromètre BMP085/BMP180 sur le bus I2C, sans la bibliothèque Adafruit.
+##
+
+import json
+from threading import Lock
+from time import sleep, monotonic
+from i2c import I2C
+
+## Noms des coefficients de calibration, dans l'ordre de l'EEPROM (registres 0xAA à 0xBF).
+CALIBRATION = ("AC1", "AC2", "AC3", "AC4", "AC5", "AC6", "B1", "B2", "MB", "MC", "MD")
+## Coefficients non signés de l'EEPROM.
+UNSIGNED = ("AC4", "AC5", "AC6")
+
+## Calcule la température et la pression compensées à partir des valeurs brutes (algorithme de la documentation du BMP085).
+# @param cal Dictionnaire des coefficients de calibration.
+# @param ut Valeur brute de la température.
+# @param up Valeur brute de la pression.
+# @param mode Mode de suréchantillonnage utilisé pour la pression (0 à 3).
+# @return Retourne un tuple (température en °C, pression en Pa).
+def compensate(cal, ut, up, mode):
+    x1 = ((ut - cal["AC6"]) * cal["AC5"]) >> 15
+    x2 = (cal["MC"] << 11) // (x1 + cal["MD"])
+    b5 = x1 + x2
+    temperature = ((b5 + 8) >> 4) / 10.0
+    b6 = b5 - 4000
+    x1 = (cal["B2"] * ((b6 * b6) >> 12)) >> 11
+    x2 = (cal["AC2"] * b6) >> 11
+    x3 = x1 + x2
+    b3 = (((cal["AC1"] * 4 + x3) << mode) + 2) // 4
+    x1 = (cal["AC3"] * b6) >> 13
+    x2 = (cal["B1"] * ((b6 * b6) >> 12)) >> 16
+    x3 = ((x1 + x2) + 2) >> 2
+    b4 = (cal["AC4"] * (x3 + 32768)) >> 15
+    b7 = (up - b3) * (50000 >> mode)
+    p = (b7 * 2) // b4 if b7 < 0x80000000 else (b7 // b4) * 2
+    x1 = ((p >> 8) * (p >> 8) * 3038) >> 16
+    x2 = (-7357 * p) >> 16
+    return (temperature, p + ((x1 + x2 + 3791) >> 4))
+
+## Classe Bmp085.
+# Cette classe lit le baromètre BMP085/BMP180. Les coefficients de calibration sont conservés dans un fichier, indexés par l'adresse et l'identifiant du composant,
+# et ne sont lus dans l'EEPROM qu'au premier démarrage. Une mesure réalise une seule conversion de température, utilisée à la fois pour compenser
+# la pression et comme température de secours ; elle est partagée entre les threads de lecture du cycle.
+class Bmp085:
+
+    ## Adresse I2C par défaut du baromètre.
+    ADDRESS = 0x77
+    ## Identifiant renvoyé par le registre CHIP_ID.
+    CHIP_ID = 0x55
+    ## Registre de l'identifiant du composant, suivi du registre de version.
+    REG_CHIP_ID = 0xD0
+    ## Premier registre de l'EEPROM de calibration.
+    REG_CALIBRATION = 0xAA
+    ## Registre de commande des conversions.
+    REG_CONTROL = 0xF4
+    ## Premier registre du résultat d'une conversion.
+    REG_DATA = 0xF6
+    ## Commande de conversion de la température.
+    READ_TEMPERATURE = 0x2E
+    ## Commande de conversion de la pression, le mode de suréchantillonnage occupant les bits 6 et 7.
+    READ_PRESSURE = 0x34
+    ## Durée d'une conversion de température, en secondes.
+    TEMPERATURE_TIME = 0.0045
+    ## Durée d'une conversion de pression pour chaque mode (ultra basse consommation, standard, haute résolution, ultra haute résolution), en secondes.
+    PRESSURE_TIMES = (0.0045, 0.0075, 0.0135, 0.0255)
+    ## Durée pendant laquelle une mesure est réutilisée, en secondes.
+    MAX_AGE = 60
+    ## Plage de pression plausible en Pa. Hors de cette plage, la calibration sauvegardée est relue dans l'EEPROM (composant remplacé).
+    PRESSURE_RANGE = (30000, 110000)
+
+    ## Constructeur. Vérifie l'identifiant du composant et charge sa calibration.
+    # @param pi Instance de pigpio.
+    # @param logger Logger principal.
+    # @param i2c_address L'adresse I2C du baromètre. La valeur par défaut est ADDRESS.
+    # @param nb_try Nombres d'essais maximum de l'initialisation du bus I2C. La valeur par défaut est 5.
+    # @param calibration_filename Fichier de sauvegarde des calibrations. Par défaut, la calibration est lue à chaque démarrage.
+    # @param budget Temps accordé à une mesure (conversions de température et de pression) en secondes. Par défaut, la meilleure résolution.
+    def __init__(self, pi, logger, i2c_address = ADDRESS, nb_try = 5, calibration_filename = None, budget = None):
+        ## Logger principal.
+        self.logger = logger
+        ## Objet I2C initialisé.
+        self.i2c_bus = I2C(pi, i2c_address, logger, nb_try)
+        ## Fichier de sauvegarde des calibrations.
+        self.calibration_filename = calibration_filename
+        ## Mode de suréchantillonnage de la pression.
+        self.mode = self.selectMode(budget)
+        ## Dernière mesure (température en °C, pression en Pa) et son instant.
+        self.measurement, self.measured_at = None, None
+        ## Verrou partagé par les threads qui demandent une mesure.
+        self.lock = Lock()
+        chip = self.i2c_bus.readBlock([self.REG_CHIP_ID], 2)
+        if chip is None or chip[0] != self.CHIP_ID:
+            raise Exception("Baromètre BMP085 absent à l'adresse " + hex(i2c_address))
+        ## Clé de la calibration dans le fichier de sauvegarde : adresse, identifiant et version du composant.
+        self.key = "{:#x}-{:#x}-{:#x}".format(i2c_address, chip[0], chip[1])
+        ## Coefficients de calibration.
+        self.calibration = self.loadCalibration()
+        ## True si la calibration provient du fichier de sauvegarde.
+        self.cached = self.calibration is not None
+        if not self.cached:
+            self.readCalibration()
+
+    ## Choisit le mode de suréchantillonnage le plus précis dont la mesure tient dans le temps accordé.
+    # @param budget Temps accordé en secondes, ou None pour la meilleure résolution.
+    # @return Retourne le mode (0 à 3).
+    def selectMode(self, budget):
+        if budget is None:
+            return len(self.PRESSURE_TIMES) - 1
+        modes = [mode for (mode, duration) in enumerate(self.PRESSURE_TIMES) if self.TEMPERATURE_TIME + duration <= budget]
+        return modes[-1] if modes else 0
+
+    ## Charge la calibration du composant depuis le fichier de sauvegarde.
+    # @return Retourne les coefficients, ou None si le composant n'y figure pas.
+    def loadCalibration(self):
+        if self.calibration_filename is None:
+            return None
+        try:
+            with open(self.calibration_filename, "r") as calibrationfile:
+                return json.load(calibrationfile).get(self.key)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de charger la calibration du baromètre")
+            return None
+
+    ## Sauvegarde la calibration du composant dans le fichier de sauvegarde.
+    def saveCalibration(self):
+        if self.calibration_filename is None:
+            return
+        try:
+            try:
+                with open(self.calibration_filename, "r") as calibrationfile:
+                    calibrations = json.load(calibrationfile)
+            except FileNotFoundError:
+                calibrations = {}
+            calibrations[self.key] = self.calibration
+            with open(self.calibration_filename, "w") as calibrationfile:
+                json.dump(calibrations, calibrationfile)
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de sauvegarder la calibration du baromètre")
+
+    ## Lit les coefficients de calibration dans l'EEPROM du composant (22 octets en une transaction) et les sauvegarde.
+    # @return Retourne les coefficients.
+    def readCalibration(self):
+        buffer = self.i2c_bus.readBlock([self.REG_CALIBRATION], 2 * len(CALIBRATION))
+        if buffer is None:
+            raise Exception("Impossible de lire la calibration du baromètre")
+        self.calibration = {name: int.from_bytes(buffer[2 * i:2 * i + 2], "big", signed = name not in UNSIGNED) for (i, name) in enumerate(CALIBRATION)}
+        self.logger.info("Calibration du baromètre lue dans l'EEPROM")
+        self.saveCalibration()
+        return self.calibration
+
+    ## Lance une conversion et lit son résultat.
+    # @param command La commande de conversion.
+    # @param duration La durée de la conversion en secondes.
+    # @param length Le nombre d'octets du résultat.
+    # @return Retourne la valeur brute.
+    def convert(self, command, duration, length):
+        if not self.i2c_bus.writeReg(self.REG_CONTROL, command, 1):
+            raise Exception("Impossible de lancer une conversion du baromètre")
+        sleep(duration)
+        buffer = self.i2c_bus.readBlock([self.REG_DATA], length)
+        if buffer is None:
+            raise Exception("Impossible de lire une conversion du baromètre")
+        return int.from_bytes(buffer, "big")
+
+    ## Réalise une conversion de température puis une conversion de pression, et compense la pression.
+    # @return Retourne un tuple (température en °C, pression en Pa).
+    def read(self):
+        ut = self.convert(self.READ_TEMPERATURE, self.TEMPERATURE_TIME, 2)
+        up = self.convert(self.READ_PRESSURE + (self.mode << 6), self.PRESSURE_TIMES[self.mode], 3) >> (8 - self.mode)
+        (temperature, pressure) = compensate(self.calibration, ut, up, self.mode)
+        if self.cached and not self.PRESSURE_RANGE[0] <= pressure <= self.PRESSURE_RANGE[1]:
+            self.logger.info("Pression incohérente avec la calibration sauvegardée, relecture de l'EEPROM du baromètre")
+            self.cached = False
+            self.readCalibration()
+            (temperature, pressure) = compensate(self.calibration, ut, up, self.mode)
+        return (temperature, pressure)
+
+    ## Renvoie la mesure du cycle : la première demande réalise la mesure, les suivantes (thermomètre de secours, autre thread) la réutilisent.
+    # @param fresh True pour réaliser une nouvelle mesure (suréchantillonnage), qui remplace la mesure partagée.
+    # @return Retourne un tuple (température en °C, pression en Pa).
+    def measure(self, fresh = False):
+        with self.lock:
+            if fresh or self.measurement is None or monotonic() - self.measured_at > self.MAX_AGE:
+                self.measurement = self.read()
+                self.measured_at = monotonic()
+            return self.measurement
@@ -0,0 +1,50 @@
+## @file chrono.py
+# Définition de la classe Chrono. Elle mesure la durée de chaque phase du cycle afin de suivre le temps d'éveil du Raspberry Pi.
+##
+
+from time import perf_counter
+
+## Classe Chrono.
+# Cette classe découpe le cycle en phases successives et mesure le temps réel passé dans chacune.
+class Chrono:
+
+    ## Constructeur.
+    # @param logger Logger principal.
+    def __init__(self, logger):
+        ## Logger principal.
+        self.logger = logger
+        ## Liste des phases terminées sous la forme (nom, durée).
+        self.phases = []
+        ## Nom de la phase en cours.
+        self.current = None
+        ## Instant de début de la phase en cours.
+        self.start_time = None
+        ## Instant de début du cycle.
+        self.cycle_start = perf_counter()
+
+    ## Termine la phase en cours et en commence une nouvelle.
+    # @param name Nom de la nouvelle phase.
+    def start(self, name):
+        self.stop()
+        self.current = name
+        self.start_time = perf_counter()
+
+    ## Termine la phase en cours.
+    def stop(self):
+        if self.current is not None:
+            self.phases.append((self.current, perf_counter() - self.start_time))
+            self.current = None
+
+    ## Renvoie la durée totale du cycle depuis la création du chronomètre.
+    # @return Retourne la durée en secondes.
+    def total(self):
+        return perf_counter() - self.cycle_start
+
+    ## Termine la phase en cours et écrit la durée de chaque phase dans le logger.
+    # @return Retourne la liste des phases sous la forme (nom, durée).
+    def report(self):
+        self.stop()
+        for name, duration in self.phases:
+            self.logger.info("Phase " + name + " : " + str(round(duration, 3)) + " s")
+        self.logger.info("Durée totale du cycle : " + str(round(self.total(), 3)) + " s")
+        return list(self.phases)
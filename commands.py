@@ -0,0 +1,215 @@
+## @file commands.py
+# Définition des classes Command et CommandRegistry. Elles décrivent les commandes acceptées par SMS (alias, lecture, écriture, validation, permission)
+# et retrouvent la commande d'un SMS en une seule analyse de son texte.
+##
+
+import re
+
+## Niveau de permission : tout numéro.
+PUBLIC = 0
+## Niveau de permission : numéro maître de la station uniquement.
+MASTER = 1
+
+## Lecture d'un paramètre (commande?argument).
+GET = "?"
+## Modification d'un paramètre (commande=argument).
+SET = "="
+
+## Découpe d'un SMS en mot de commande, opérateur (premier "?" ou "=") et argument.
+TOKENIZER = re.compile(r"\s*([^?=]*?)\s*([?=])(.*)", re.S)
+
+## Classe Command.
+# Cette classe décrit une commande SMS : ses alias, la lecture du paramètre et sa modification (analyse de l'argument, validation, enregistrement),
+# ainsi que les messages de réponse et le niveau de permission de chaque opération.
+class Command:
+
+    ## Constructeur.
+    # @param name Nom principal de la commande.
+    # @param aliases Autres noms acceptés.
+    # @param getter Fonction (gsm, argument) renvoyant la valeur lue, ou None si la commande ne peut pas être lue.
+    # @param get_reply Modèle de la réponse à une lecture, "{}" étant remplacé par la valeur.
+    # @param get_log Message de log d'une lecture.
+    # @param parser Fonction convertissant l'argument d'une modification, levant une exception s'il est incorrect.
+    # @param validator Fonction (config, valeur) levant une exception si la valeur est refusée.
+    # @param setter Fonction (config, valeur) enregistrant la valeur, ou None si la commande ne peut pas être modifiée.
+    # @param set_reply Modèle de la réponse à une modification réussie.
+    # @param set_log Modèle du message de log d'une modification réussie.
+    # @param set_error Réponse à une modification refusée.
+    # @param error_log Message de log d'une modification refusée.
+    # @param get_permission Niveau de permission d'une lecture. Par défaut, PUBLIC.
+    # @param set_permission Niveau de permission d'une modification. Par défaut, MASTER.
+    def __init__(self, name, aliases = (), getter = None, get_reply = "{}", get_log = None, parser = str, validator = None, setter = None,
+                 set_reply = "{}", set_log = None, set_error = "Une erreur est survenue, merci de réessayer.", error_log = None,
+                 get_permission = PUBLIC, set_permission = MASTER):
+        ## Nom principal de la commande.
+        self.name = name
+        ## Tous les noms acceptés.
+        self.aliases = (name,) + tuple(aliases)
+        ## Fonction de lecture.
+        self.getter = getter
+        ## Modèle de la réponse à une lecture.
+        self.get_reply = get_reply
+        ## Message de log d'une lecture.
+        self.get_log = get_log
+        ## Fonction d'analyse de l'argument.
+        self.parser = parser
+        ## Fonction de validation.
+        self.validator = validator
+        ## Fonction d'enregistrement.
+        self.setter = setter
+        ## Modèle de la réponse à une modification réussie.
+        self.set_reply = set_reply
+        ## Modèle du message de log d'une modification réussie.
+        self.set_log = set_log
+        ## Réponse à une modification refusée.
+        self.set_error = set_error
+        ## Message de log d'une modification refusée.
+        self.error_log = error_log
+        ## Niveau de permission de chaque opération.
+        self.permissions = {GET: get_permission, SET: set_permission}
+
+    ## Indique si la commande accepte une opération.
+    # @param operation GET ou SET.
+    # @return Retourne True si l'opération est possible.
+    def supports(self, operation):
+        return (self.getter if operation == GET else self.setter) is not None
+
+    ## Lit le paramètre.
+    # @param gsm Instance Gsm.
+    # @param argument Le texte après le "?".
+    # @return Retourne la réponse à envoyer.
+    def get(self, gsm, argument):
+        if self.get_log:
+            gsm.logger.info(self.get_log)
+        return self.get_reply.format(self.getter(gsm, argument.split(GET)[0]))
+
+    ## Modifie le paramètre après avoir analysé et validé l'argument.
+    # @param gsm Instance Gsm.
+    # @param argument Le texte après le "=".
+    # @return Retourne la réponse à envoyer.
+    def set(self, gsm, argument):
+        try:
+            value = self.parser(argument.strip())
+            if self.validator is not None:
+                self.validator(gsm.config, value)
+            self.setter(gsm.config, value)
+        except Exception as e:
+            gsm.logger.error(e)
+            gsm.logger.error(self.error_log or "Impossible de mettre à jour le paramètre " + self.name)
+            return self.set_error
+        if self.set_log:
+            gsm.logger.success(self.set_log.format(value))
+        return self.set_reply.format(value)
+
+
+## Classe CommandRegistry.
+# Cette classe associe chaque alias à sa commande dans un dictionnaire. Le texte d'un SMS est découpé une seule fois,
+# puis la commande est retrouvée directement par son nom.
+class CommandRegistry:
+
+    ## Constructeur.
+    # @param commands Liste des commandes à enregistrer.
+    def __init__(self, commands = ()):
+        ## Commandes indexées par alias.
+        self.commands = {}
+        for command in commands:
+            self.register(command)
+
+    ## Enregistre une commande sous tous ses alias.
+    # @param command La commande (objet Command).
+    def register(self, command):
+        for alias in command.aliases:
+            self.commands[alias] = command
+
+    ## Analyse le texte d'un SMS.
+    # @param text Le texte du SMS.
+    # @return Retourne un tuple (commande, opération, argument), ou None si le SMS ne contient pas de commande connue.
+    def parse(self, text):
+        match = TOKENIZER.match(text)
+        if match is None:
+            return None
+        command = self.commands.get(match.group(1).lower())
+        if command is None:
+            return None
+        return (command, match.group(2), match.group(3))
+
+    ## Renvoie la liste des noms principaux des commandes.
+    # @return Retourne la liste des noms.
+    def names(self):
+        return list(dict.fromkeys(command.name for command in self.commands.values()))
+
+
+## Vérifie qu'une heure de réveil est comprise entre 0 et l'heure d'extinction.
+# @param config Instance ConfigFile.
+# @param hour L'heure à vérifier.
+def checkWakeupHour(config, hour):
+    if hour >= config.getSleepHour():
+        raise Exception("Heure de réveil supérieur à l'heure d'extinction")
+    if hour < 0:
+        raise Exception("Heure de réveil inferieur à 0")
+
+## Vérifie qu'une heure d'extinction est comprise entre l'heure de réveil et 23.
+# @param config Instance ConfigFile.
+# @param hour L'heure à vérifier.
+def checkSleepHour(config, hour):
+    if hour <= config.getWakeupHour():
+        raise Exception("Heure d'extinction inférieure à l'heure de réveil")
+    if hour > 23:
+        raise Exception("Heure d'extinction supérieure à 23")
+
+## Vérifie qu'un seuil d'alerte de la batterie est compris entre 10000 et 12000 mV (exclus).
+# @param config Instance ConfigFile.
+# @param limit Le seuil à vérifier.
+def checkBatteryLimit(config, limit):
+    if limit >= 12000:
+        raise Exception("Seuil trop élevé")
+    if limit <= 10000:
+        raise Exception("Seuil trop faible")
+
+## Vérifie la longueur d'un nouveau mot de passe.
+# @param config Instance ConfigFile.
+# @param password Le mot de passe à vérifier.
+def checkPassword(config, password):
+    if len(password) < 4:
+        raise Exception("Le mot de passe doit faire au moins 4 caractères")
+
+## Commandes acceptées par SMS.
+COMMANDS = CommandRegistry([
+    Command("seuil",
+            getter = lambda gsm, argument: gsm.config.getBatteryLimit(), get_reply = "Seuil de la batterie : {} mV", get_log = "Envoi du seuil limite de la batterie",
+            parser = int, validator = checkBatteryLimit, setter = lambda config, limit: config.setBatteryLimit(limit),
+            set_reply = "Le seuil de la batterie a été correctement mis a jour : {} mV", set_log = "Le seuil de la batterie a été correctement mis à jour : {}",
+            set_error = "Seuil incorrect, merci de n'envoyer qu'un nombre.", error_log = "Impossible de mettre à jour le seuil de la batterie"),
+    Command("nom", aliases = ("site",),
+            getter = lambda gsm, argument: gsm.config.getSiteName(), get_reply = "Nom de la station : {}", get_log = "Envoi du nom de la station",
+            parser = lambda argument: argument[:125], setter = lambda config, name: config.setSiteName(name),
+            set_reply = "Le nom de la station a été correctement mis a jour : {}", set_log = "Le nom de la station a été correctement mise à jour : {}",
+            error_log = "Impossible de mettre à jour le nom de la station"),
+    Command("eveil", aliases = ("éveil", "debut", "début", "reveil", "réveil"),
+            getter = lambda gsm, argument: gsm.config.getWakeupHour(), get_reply = "Heure de révéil de la station : {} h", get_log = "Envoi de l'heure de réveil de la station",
+            parser = int, validator = checkWakeupHour, setter = lambda config, hour: config.setWakeupHour(hour),
+            set_reply = "Heure de réveil correctement mise a jour : {} h", set_log = "L'heure de réveil a été correctement mise à jour : {}h",
+            set_error = "Heure de réveil incorrecte, merci de n'envoyer qu'un nombre entre 0 et l'heure d'extinction.", error_log = "Impossible de mettre à jour l'heure de réveil"),
+    Command("extinction", aliases = ("fin",),
+            getter = lambda gsm, argument: gsm.config.getSleepHour(), get_reply = "Heure d'extinction de la station : {} h", get_log = "Envoi de l'heure d'extinction de la station",
+            parser = int, validator = checkSleepHour, setter = lambda config, hour: config.setSleepHour(hour),
+            set_reply = "Heure d'extinction correctement mise a jour : {}h", set_log = "L'heure d'extinction a été correctement mise à jour : {}h",
+            set_error = "Heure d'extinction incorrecte, merci de n'envoyer qu'un nombre entre l'heure de réveil et 23.", error_log = "Impossible de mettre à jour l'heure d'extinction"),
+    Command("altitude",
+            getter = lambda gsm, argument: gsm.config.getSiteAltitude(), get_reply = "Altitude de la station : {} m", get_log = "Envoi de l'altitude de la station",
+            parser = int, setter = lambda config, altitude: config.setSiteAltitude(altitude),
+            set_reply = "Altitude correctement mise a jour : {} m", set_log = "L'altitude a été correctement mis à jour : {}",
+            set_error = "Altitude incorrecte, merci de n'envoyer qu'un nombre.", error_log = "Impossible de mettre à jour l'altitude"),
+    Command("logs", getter = lambda gsm, argument: gsm.getLogs(argument), get_log = "Envoi des logs"),
+    Command("data", getter = lambda gsm, argument: gsm.getData(argument), get_log = "Envoi des dernières données"),
+    Command("batterie", getter = lambda gsm, argument: gsm.getBattery(argument), get_log = "Envoi de la tension de la batterie"),
+    Command("aide",
+            getter = lambda gsm, argument: None, get_log = "Envoi de la liste des commandes",
+            get_reply = "Envoyez n'importe quel message pour obtenir le dernier bulletin météo. \nVotre sms peut aussi contenir l'une des commandes suivantes : batterie?, seuil?, nom?, altitude?, eveil?, extinction?, maitre?"),
+    Command("maitre", aliases = ("maître",),
+            getter = lambda gsm, argument: gsm.config.getGsmMaster(), get_reply = "Numéro maitre de la station : {}", get_log = "Envoi du numéro maître de la station"),
+    Command("mdp",
+            validator = checkPassword, setter = lambda config, password: config.setGsmPswd(password),
+            set_reply = "Le mot de passe a été correctement mis a jour : {}", set_log = "Le mot de passe a été correctement mis à jour : {}",
+            set_error = "Impossible de mettre à jour le mot de passe", error_log = "Impossible de mettre à jour le mot de passe"),
+])
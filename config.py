@@ -111,3 +111,23 @@ class ConfigFile:
     def getSiteAltitude(self):
         return self.subconfig.getint("altitude", 0)
 
+    ## Recupère l'adresse de publication des observations sur Internet.
+    # @return Retourne l'adresse, ou une chaîne vide si la publication est désactivée.
+    def getUploadUrl(self):
+        return self.subconfig.get("upload_url", "")
+
+    ## Recupère le nom du point d'accès GPRS de l'opérateur.
+    # @return Retourne le nom du point d'accès.
+    def getUploadApn(self):
+        return self.subconfig.get("upload_apn", "free")
+
+    ## Indique si le programme du MKRFOX accepte les transferts groupés de registres (lecture précédée de l'octet 0x80, écriture de couples adresse/données).
+    # @return Retourne True si les transferts groupés sont activés. Par défaut, les registres sont transférés un par un.
+    def getMkrfoxBlockMode(self):
+        return self.subconfig.getboolean("mkrfox_block", False)
+
+    ## Recupère le nombre de cycles entre deux publications des observations.
+    # @return Retourne le nombre de cycles.
+    def getUploadCycles(self):
+        return self.subconfig.getint("upload_cycles", 6)
+
@@ -1,48 +1,149 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+from array import array
+import os
+import select
+import struct
 import time
 import pigpio
 
+# Number of edges kept per read: start pulse, response and 40 data bits fit with room to spare.
+TRACE_SIZE = 128
+# A high pulse at least this long (in microseconds) encodes a 1 bit (26-28 us for 0, 70 us for 1).
+ONE_THRESHOLD = 50
+# A high pulse this long (in microseconds) cannot be a data bit: the frame is corrupted.
+BAD_PULSE = 200
+# Longest wait for a complete frame after the start pulse (seconds).
+FRAME_TIMEOUT = 0.2
+# Polling interval while waiting for the frame (seconds).
+POLL_INTERVAL = 0.001
+# Edges recorded before the sensor answers: the start pulse falling edge and the release.
+# Quiet-line detection only starts once more edges than this have arrived.
+START_EDGES = 2
+# The burst is over once no edge has arrived for this long (seconds). Data edges are less than
+# 200 us apart, but pigpio delivers alerts and notification reports in batches about 1 ms apart,
+# so the window spans several batches.
+QUIET_WINDOW = 0.005
+# Notification pipe created by pigpiod for a handle returned by notify_open().
+NOTIFY_PIPE = "/dev/pigpio{}"
+# A notification report: sequence number, flags, tick and levels of GPIO 0-31.
+REPORT = struct.Struct("HHII")
+# Report flags of watchdog, keep-alive and event reports, which are not edges.
+REPORT_FLAGS = pigpio.NTFY_FLAGS_WDOG | pigpio.NTFY_FLAGS_ALIVE | pigpio.NTFY_FLAGS_EVENT
+
+
+def decode(ticks, levels, count):
+    """
+    Decode a DHT11 edge trace into the 5 frame bytes.
+    ticks (sequence): edge ticks in microseconds, as given by pigpio (32-bit, wrapping)
+    levels (sequence): level after each edge (0 or 1)
+    count (int): number of recorded edges
+    Each data bit is a high pulse whose length gives its value. The last 40 high pulses
+    of the trace are the data bits, the ones before belong to the start pulse and the response.
+    Returns the bytes (humidity, humidity decimal, temperature, temperature decimal, checksum),
+    or None if the trace is incomplete, contains a bad pulse or fails the checksum.
+    """
+    frame = bytearray(5)
+    bit = 39
+    i = count - 1
+    while i > 0 and bit >= 0:
+        if levels[i] == 0 and levels[i - 1] == 1:
+            high = (ticks[i] - ticks[i - 1]) & 0xFFFFFFFF
+            if high >= BAD_PULSE:
+                return None
+            if high >= ONE_THRESHOLD:
+                frame[bit >> 3] |= 0x80 >> (bit & 7)
+            bit -= 1
+            i -= 2
+        else:
+            i -= 1
+    if bit >= 0:
+        return None
+    if (frame[0] + frame[1] + frame[2] + frame[3]) & 255 != frame[4]:
+        return None
+    return bytes(frame)
+
 
 class DHT11(object):
     """
     The DHT11 class is a stripped version of the DHT22 sensor code by joan2937.
     You can find the initial implementation here:
     - https://github.com/srounet/pigpio/tree/master/EXAMPLES/Python/DHT22_AM2302_SENSOR
+    Edges are captured through a pigpio notification pipe: the whole burst is read in bulk
+    once the sensor has answered, without a Python callback per edge. When the pipe cannot be
+    opened (remote pigpiod, simulation), a GPIO callback records the edge ticks instead.
+    In both cases the frame is decoded and checked afterwards by decode().
     example code:
     >>> pi = pigpio.pi()
     >>> sensor = DHT11(pi, 4) # 4 is the data GPIO pin connected to your sensor
     >>> for response in sensor:
-    ....    print("Temperature: {}".format(response['temperature']))
-    ....    print("Humidity: {}".format(response['humidity']))
+    ....    if response is not None: # None when the frame was corrupted
+    ....        print("Temperature: {}".format(response['temperature']))
+    ....        print("Humidity: {}".format(response['humidity']))
     """
 
-    def __init__(self, pi, gpio):
+    def __init__(self, pi, gpio, notify=True):
         """
         pi (pigpio): an instance of pigpio
         gpio (int): gpio pin number
+        notify (bool): capture the edges through a notification pipe when available
         """
         self.pi = pi
         self.gpio = gpio
-        self.high_tick = 0
-        self.bit = 40
+        self.ticks = array('L', [0] * TRACE_SIZE)
+        self.levels = bytearray(TRACE_SIZE)
+        self.count = 0
+        self.reports = bytearray(TRACE_SIZE * REPORT.size)
+        self.notify_handle = None
+        self.notify_pipe = None
         self.temperature = 0
         self.humidity = 0
         self.either_edge_cb = None
-        self.setup()
+        self.setup(notify)
 
-    def setup(self):
+    def setup(self, notify=True):
         """
         Clears the internal gpio pull-up/down resistor.
         Kills any watchdogs.
+        Opens the notification pipe, or falls back to callbacks.
         """
         self.pi.set_pull_up_down(self.gpio, pigpio.PUD_OFF)
         self.pi.set_watchdog(self.gpio, 0)
-        self.register_callbacks()
+        if not (notify and self.open_notification()):
+            self.register_callbacks()
+
+    def open_notification(self):
+        """
+        Opens a pigpio notification handle and its pipe, paused until read() begins.
+        Returns True on success, False if notifications are not available.
+        """
+        try:
+            self.notify_handle = self.pi.notify_open()
+            if self.notify_handle < 0:
+                raise pigpio.error(pigpio.error_text(self.notify_handle))
+            self.notify_pipe = os.open(NOTIFY_PIPE.format(self.notify_handle), os.O_RDONLY | os.O_NONBLOCK)
+            return True
+        except Exception:
+            self.close_notification()
+            return False
+
+    def close_notification(self):
+        """
+        Closes the notification pipe and its handle.
+        """
+        if self.notify_pipe is not None:
+            os.close(self.notify_pipe)
+            self.notify_pipe = None
+        if self.notify_handle is not None and self.notify_handle >= 0:
+            try:
+                self.pi.notify_close(self.notify_handle)
+            except Exception:
+                pass
+        self.notify_handle = None
 
     def register_callbacks(self):
         """
-        Monitors RISING_EDGE changes using callback.
+        Monitors both edges using callback.
         """
         self.either_edge_cb = self.pi.callback(
             self.gpio,
@@ -53,82 +154,110 @@ class DHT11(object):
     def either_edge_callback(self, gpio, level, tick):
         """
         Either Edge callbacks, called each time the gpio edge changes.
-        Accumulate the 40 data bits from the dht11 sensor.
-        """
-        level_handlers = {
-            pigpio.FALLING_EDGE: self._edge_FALL,
-            pigpio.RISING_EDGE: self._edge_RISE,
-            pigpio.EITHER_EDGE: self._edge_EITHER
-        }
-        handler = level_handlers[level]
-        diff = pigpio.tickDiff(self.high_tick, tick)
-        handler(tick, diff)
-
-    def _edge_RISE(self, tick, diff):
-        """
-        Handle Rise signal.
-        """
-        val = 0
-        if diff >= 50:
-            val = 1
-        if diff >= 200: # Bad bit?
-            self.checksum = 256 # Force bad checksum
-
-        if self.bit >= 40: # Message complete
-            self.bit = 40
-        elif self.bit >= 32: # In checksum byte
-            self.checksum = (self.checksum << 1) + val
-            if self.bit == 39:
-                # 40th bit received
-                self.pi.set_watchdog(self.gpio, 0)
-                total = self.humidity + self.temperature
-                # is checksum ok ?
-                # if not (total & 255) == self.checksum:
-                    #raise
-        elif 16 <= self.bit < 24: # in temperature byte
-            self.temperature = (self.temperature << 1) + val
-        elif 0 <= self.bit < 8: # in humidity byte
-            self.humidity = (self.humidity << 1) + val
-        else: # skip header bits
-            pass
-        self.bit += 1
-
-    def _edge_FALL(self, tick, diff):
-        """
-        Handle Fall signal.
+        Records the edge without allocating: watchdog timeouts and edges past the trace size are ignored.
         """
-        self.high_tick = tick
-        if diff <= 250000:
+        count = self.count
+        if level > 1 or count >= TRACE_SIZE:
             return
-        self.bit = -2
-        self.checksum = 0
-        self.temperature = 0
-        self.humidity = 0
-
-    def _edge_EITHER(self, tick, diff):
-        """
-        Handle Either signal.
-        """
-        self.pi.set_watchdog(self.gpio, 0)
+        self.ticks[count] = tick
+        self.levels[count] = level
+        self.count = count + 1
 
     def read(self):
         """
         Start reading over DHT11 sensor.
+        Returns the decoded frame bytes, or None if no valid frame was received.
         """
+        self.count = 0
+        if self.notify_pipe is not None:
+            self.drain_pipe()
+            self.pi.notify_begin(self.notify_handle, 1 << self.gpio)
         self.pi.write(self.gpio, pigpio.LOW)
         time.sleep(0.017) # 17 ms
         self.pi.set_mode(self.gpio, pigpio.INPUT)
-        self.pi.set_watchdog(self.gpio, 200)
-        time.sleep(0.2)
+        if self.notify_pipe is not None:
+            count = self.read_pipe()
+        else:
+            count = self.wait_callbacks()
+        frame = decode(self.ticks, self.levels, count) if count > 0 else None
+        if frame is not None:
+            self.humidity = frame[0]
+            self.temperature = frame[2]
+        return frame
+
+    def wait_callbacks(self):
+        """
+        Waits until the callback has recorded the whole burst.
+        Returns the number of recorded edges.
+        """
+        deadline = time.monotonic() + FRAME_TIMEOUT
+        previous = 0
+        quiet_since = time.monotonic()
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            count = self.count
+            now = time.monotonic()
+            if count != previous:
+                previous, quiet_since = count, now
+            elif count > START_EDGES and now - quiet_since >= QUIET_WINDOW: # Line quiet after the response: the burst is over
+                return count
+        return self.count
+
+    def read_pipe(self):
+        """
+        Reads the notification reports of the burst in bulk into the preallocated buffer,
+        then pauses the notifications and converts the reports into edge ticks and levels.
+        Returns the number of recorded edges, 0 if the line stayed silent.
+        """
+        view = memoryview(self.reports)
+        size = 0
+        deadline = time.monotonic() + FRAME_TIMEOUT
+        while size < len(view):
+            # Wait for the response until the deadline, then for a quiet line
+            timeout = deadline - time.monotonic()
+            if size > START_EDGES * REPORT.size:
+                timeout = min(timeout, QUIET_WINDOW)
+            if timeout <= 0 or not select.select([self.notify_pipe], [], [], timeout)[0]:
+                break
+            try:
+                received = os.readv(self.notify_pipe, [view[size:]])
+            except BlockingIOError:
+                continue
+            if received == 0: # Pipe closed by pigpiod
+                break
+            size += received
+        self.pi.notify_pause(self.notify_handle)
+        mask = 1 << self.gpio
+        count = 0
+        for offset in range(0, size - size % REPORT.size, REPORT.size):
+            _, flags, tick, levels = REPORT.unpack_from(self.reports, offset)
+            if flags & REPORT_FLAGS:
+                continue
+            self.ticks[count] = tick
+            self.levels[count] = 1 if levels & mask else 0
+            count += 1
+        view.release()
+        return count
+
+    def drain_pipe(self):
+        """
+        Discards the reports left in the notification pipe by a previous read.
+        """
+        try:
+            while os.readv(self.notify_pipe, [self.reports]):
+                pass
+        except BlockingIOError:
+            pass
 
     def close(self):
         """
-        Stop reading sensor, remove callbacks.
+        Stop reading sensor, remove callbacks and the notification pipe.
         """
         self.pi.set_watchdog(self.gpio, 0)
         if self.either_edge_cb:
             self.either_edge_cb.cancel()
             self.either_edge_cb = None
+        self.close_notification()
 
     def __iter__(self):
         """
@@ -138,9 +267,11 @@ class DHT11(object):
 
     def __next__(self):
         """
-        Call the read method and return temperature and humidity informations.
+        Call the read method and return temperature and humidity informations,
+        or None if the frame was incomplete or failed the checksum.
         """
-        self.read()
+        if self.read() is None:
+            return None
         response =  {
             'humidity': self.humidity,
             'temperature': self.temperature
@@ -152,7 +283,8 @@ if __name__ == '__main__':
     pi = pigpio.pi()
     sensor = DHT11(pi, 23)
     for d in sensor:
-        print("temperature: {}".format(d['temperature']))
-        print("humidity: {}".format(d['humidity']))
+        if d is not None:
+            print("temperature: {}".format(d['temperature']))
+            print("humidity: {}".format(d['humidity']))
         time.sleep(1)
-    sensor.close()
\ No newline at end of file
+    sensor.close()
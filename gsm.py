@@ -2,8 +2,27 @@
 ## @file gsm.py
 # Définition de la classe gsm. Elle permet la communication avec le module GSM SIM800L.
 ##
-from time import sleep, mktime, time
-from loguru import logger
+from time import sleep, mktime, time, monotonic
+from sms import SmsParser, SMS
+from logtail import LogTail
+from commands import COMMANDS, GET, SET, MASTER
+from smsbudget import SmsBudget
+import gsm7
+import json
+import re
+
+## Intervalle entre deux consultations du tampon de l'UART lorsqu'aucun octet n'est disponible.
+POLL_INTERVAL = 0.005
+## Temps maximal d'attente de la réponse à une commande AT absente de Gsm.timeouts.
+DEFAULT_TIMEOUT = 5
+## Codes de résultat finaux terminant la réponse à une commande AT.
+FINAL_RESULT = re.compile(r"^(OK|ERROR|\+CMS ERROR:.*|\+CME ERROR:.*|NO CARRIER|BUSY|NO ANSWER|NO DIALTONE)$")
+## En-têtes suivis d'une ligne de texte de SMS, qui ne doit pas être interprétée comme un code de résultat.
+SMS_HEADERS = ("+CMGL:", "+CMGR:")
+## Notification non sollicitée d'un nouveau SMS stocké sur la carte SIM : +CMTI: "SM",<indice>.
+URC_CMTI = re.compile(r'^\+CMTI: "[^"]*",(\d+)')
+## Notification non sollicitée d'un nouveau SMS transmis directement, suivie de son texte : +CMT: "<numéro>","","<horodatage>".
+URC_CMT = re.compile(r'^\+CMT: "([^"]*)",(?:"[^"]*"|[^,]*),"([^"]*)"')
 
 ## Classe Gsm.
 # Cette classe permet la communication et la gestion du module GSM SIM800L via UART.
@@ -14,14 +33,33 @@ class Gsm:
     # @param logger Logger principal.
     # @param init_nbtry Nombres d'essais maximum de l'initialisation des capteurs. La valeur par défaut est 5.
     # @param baudrate Baudrate du bus UART. La valeur par défaut est 115200.
-    # @param timeout Timeout du bus UART. La valeur par défaut est 1.
-    def __init__(self, config, pi, logger, init_nbtry = 5, baudrate = 115200):
+    # @param queue_filename Fichier de sauvegarde de la file des SMS en attente. Par défaut, la file n'est pas sauvegardée.
+    def __init__(self, config, pi, logger, init_nbtry = 5, baudrate = 115200, queue_filename = None):
         ## Logger principal
         self.logger = logger
         ## Instance de pigpio
         self.pi = pi
         ## Objet ConfigFile.
         self.config = config
+        ## Octets reçus sur l'UART et pas encore consommés par une réponse.
+        self.rx = ""
+        ## Lecteur des dernières lignes des fichiers de log, partagé par les commandes logs?, data? et batterie?.
+        self.log_tail = LogTail()
+        ## Fichier de sauvegarde de la file des SMS en attente.
+        self.queue_filename = queue_filename
+        ## Indices des SMS signalés par +CMTI et pas encore traités.
+        self.pending_indexes = []
+        ## SMS transmis directement par +CMT et pas encore traités.
+        self.pending_messages = []
+        ## En-tête (numéro, horodatage) d'une notification +CMT dont le texte n'a pas encore été reçu.
+        self.cmt = None
+        ## Réponses non envoyées faute de budget, sous la forme [numéro, texte], reportées au cycle suivant.
+        self.pending_replies = []
+        ## Numéros ayant demandé le bulletin sans le recevoir faute de budget, servis au cycle suivant avec le bulletin à jour.
+        self.pending_bulletins = []
+        ## Nombre de segments du dernier bulletin créé.
+        self.bulletin_segments = 0
+        self.loadQueue()
         self.logger.info("Tentative d'ouverture du port série pour le module GSM...")
         for i in range(init_nbtry):
             try:
@@ -35,34 +73,165 @@ class Gsm:
                 self.logger.success("Port série ouvert")
                 break
         
-    ## Liste des commandes possible par SMS.
-    command = ["batterie", "seuil","site", "nom", "debut", "début", "eveil" , "éveil","reveil" , "réveil","fin", "extinction","altitude", "logs", "data", "maitre", "maître","aide","mdp"]
+    ## Registre des commandes possibles par SMS.
+    commands = COMMANDS
 
-    ## Lit les données sur le bus série.
-    # @return Retourne les données.
-    def readBuffer(self, wait = 0.1):
-        try:
-            sleep(wait)
-            rdy = self.pi.serial_data_available(self.handle)
-            start = time()
-            while rdy == 0:
-                if time() - start > 60:
-                    raise Exception("Timeout : Aucune réponse")
-                rdy = self.pi.serial_data_available(self.handle)
-                sleep(0.001)
+    ## Temps maximal d'attente de la réponse (en secondes) de chaque commande AT, d'après la documentation du SIM800.
+    timeouts = {"+CMGS": 60, "+CMSS": 60, "+CMGW": 5, "+CMGL": 20, "+CMGD": 25, "+CMGR": 5, "+CCLK": 2, "+CREG": 2, "+CSQ": 2, "&W": 5, "+CPMS": 5, "+SAPBR": 85, "+HTTPACTION": 120}
+
+    ## Renvoie le temps maximal d'attente de la réponse à une commande AT.
+    # @param command La commande sans le préfixe "AT".
+    # @return Retourne le temps maximal en secondes.
+    def getTimeout(self, command):
+        name = re.match(r"[+&]?[A-Z]*", command.upper()).group(0)
+        return self.timeouts.get(name, DEFAULT_TIMEOUT)
+
+    ## Récupère les octets disponibles sur le bus série sans attendre.
+    # @return Retourne True si des octets ont été reçus.
+    def receive(self):
+        rdy = self.pi.serial_data_available(self.handle)
+        if rdy > 0:
             (b, d) = self.pi.serial_read(self.handle, rdy)
-            return d.decode("8859")
+            self.rx += d.decode("8859")
+            return b > 0
+        return False
+
+    ## Lit la réponse du module sur le bus série jusqu'à son code de résultat final (OK, ERROR, +CMS ERROR...) ou jusqu'à l'invite "> ".
+    # Les octets reçus au-delà de la réponse sont conservés pour la lecture suivante.
+    # @param timeout Temps maximal d'attente de la réponse. La valeur par défaut est DEFAULT_TIMEOUT.
+    # @param prompt Si True, la lecture s'arrête aussi à l'invite "> " de saisie d'un SMS.
+    # @return Retourne la réponse, ou "Erreur" si rien n'a été reçu.
+    def readBuffer(self, timeout = DEFAULT_TIMEOUT, prompt = False):
+        deadline = monotonic() + timeout
+        position = 0
+        sms_text = False
+        try:
+            while True:
+                # On analyse chaque nouvelle ligne complète reçue
+                end = self.rx.find("\r\n", position)
+                while end >= 0:
+                    line = self.rx[position:end]
+                    if not sms_text and self.handleURC(line): # Les notifications non sollicitées sont retirées de la réponse
+                        self.rx = self.rx[:position] + self.rx[end + 2:]
+                        end = self.rx.find("\r\n", position)
+                        continue
+                    position = end + 2
+                    if sms_text:
+                        sms_text = False
+                    elif line.startswith(SMS_HEADERS):
+                        sms_text = True
+                    elif FINAL_RESULT.match(line):
+                        response, self.rx = self.rx[:position], self.rx[position:]
+                        return response
+                    end = self.rx.find("\r\n", position)
+                if prompt and self.rx.startswith("> ", position):
+                    response, self.rx = self.rx[:position + 2], self.rx[position + 2:]
+                    return response
+                if monotonic() > deadline:
+                    raise Exception("Timeout : Aucune réponse complète après " + str(timeout) + " s")
+                if not self.receive():
+                    sleep(POLL_INTERVAL)
         except Exception as e:
             self.logger.error(e)
             self.logger.error("Erreur lors de la lecture du buffer.")
-            return "Erreur"
+            response, self.rx = self.rx, ""
+            return response if response else "Erreur"
+
+    ## Lit la réponse du module ligne par ligne, au fil de sa réception sur le bus série.
+    # Seule la ligne en cours de réception est conservée en mémoire. C'est à l'appelant de s'arrêter au code de résultat final.
+    # @param timeout Temps maximal d'attente entre deux lignes.
+    # @return Générateur des lignes reçues, sans le "\r\n" final.
+    def readLines(self, timeout = DEFAULT_TIMEOUT):
+        deadline = monotonic() + timeout
+        while True:
+            end = self.rx.find("\r\n")
+            while end >= 0:
+                line, self.rx = self.rx[:end], self.rx[end + 2:]
+                deadline = monotonic() + timeout
+                if not self.handleURC(line):
+                    yield line
+                end = self.rx.find("\r\n")
+            if monotonic() > deadline:
+                raise Exception("Timeout : Aucune réponse complète après " + str(timeout) + " s")
+            if not self.receive():
+                sleep(POLL_INTERVAL)
+
+    ## Traite une ligne si elle fait partie d'une notification non sollicitée de nouveau SMS (+CMTI ou +CMT suivi du texte).
+    # Les SMS signalés sont ajoutés à la file des SMS en attente, qui est sauvegardée.
+    # @param line La ligne reçue.
+    # @return Retourne True si la ligne a été consommée comme notification.
+    def handleURC(self, line):
+        if self.cmt is not None: # Texte d'une notification +CMT
+            self.pending_messages.append(SMS(None, "REC UNREAD", self.cmt[0], self.cmt[1], line))
+            self.cmt = None
+            self.saveQueue()
+            return True
+        match = URC_CMTI.match(line)
+        if match:
+            index = int(match.group(1))
+            if index not in self.pending_indexes:
+                self.pending_indexes.append(index)
+                self.saveQueue()
+            self.logger.info("Nouveau SMS signalé à l'indice " + str(index))
+            return True
+        match = URC_CMT.match(line)
+        if match:
+            self.cmt = match.groups()
+            return True
+        return False
+
+    ## Traite les notifications non sollicitées reçues sur le bus série en dehors de toute commande.
+    # Les autres lignes en attente (RDY, Call Ready...) sont ignorées.
+    def pollURC(self):
+        try:
+            self.receive()
+            end = self.rx.find("\r\n")
+            while end >= 0:
+                line, self.rx = self.rx[:end], self.rx[end + 2:]
+                self.handleURC(line)
+                end = self.rx.find("\r\n")
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Erreur lors de la lecture des notifications du module GSM")
+
+    ## Charge la file des SMS en attente depuis le fichier de sauvegarde.
+    def loadQueue(self):
+        if self.queue_filename is None:
+            return
+        try:
+            with open(self.queue_filename, "r") as queuefile:
+                queue = json.load(queuefile)
+            self.pending_indexes = queue.get("indexes", [])
+            self.pending_messages = [SMS(*message) for message in queue.get("messages", [])]
+            self.pending_replies = queue.get("replies", [])
+            self.pending_bulletins = queue.get("bulletins", [])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de charger la file des SMS en attente")
+
+    ## Sauvegarde la file des SMS en attente dans le fichier de sauvegarde.
+    def saveQueue(self):
+        if self.queue_filename is None:
+            return
+        try:
+            with open(self.queue_filename, "w") as queuefile:
+                json.dump({"indexes": self.pending_indexes, "messages": [list(message) for message in self.pending_messages],
+                           "replies": self.pending_replies, "bulletins": self.pending_bulletins}, queuefile)
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de sauvegarder la file des SMS en attente")
 
     ## Envoie une commande AT sans avoir besoin d'écrire "AT" .
+    # @param command La commande sans le préfixe "AT".
+    # @param timeout Temps maximal d'attente de la réponse. Par défaut, la valeur de Gsm.timeouts associée à la commande.
+    # @param prompt Si True, la lecture s'arrête aussi à l'invite "> " de saisie d'un SMS.
     # @return Retourne la réponse à la commande.
-    def sendAT(self, command, wait = 0.1):
+    def sendAT(self, command, timeout = None, prompt = False):
         try:
             self.pi.serial_write(self.handle,("AT" + command + "\r").encode("8859")) #On écrit la commande
-            return self.readBuffer(wait) #On renvoie la réponse
+            return self.readBuffer(self.getTimeout(command) if timeout is None else timeout, prompt) #On renvoie la réponse
         except Exception as e:
             self.logger.error(e)
             self.logger.error("Erreur lors de l'envoi de la commande " + str(command) + ".")
@@ -77,6 +246,7 @@ class Gsm:
         output += self.sendAT("+CMGF=1") # Met en mode texte
         output += self.sendAT("+CSCS=\"GSM\"")# Indique un encodage GSM
         output += self.sendAT("+CPMS=\"SM\",\"SM\",\"SM\"") # Indique que le stockage se fait dans la carte SIM
+        output += self.sendAT("+CNMI=2,1,0,0,0") # Signale chaque nouveau SMS stocké par une notification +CMTI
         output += self.sendAT("&W") # Sauvegarde la configuration sur la ROM du module
         self.logger.success("Module GSM configuré")
         return output
@@ -88,19 +258,69 @@ class Gsm:
 
     ## Envoie un SMS au numéro indiqué.
     # @param numero Le numéro de téléphone auquel envoyer un SMS.
-    # @param txt Le message à envoyer.
+    # @param txt Le message à envoyer. Il est translittéré dans les caractères GSM 7 bits transmis sans erreur sur l'UART.
     # @return Retourne la réponse aux commandes.
     def sendSMS(self, numero, txt):
-        output = self.sendAT("+CMGS=\"" + numero + "\"\r") #On envoie le numéro
+        txt = gsm7.transliterate(txt)
+        output = self.sendAT("+CMGS=\"" + numero + "\"", prompt = True) #On envoie le numéro et on attend l'invite de saisie
+        if not output.endswith("> "):
+            self.logger.error("Le module GSM n'a pas accepté l'envoi du SMS")
+            return output
         self.pi.serial_write(self.handle, (txt + chr(26)).encode("8859"))
-        output += self.readBuffer(1)
+        output += self.readBuffer(self.timeouts["+CMGS"])
         return output
 
+    ## Enregistre un SMS sur la carte SIM sans l'envoyer, afin de pouvoir l'envoyer ensuite à plusieurs numéros.
+    # @param txt Le message à enregistrer.
+    # @return Retourne l'indice du SMS enregistré, ou None en cas d'erreur.
+    def storeSMS(self, txt):
+        txt = gsm7.transliterate(txt)
+        output = self.sendAT("+CMGW", prompt = True)
+        if not output.endswith("> "):
+            self.logger.error("Le module GSM n'a pas accepté l'enregistrement du SMS")
+            return None
+        self.pi.serial_write(self.handle, (txt + chr(26)).encode("8859"))
+        match = re.search(r"\+CMGW: (\d+)", self.readBuffer(self.timeouts["+CMGW"]))
+        if match is None:
+            self.logger.error("Impossible d'enregistrer le SMS sur la carte SIM")
+            return None
+        return int(match.group(1))
+
+    ## Envoie un SMS enregistré sur la carte SIM au numéro indiqué.
+    # @param index L'indice du SMS enregistré.
+    # @param numero Le numéro de téléphone auquel envoyer le SMS.
+    # @return Retourne True si le SMS a été envoyé, False sinon.
+    def sendStoredSMS(self, index, numero):
+        return "+CMSS:" in self.sendAT("+CMSS=" + str(index) + ",\"" + numero + "\"")
+
+    ## Envoie le même message à plusieurs numéros. Le message est enregistré une seule fois sur la carte SIM (+CMGW) puis envoyé à chaque numéro (+CMSS),
+    # ce qui évite de retransmettre le texte sur l'UART pour chaque destinataire. S'il n'y a qu'un destinataire à servir (un seul numéro, ou budget d'un seul envoi),
+    # le message est envoyé directement (+CMGS), sans l'aller-retour d'enregistrement et de suppression sur la carte SIM.
+    # @param numeros Les numéros de téléphone, sans doublon.
+    # @param txt Le message à envoyer.
+    # @param budget Budget d'envoi du cycle (objet smsbudget.SmsBudget). Par défaut, tous les numéros sont servis.
+    # @return Retourne la liste des numéros non servis faute de budget.
+    def sendToMany(self, numeros, txt, budget = None):
+        recipients = len(numeros) if budget is None else min(len(numeros), budget.sends if budget.allow() else 0)
+        index = self.storeSMS(txt) if recipients > 1 else None
+        unsent = []
+        for numero in numeros:
+            if budget is not None and not budget.allow():
+                unsent.append(numero)
+                continue
+            if index is None or not self.sendStoredSMS(index, numero):
+                self.sendSMS(numero, txt)
+            if budget is not None:
+                budget.spend()
+        if index is not None:
+            self.deleteSMS(index)
+        return unsent
+
     ## Renvoie la date sous la forme d'un tableau [année, mois, jour, heure, minute, seconde].
     # @return Retourne le timestamp UNIX représentant le temps actuel ou 0 en cas d'erreur lors de l'accés au module.
     def getDateTime(self):
         self.logger.info("Tentative d'actualiser l'heure depuis le module GSM...")
-        buffer = self.sendAT("+CCLK?",0.1) #On récupère la date et heure du module GSM
+        buffer = self.sendAT("+CCLK?") #On récupère la date et heure du module GSM
         try:
             datetime = buffer.split("\"")[1]
             date = datetime.split(",")[0].split("/")
@@ -112,23 +332,114 @@ class Gsm:
             self.logger.error("Impossible d'obtenir la date et heure depuis le module GSM")
             return 0
         
-    ## Lit un SMS à partir de l'indice donné et renvoie le texte du message et le numéro de l'expéditeur.
-    # @param index L'indice du SMS à lire.
-    # @return Retourne le message et le numéro de téléphone de l'expéditeur ou un tableau vide en cas d'erreur lors de la lecture.
-    def readAllSMS(self):
-        buffer = self.sendAT("+CMGL=\"ALL\"",3) # On demande la lecture de tous les SMS
+    ## Lit tous les SMS de la carte SIM en les analysant au fil de leur réception sur le bus série.
+    # Chaque SMS est renvoyé dès que son texte est complet, pendant que les suivants sont encore en cours de réception.
+    # @param skip Indices des SMS à ne pas renvoyer (déjà lus). Par défaut, tous les SMS sont renvoyés.
+    # @return Générateur des SMS (objets sms.SMS), dont la valeur de retour est un tuple (ensemble des indices des SMS lus, liste des indices des entrées
+    # qui ne sont pas des SMS reçus), ou None si la liste n'a pas été lue en entier.
+    def iterSMS(self, skip = ()):
+        parser = SmsParser()
+        listed = set()
         try:
-            buffer = buffer.split("\r\n\r\n")[:-1]
-            list_sms = []
-            for sms in buffer:
-                number = sms.split(",")[2].strip("\"") # On parse la réponse
-                text = list(filter(None,sms.split("\r\n")))[1]
-                list_sms.append((number,text))
-            return list_sms
+            self.pi.serial_write(self.handle, ("AT+CMGL=\"ALL\"\r").encode("8859")) # On demande la lecture de tous les SMS
+            for line in self.readLines(self.timeouts["+CMGL"]):
+                sms = parser.feed(line)
+                if sms is not None:
+                    listed.add(sms.index)
+                    if sms.index not in skip:
+                        yield sms
+                if parser.done:
+                    break
         except Exception as E:
             self.logger.error(E)
             self.logger.error("Erreur lors de la lecture des SMS")
-            return []
+            return None
+        if parser.result != "OK":
+            self.logger.error("Erreur lors de la lecture des SMS : " + str(parser.result))
+            return None
+        return (listed, parser.ignored)
+
+    ## Lit tous les SMS de la carte SIM.
+    # @return Retourne la liste des SMS (objets sms.SMS) ou une liste vide en cas d'erreur lors de la lecture.
+    def readAllSMS(self):
+        return list(self.iterSMS())
+
+    ## Lit un SMS à partir de son indice. Si le SMS est absent de la carte SIM (+CMS ERROR, ou OK sans SMS), l'indice est retiré de la file d'attente.
+    # @param index L'indice du SMS à lire.
+    # @return Retourne le SMS (objet sms.SMS) ou None en cas d'erreur lors de la lecture.
+    def readSMS(self, index):
+        parser = SmsParser(index)
+        sms = None
+        try:
+            self.pi.serial_write(self.handle, ("AT+CMGR=" + str(index) + "\r").encode("8859"))
+            for line in self.readLines(self.timeouts["+CMGR"]):
+                sms = parser.feed(line) or sms
+                if parser.done:
+                    break
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Erreur lors de la lecture du SMS " + str(index))
+        if sms is None and parser.result is not None and (parser.result == "OK" or parser.result.startswith("+CMS ERROR")):
+            self.logger.info("SMS " + str(index) + " absent de la carte SIM, retiré de la file d'attente")
+            self.forgetIndexes([index])
+        return sms
+
+    ## Retire des indices de la file d'attente et sauvegarde la file.
+    # @param indexes Les indices à retirer.
+    def forgetIndexes(self, indexes):
+        indexes = [index for index in indexes if index in self.pending_indexes]
+        if indexes:
+            self.pending_indexes = [index for index in self.pending_indexes if index not in indexes]
+            self.saveQueue()
+
+    ## Renvoie le nombre de SMS stockés sur la carte SIM, sans les lire.
+    # @return Retourne le nombre de SMS, ou None en cas d'erreur.
+    def countSMS(self):
+        match = re.search(r'\+CPMS: "[^"]*",(\d+)', self.sendAT("+CPMS?"))
+        return int(match.group(1)) if match else None
+
+    ## Renvoie les SMS à traiter : ceux de la file d'attente, complétés par la lecture de la carte SIM si elle contient d'autres SMS
+    # (reçus par exemple pendant que le Raspberry Pi était éteint). Si la file est vide et la carte SIM aussi, aucune lecture n'est faite.
+    # Les SMS de la file sont lus un par un ; la carte SIM n'est lue en entier que si elle contient des SMS dont l'indice n'a pas été lu.
+    # Après une lecture complète, les indices de la file absents de la carte SIM sont retirés, et les entrées qui ne sont pas des SMS reçus
+    # (par exemple un SMS enregistré par +CMGW resté sur la carte SIM après une coupure) sont supprimées : sans cela, elles imposeraient une lecture complète à chaque cycle.
+    # @return Générateur des SMS (objets sms.SMS).
+    def iterPendingSMS(self):
+        self.pollURC()
+        for sms in list(self.pending_messages):
+            yield sms
+        count = self.countSMS()
+        seen = set()
+        if count is not None and count <= len(self.pending_indexes):
+            for index in list(self.pending_indexes):
+                sms = self.readSMS(index)
+                if sms is not None:
+                    seen.add(index)
+                    yield sms
+            if len(seen) >= count:
+                return
+        # Carte SIM contenant des SMS non signalés ou nombre inconnu : lecture complète, sans renvoyer les SMS déjà lus
+        result = yield from self.iterSMS(skip = seen)
+        if result is not None:
+            (listed, ignored) = result
+            self.forgetIndexes([index for index in self.pending_indexes if index not in listed])
+            if ignored:
+                self.logger.info("Suppression de " + str(len(ignored)) + " entrée(s) de la carte SIM qui ne sont pas des SMS reçus")
+                for index in ignored:
+                    self.deleteSMS(index)
+
+    ## Retire des SMS traités de la file d'attente et les supprime de la carte SIM.
+    # @param list_sms Les SMS traités.
+    def deleteProcessedSMS(self, list_sms):
+        for sms in list_sms:
+            if sms.index is None:
+                if sms in self.pending_messages:
+                    self.pending_messages.remove(sms)
+            else:
+                self.deleteSMS(sms.index)
+                if sms.index in self.pending_indexes:
+                    self.pending_indexes.remove(sms.index)
+        self.saveQueue()
 
     ## Supprime un SMS à partir de son indice.
     # @param index L'indice du SMS à supprimer.
@@ -161,189 +472,117 @@ class Gsm:
     # @param sms Le SMS dont l'on souhaite obtenir le status.
     # @return Retourne le status du SMS. 0 = SMS normal (dans tous les cas sauf ceux ci-dessous). 1 = commande pour modifier un paramètre (si le texte contient "=" et une commande valide). 2 = commande pour lire un paramètre (si le texte contient "?" et une commande valide). 3 = mot de passe reçu (si le texte contient le mot de passe). 
     def getStatus(self ,sms):
-        if ("=" in sms and sms.split("=")[0].lower().strip() in self.command):
-            return 1
-        elif ("?" in sms and sms.split("?")[0].lower().strip() in self.command):
-            return 2
+        request = self.commands.parse(sms)
+        if request is not None:
+            return 1 if request[1] == SET else 2
         elif (self.config.getGsmPswd() in sms):
             return 3
         else:
             return 0
 
+    ## Exécute une commande reconnue par le registre des commandes et renvoie la réponse.
+    # @param command La commande (objet commands.Command).
+    # @param operation commands.GET ou commands.SET.
+    # @param argument Le texte après l'opérateur.
+    # @return Retourne la réponse à la commande.
+    def executeCommand(self, command, operation, argument):
+        if not command.supports(operation):
+            self.logger.info("Commande inconnue")
+            return "Commande inconnue."
+        return command.get(self, argument) if operation == GET else command.set(self, argument)
 
     ## Exécute une commande de lecture de paramètre à partir du texte du sms.
     # @param command La commande à exécuter.
-    # @param sensorsData Le rapport météo sous la forme d'un dictionnaire.
     # @return Retourne la réponse à la commande.
     def executeGetCommand(self, command):
-        #On récupère ce qui est avant le ?, on le met en minuscule et on enlève les espaces avant et après
-        word = command.split("?")[0].lower().strip()
-        #Selon la commande, on effectue différentes actions
-        if word == "seuil":
-            self.logger.info("Envoi du seuil limite de la batterie")
-            return "Seuil de la batterie : " + str(self.config.getBatteryLimit()) + " mV"
-        elif word == "site" or word == "nom":
-            self.logger.info("Envoi du nom de la station")
-            return "Nom de la station : " + str(self.config.getSiteName())
-        elif word == "debut" or word == "début" or word == "eveil" or word == "éveil" or word == "reveil" or word == "réveil":
-            self.logger.info("Envoi de l'heure de réveil de la station")
-            return "Heure de révéil de la station : " + str(self.config.getWakeupHour()) + " h"
-        elif word == "fin" or word == "extinction":
-            self.logger.info("Envoi de l'heure d'extinction de la station")
-            return "Heure d'extinction de la station : " + str(self.config.getSleepHour()) + " h"
-        elif word == "altitude":
-            self.logger.info("Envoi de l'altitude de la station")
-            return "Altitude de la station : " + str(self.config.getSiteAltitude()) + " m"
-        elif word == "logs":
-            self.logger.info("Envoi des logs")
-            return self.getLogs(command.split("?")[1])
-        elif word == "data":
-            self.logger.info("Envoi des dernières données")
-            return self.getData(command.split("?")[1])
-        elif word == "batterie":
-            self.logger.info("Envoi de la tension de la batterie")
-            return self.getBattery(command.split("?")[1])
-        elif word == "aide":
-            self.logger.info("Envoi de la liste des commandes")
-            return "Envoyez n'importe quel message pour obtenir le dernier bulletin météo. \nVotre sms peut aussi contenir l'une des commandes suivantes : batterie?, seuil?, nom?, altitude?, eveil?, extinction?, maitre?"
-        elif word == "maitre" or word == "maître":
-            self.logger.info("Envoi du numéro maître de la station")
-            return "Numéro maitre de la station : " + str(self.config.getGsmMaster())
-        
-        self.logger.info("Commande inconnue")
-        return "Commande inconnue."
+        request = self.commands.parse(command)
+        if request is None or request[1] != GET:
+            self.logger.info("Commande inconnue")
+            return "Commande inconnue."
+        return self.executeCommand(*request)
 
     ## Exécute une commande de modification de paramètres à partir d'un sms, et renvoie la réponse.
     # @param command La commande à exécuter.
     # @return Retourne la réponse à la commande.
     def executeSetCommand(self, command):
-        #On récupère ce qui est de part et d'autres du =, on met le premier en minuscule et on enlève les espaces avant et après
-        word = command.split("=")[0].lower().strip()
-        arg = command.split("=")[1].strip()
-        #Selon la commande, on effectue différentes actions
-        if word == "debut" or word == "début" or word == "eveil" or word == "éveil":
-            try:
-                if(int(arg) >= int(self.config.getSleepHour())):
-                    raise Exception("Heure de réveil supérieur à l'heure d'extinction")
-                elif(int(arg)<0):
-                    raise Exception("Heure de réveil inferieur à 0")
-                else:
-                     self.config.setWakeupHour(int(arg))
-                    
-            except Exception as e:
-                self.logger.error(e)
-                self.logger.error("Impossible de mettre à jour l'heure de réveil")
-                return "Heure de réveil incorrecte, merci de n'envoyer qu'un nombre entre 0 et l'heure d'extinction."
-            else:
-                self.logger.success("L'heure de réveil a été correctement mise à jour : " + str(arg) + "h")
-                return "Heure de réveil correctement mise a jour : " + str(arg) + " h"
-
-        elif word == "fin" or word == "extinction":
-            try:
-                if(int(arg) <= int(self.config.getWakeupHour())):
-                    raise Exception("Heure d'extinction inférieur à l'heure d'extinction")
-                elif(int(arg)>23):
-                    raise Exception("Heure de réveil inferieur à 0")
-                else:
-                    self.config.setSleepHour(int(arg))
-            except Exception as e:
-                self.logger.error(e)
-                self.logger.error("Impossible de mettre à jour l'heure d'extinction")
-                return "Heure d'extinction incorrecte, merci de n'envoyer qu'un nombre entre l'heure de réveil et 23."
-            else:
-                self.logger.success("L'heure d'extinction a été correctement mise à jour : " + str(arg) + "h")
-                return "Heure d'extinction correctement mise a jour : " + str(arg) + "h"
-
-        elif word == "site" or word == "nom":
-            try:
-                self.config.setSiteName(str(arg[:125]))
-            except Exception as e:
-                self.logger.error(e)
-                self.logger.error("Impossible de mettre à jour le nom de la station")
-                return "Une erreur est survenue, merci de réessayer."
-            else:
-                self.logger.success("Le nom de la station a été correctement mise à jour : " + str(arg[:125]))
-                return "Le nom de la station a été correctement mis a jour : " + str(arg[:125])
-
-        elif word == "altitude":
-            try:
-                self.config.setSiteAltitude(int(arg))
-            except Exception as e:
-                self.logger.error(e)
-                self.logger.error("Impossible de mettre à jour l'altitude")
-                return "Altitude incorrecte, merci de n'envoyer qu'un nombre."
-            else:
-                self.logger.success("L'altitude a été correctement mis à jour : " + str(arg))
-                return "Altitude correctement mise a jour : " + str(arg) + " m"
-        
-        elif word == "seuil":
-            try:
-                if(int(arg) >= 12000):
-                    raise Exception("Seuil trop élevé")
-                elif(int(arg)<= 10000):
-                    raise Exception("Seuil trop faible")
-                else:
-                    self.config.setBatteryLimit(str(int(arg)))
-            except Exception as e:
-                self.logger.error(e)
-                self.logger.error("Impossible de mettre à jour le seuil de la batterie")
-                return "Seuil incorrect, merci de n'envoyer qu'un nombre."
-            else:
-                self.logger.success("Le seuil de la batterie a été correctement mis à jour : " + str(arg))
-                return "Le seuil de la batterie a été correctement mis a jour : " + str(arg) + " mV"
-        elif word == "mdp":
-            try:
-                if(len(str(arg)) < 4):
-                    raise Exception("Le mot de passe doit faire au moins 5 caractères")
-                else:
-                    self.config.setGsmPswd(str(arg))
-            except Exception as e:
-                self.logger.error(e)
-                self.logger.error("Impossible de mettre à jour le mot de passe")
-                return "Impossible de mettre à jour le mot de passe"
-            else:
-                self.logger.success("Le mot de passe a été correctement mis à jour : " + str(arg))
-                return "Le mot de passe a été correctement mis a jour : " + str(arg)
-        
-        self.logger.info("Commande inconnue")
-        return "Commande inconnue."
+        request = self.commands.parse(command)
+        if request is None or request[1] != SET:
+            self.logger.info("Commande inconnue")
+            return "Commande inconnue."
+        return self.executeCommand(*request)
 
     ## Répond à tous les SMS reçus.
+    # Les SMS sont analysés et leurs réponses préparées au fil de la lecture de la carte SIM, puis les réponses sont envoyées une fois la lecture terminée,
+    # dans la limite du budget du cycle (smsbudget.SmsBudget) : les réponses au numéro maître d'abord, puis les autres réponses et enfin les bulletins.
+    # L'alerte batterie est envoyée en premier, hors budget, pour ne pas priver le numéro maître de sa réponse lorsque la batterie est proche du seuil.
+    # Les réponses et bulletins hors budget sont conservés dans la file des SMS en attente pour le cycle suivant.
     # @param sensorsData Le rapport météo sous la forme d'un dictionnaire.
     def respondToSMS(self, sensorsData):
         config_set = False
         self.logger.info("Analyse des SMS reçus...")
-        list_sms = self.readAllSMS() #On récupère la liste des indices des SMS
-        self.logger.success(str(len(list_sms)) + " SMS reçus")
+        replies = [] #Liste des réponses à envoyer sous la forme (numéro, texte)
+        bulletin_numbers = {} #Numéros ayant demandé le bulletin, sans doublon et dans l'ordre de réception
+        processed = [] #SMS traités, à supprimer
+        master = self.config.getGsmMaster()
+        password = self.config.getGsmPswd()
         i = 0
-        for sms in list_sms: #On les parcourt
+        for sms in self.iterPendingSMS(): #On traite chaque SMS dès sa réception
             i = i + 1
+            processed.append(sms)
             self.logger.info("Traitement du SMS numéro " + str(i) + "...")
             try:
-                self.logger.info("Lecture du SMS : " + str(sms[0]) + " / Message : " + str(sms[1]))
-                status = self.getStatus(sms[1]) #On récupère le status (commande, mot de passe, infos)
-                if status == 1: #S'il s'agit d'une commande d'écriture
-                    if (sms[0] == self.config.getGsmMaster()): #Si le numéro est le bon, on l'autorise
-                        self.sendSMS(sms[0], self.executeSetCommand(sms[1])) #On exécute la commande et on réponds le message de confirmation ou d'erreur
-                        config_set = True
-                    else: #Sinon, on répond que ce n'est pas possible
+                self.logger.info("Lecture du SMS : " + str(sms.number) + " / Message : " + str(sms.text))
+                request = self.commands.parse(sms.text) #On analyse le texte une seule fois pour retrouver la commande
+                if request is not None: #S'il s'agit d'une commande de lecture ou d'écriture
+                    command, operation, argument = request
+                    if command.permissions[operation] == MASTER and sms.number != master: #Seul le numéro maître est autorisé
                         self.logger.info("Permission refusée : ce numéro n'est pas le maître de la station")
-                        self.sendSMS(sms[0], "Vous n'avez pas la permission d'effectuer cette commande.")
-                elif status == 2: #S'il s'agit d'une commande de lecture, on renvoie la réponse adaptée
-                    self.sendSMS(sms[0], self.executeGetCommand(sms[1]))
-                elif status == 3: #S'il s'agit du mot de passe
-                    self.sendSMS(sms[0], "Vous etes désormais le nouveau responsable de la station.")
-                    self.config.setGsmMaster(str(sms[0]))
+                        replies.append((sms.number, "Vous n'avez pas la permission d'effectuer cette commande."))
+                    else: #On exécute la commande et on prépare la réponse, le message de confirmation ou d'erreur
+                        replies.append((sms.number, self.executeCommand(command, operation, argument)))
+                        if operation == SET:
+                            config_set = True
+                            master = self.config.getGsmMaster()
+                            password = self.config.getGsmPswd()
+                elif password in sms.text: #S'il s'agit du mot de passe
+                    replies.append((sms.number, "Vous etes désormais le nouveau responsable de la station."))
+                    self.config.setGsmMaster(str(sms.number))
+                    master = sms.number
                     config_set = True
-                    self.logger.info("Nouveau maître de la station : " + str(sms[0]))
-                elif status == 0: #Si ce n'est pas une des 3 possibilités, on renvoie le sms contenant les infos
-                    self.sendSMS(sms[0], self.createSMS(sensorsData))
+                    self.logger.info("Nouveau maître de la station : " + str(sms.number))
+                else: #Si ce n'est ni une commande ni le mot de passe, on renvoie le sms contenant les infos
+                    bulletin_numbers[sms.number] = True
                     self.logger.info("Envoie du bulletin météo")
             except Exception as e:
                 self.logger.error(e)
                 self.logger.error("Impossible de traiter le SMS numéro "+ str(i))
             else :
                 self.logger.success("Traitement du SMS numéro " + str(i) + " terminé")
+        self.logger.success(str(i) + " SMS reçus")
+
+        budget = SmsBudget(sensorsData['Battery'], self.config.getBatteryLimit())
+        #On mesure la tension de la batterie, et s'il elle sous le seuil d'alerte, on envoie un message en priorité, hors budget
+        battery = sensorsData['Battery']
+        if battery <= int(self.config.getBatteryLimit())+100 and battery != 0:
+            self.sendSMS(master, "[" +  sensorsData['Time'] + "]\n/!\\ La tension de la batterie (" + str(battery) + " mV) est proche du seuil (" + str(self.config.getBatteryLimit()) + " mV) , la station risque de ne plus fonctionner correctement. /!\\")
+
+        #Une fois la lecture terminée, on envoie les réponses reportées puis les nouvelles, celles du numéro maître en premier
+        replies = sorted(self.pending_replies + [list(reply) for reply in replies], key = lambda reply: reply[0] != master)
+        self.pending_replies = []
+        for number, text in replies:
+            if budget.allow():
+                self.sendSMS(number, text)
+                budget.spend()
+            else:
+                self.pending_replies.append([number, text])
+        bulletin_numbers = sorted(dict.fromkeys(self.pending_bulletins + list(bulletin_numbers)), key = lambda number: number != master)
+        self.pending_bulletins = []
+        if bulletin_numbers: #Le bulletin est créé une seule fois et envoyé à chaque numéro l'ayant demandé
+            self.logger.info("Envoi du bulletin météo à " + str(len(bulletin_numbers)) + " numéros")
+            self.pending_bulletins = self.sendToMany(bulletin_numbers, self.createSMS(sensorsData), budget)
+        if self.pending_replies or self.pending_bulletins:
+            self.logger.info(str(len(self.pending_replies) + len(self.pending_bulletins)) + " SMS reportés au cycle suivant faute de budget")
+        self.saveQueue()
         
         if config_set :
             try:
@@ -356,60 +595,144 @@ class Gsm:
 
             
 
-        try:  #On supprime tous les SMS
-            self.deleteAllSMS()
+        try:  #On supprime uniquement les SMS traités
+            if processed:
+                self.deleteProcessedSMS(processed)
         except Exception as e:
             self.logger.error(e)
             self.logger.error("Erreur lors de la suppression des SMS")
         else:
             self.logger.success("Suppression des SMS terminée")
-    
-        #On mesure la tension de la batterie, et s'il elle sous le seuil d'alerte, on envoie un message
-        battery = sensorsData['Battery']
-        if battery <= int(self.config.getBatteryLimit())+100 and battery != 0:
-            self.sendSMS(self.config.getGsmMaster(), "[" +  sensorsData['Time'] + "]\n/!\\ La tension de la batterie (" + str(battery) + " mV) est proche du seuil (" + str(self.config.getBatteryLimit()) + " mV) , la station risque de ne plus fonctionner correctement. /!\\")
 
-    def getLogs(self, nb_line):
+    ## Attend une ligne de réponse commençant par un préfixe donné, par exemple une notification arrivant après le OK de la commande.
+    # @param prefix Le préfixe attendu.
+    # @param timeout Temps maximal d'attente.
+    # @return Retourne la ligne, ou None en cas d'erreur ou de timeout.
+    def waitFor(self, prefix, timeout):
         try:
-            nb_line = int(nb_line)
+            for line in self.readLines(timeout):
+                if line.startswith(prefix):
+                    return line
+                if FINAL_RESULT.match(line) and line != "OK":
+                    self.logger.error("Réponse du module GSM : " + line)
+                    return None
         except Exception as e:
-            logger.error(e)
-            logger.error("Le paramètre doit être un entier.")
-            nb_line = 1
-        pattern = r"(?P<time>.*) \| (?P<message>.*)"  
-        output = ""
-        for groups in list(logger.parse("logs/logs.log", pattern))[-nb_line:]:
-            output += groups["time"] + " | " + groups["message"] + "\n"
-        return output
+            self.logger.error(e)
+            self.logger.error("Pas de réponse " + prefix + " du module GSM")
+        return None
 
-    def getData(self, nb_line):
+    ## Ouvre la connexion GPRS (bearer 1) et initialise le service HTTP du module.
+    # @param apn Le nom du point d'accès GPRS de l'opérateur.
+    # @param url L'adresse à laquelle envoyer les données.
+    # @return Retourne True si la session est ouverte.
+    def openHTTP(self, apn, url):
+        self.logger.info("Ouverture de la connexion GPRS...")
+        self.sendAT("+SAPBR=3,1,\"Contype\",\"GPRS\"")
+        self.sendAT("+SAPBR=3,1,\"APN\",\"" + apn + "\"")
+        if not self.sendAT("+SAPBR=1,1").endswith("OK\r\n") and "+SAPBR: 1,1" not in self.sendAT("+SAPBR=2,1"):
+            self.logger.error("Impossible d'ouvrir la connexion GPRS")
+            return False
+        output = self.sendAT("+HTTPINIT")
+        output += self.sendAT("+HTTPPARA=\"CID\",1")
+        output += self.sendAT("+HTTPPARA=\"URL\",\"" + url + "\"")
+        output += self.sendAT("+HTTPPARA=\"CONTENT\",\"application/json\"")
+        output += self.sendAT("+HTTPPARA=\"USERDATA\",\"Content-Encoding: gzip\"")
+        if "ERROR" in output:
+            self.logger.error("Impossible d'initialiser le service HTTP du module GSM")
+            self.closeHTTP()
+            return False
+        self.logger.success("Connexion GPRS ouverte")
+        return True
+
+    ## Termine le service HTTP et ferme la connexion GPRS.
+    def closeHTTP(self):
+        self.sendAT("+HTTPTERM")
+        self.sendAT("+SAPBR=0,1")
+
+    ## Envoie des données par une requête HTTP POST dans la session ouverte.
+    # @param data Les octets à envoyer.
+    # @return Retourne le code de statut HTTP, ou 0 en cas d'erreur du module.
+    def postHTTP(self, data):
         try:
-            nb_line = int(nb_line)
+            self.pi.serial_write(self.handle, ("AT+HTTPDATA=" + str(len(data)) + ",10000\r").encode("8859"))
+            if self.waitFor("DOWNLOAD", DEFAULT_TIMEOUT) is None:
+                return 0
+            self.pi.serial_write(self.handle, data)
+            if not self.readBuffer().endswith("OK\r\n"):
+                return 0
+            if not self.sendAT("+HTTPACTION=1").endswith("OK\r\n"):
+                return 0
+            line = self.waitFor("+HTTPACTION:", self.timeouts["+HTTPACTION"]) # +HTTPACTION: 1,<statut>,<taille>
+            return int(line.split(",")[1]) if line is not None else 0
         except Exception as e:
-            logger.error(e)
-            logger.error("Le paramètre doit être un entier.")
-            nb_line = 1
-        pattern = r"(?P<time>.*) \| (?P<message>.*)"  
-        output = ""
-        for groups in list(logger.parse("logs/data.log", pattern))[-nb_line:]:
-            output += groups["time"] + " | " + groups["message"] + "\n"
-        return output
+            self.logger.error(e)
+            self.logger.error("Erreur lors de la requête HTTP")
+            return 0
 
-    def getBattery(self, nb_line):
+    ## Publie les observations en attente par lots, en une seule session GPRS.
+    # Chaque lot est retiré de la file dès que le serveur l'a acquitté. En cas d'échec, la publication s'arrête et reprendra au même lot lors de la session suivante.
+    # @param outbox La file des observations (objet outbox.Outbox).
+    # @param apn Le nom du point d'accès GPRS de l'opérateur.
+    # @param url L'adresse à laquelle envoyer les données.
+    # @param batch_size Nombre maximal d'observations par requête. La valeur par défaut est 50.
+    # @return Retourne le nombre d'observations publiées.
+    def uploadOutbox(self, outbox, apn, url, batch_size = 50):
+        batches = outbox.batches(batch_size)
+        if not batches:
+            return 0
+        if not self.openHTTP(apn, url):
+            return 0
+        sent = 0
+        try:
+            for batch in batches:
+                status = self.postHTTP(outbox.encode(batch))
+                if status < 200 or status >= 300:
+                    self.logger.error("Échec de la publication d'un lot de " + str(len(batch)) + " observations (statut " + str(status) + ")")
+                    break
+                outbox.acknowledge(len(batch))
+                sent += len(batch)
+        finally:
+            self.closeHTTP()
+        self.logger.success(str(sent) + " observations publiées")
+        return sent
+
+    ## Renvoie les dernières lignes d'un fichier de log.
+    # @param path Le chemin du fichier de log courant.
+    # @param nb_line Le nombre de lignes demandées.
+    # @return Retourne les lignes, une par ligne de texte.
+    def getLogLines(self, path, nb_line):
         try:
             nb_line = int(nb_line)
         except Exception as e:
-            logger.error(e)
-            logger.error("Le paramètre doit être un entier.")
+            self.logger.error(e)
+            self.logger.error("Le paramètre doit être un entier.")
             nb_line = 1
-        pattern = r"(?P<time>.*) \| (?P<message>.*)"  
         output = ""
-        for groups in list(logger.parse("logs/battery.log", pattern))[-nb_line:]:
-            output += groups["time"] + " | " + groups["message"] + "\n"
+        for line in self.log_tail.tail(path, nb_line):
+            output += line + "\n"
         return output
 
+    ## Renvoie les dernières lignes des logs généraux.
+    # @param nb_line Le nombre de lignes demandées.
+    # @return Retourne les lignes.
+    def getLogs(self, nb_line):
+        return self.getLogLines("logs/logs.log", nb_line)
+
+    ## Renvoie les derniers bulletins météo enregistrés.
+    # @param nb_line Le nombre de lignes demandées.
+    # @return Retourne les lignes.
+    def getData(self, nb_line):
+        return self.getLogLines("logs/data.log", nb_line)
+
+    ## Renvoie les dernières tensions de la batterie enregistrées.
+    # @param nb_line Le nombre de lignes demandées.
+    # @return Retourne les lignes.
+    def getBattery(self, nb_line):
+        return self.getLogLines("logs/battery.log", nb_line)
+
 
     ## Crée le message à envoyer par SMS pour transmettre les informations. Pour chaque valeur, on écrit "n/a" si la valeur n'a pas été trouvée.
+    # La mise en page la plus lisible qui tient en un seul SMS (160 septets GSM 7 bits) est choisie, et son nombre de segments est conservé dans bulletin_segments.
     # @param sensorsData Le rapport météo sous la forme d'un dictionnaire.
     # @return Retourne le message.
     def createSMS(self, sensorsData):
@@ -422,8 +745,12 @@ class Gsm:
         humidite = str(int(sensorsData['Humidity'])) if int(sensorsData['Humidity']) <= 100 and int(sensorsData['Humidity']) >= 0 else "n/a"
         hauteur_nuages = str(int(sensorsData['Cloud'])) if int(sensorsData['Cloud']) >= 0 else "n/a"
         
-        output = (self.config.getSiteName() + " (" + str(self.config.getSiteAltitude()) + " m)") + "\n"
-        output += "[" + str(sensorsData['Time']) + "]\n\n"
+        nom = self.config.getSiteName()
+        altitude = str(self.config.getSiteAltitude())
+        heure = str(sensorsData['Time'])
+
+        output = (nom + " (" + altitude + " m)") + "\n"
+        output += "[" + heure + "]\n\n"
         output += "Vent moyen : " + vitesse_moy + " km/h " + direction_moy + "deg \n\n"
         output += "Vent maximum : " + vitesse_max + " km/h " + direction_max + "deg \n\n"
         output += "Température : " + temperature + " C\n"
@@ -431,4 +758,16 @@ class Gsm:
         output += "Pression : " + pression + " hPa\n"
         output += "Hauteur des nuages: " + hauteur_nuages + " m"
 
+        # Mises en page de plus en plus compactes, utilisées si la précédente dépasse un segment
+        compact = nom + " (" + altitude + " m) [" + heure + "]\n"
+        compact += "Vent moy: " + vitesse_moy + " km/h " + direction_moy + "deg\n"
+        compact += "Vent max: " + vitesse_max + " km/h " + direction_max + "deg\n"
+        compact += "Temp: " + temperature + " C\nHumidite: " + humidite + " %\nPression: " + pression + " hPa\nNuages: " + hauteur_nuages + " m"
+        mesures = "[" + heure + "]\nVmoy " + vitesse_moy + "km/h " + direction_moy + "\nVmax " + vitesse_max + "km/h " + direction_max + "\n"
+        mesures += "T " + temperature + "C H " + humidite + "% P " + pression + "hPa\nNuages " + hauteur_nuages + "m"
+        minimal = nom + " " + mesures
+        tronque = nom[:max(0, gsm7.SINGLE_SEPTETS - len(gsm7.transliterate(mesures)) - 1)] + " " + mesures
+
+        output, self.bulletin_segments = gsm7.compact([output, compact, minimal, tronque])
+        self.logger.info("Bulletin météo : " + str(len(output)) + " caractères, " + str(self.bulletin_segments) + " segment(s)")
         return output
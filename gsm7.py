@@ -0,0 +1,102 @@
+## @file gsm7.py
+# Fonctions de calcul du coût d'un texte dans l'alphabet GSM 7 bits (3GPP TS 23.038) et de translittération des caractères
+# qui ne passent pas tels quels sur l'UART du module GSM configuré en +CSCS="GSM".
+##
+
+import unicodedata
+
+## Alphabet GSM 7 bits par défaut : le caractère d'indice n a le code n. "\x1b" est l'échappement vers la table d'extension.
+BASIC = ("@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞ\x1bÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+         "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà")
+
+## Caractères de la table d'extension, codés sur deux septets (échappement + code).
+EXTENSION = "\f^{}\\[~]|€"
+
+## Caractères transmis sans erreur en ISO-8859 sur l'UART : leur code ASCII est aussi leur code GSM 7 bits.
+SAFE = frozenset(c for (code, c) in enumerate(BASIC) if ord(c) == code and c != "\x1b")
+
+## Remplacements des caractères courants sans équivalent sûr, avant la suppression des accents.
+REPLACEMENTS = {"°": "deg", "œ": "oe", "Œ": "OE", "æ": "ae", "Æ": "AE", "ß": "ss", "’": "'", "‘": "'", "“": "\"", "”": "\"", "«": "\"", "»": "\"",
+                "–": "-", "—": "-", "…": "...", "_": "-", "|": "-", "@": "a", "$": "USD", "€": "EUR", "£": "GBP", "[": "(", "]": ")", "{": "(", "}": ")",
+                "~": "-", "^": "", "\\": "/", "`": "'", "\t": " ", "\xa0": " ", "ø": "o", "Ø": "O"}
+
+## Nombre de septets d'un SMS en un seul segment.
+SINGLE_SEPTETS = 160
+## Nombre de septets de chaque segment d'un SMS concaténé (l'en-tête de concaténation occupe le reste).
+MULTI_SEPTETS = 153
+## Nombre de caractères d'un SMS UCS-2 en un seul segment.
+SINGLE_UCS2 = 70
+## Nombre de caractères de chaque segment d'un SMS UCS-2 concaténé.
+MULTI_UCS2 = 67
+
+## Renvoie le coût en septets d'un caractère.
+# @param c Le caractère.
+# @return Retourne 1 (table de base), 2 (table d'extension) ou None si le caractère n'existe pas dans l'alphabet GSM 7 bits.
+def cost(c):
+    if c in BASIC and c != "\x1b":
+        return 1
+    if c in EXTENSION:
+        return 2
+    return None
+
+## Renvoie le nombre de septets d'un texte.
+# @param text Le texte.
+# @return Retourne le nombre de septets, ou None si le texte doit être envoyé en UCS-2.
+def septets(text):
+    total = 0
+    for c in text:
+        septet = cost(c)
+        if septet is None:
+            return None
+        total += septet
+    return total
+
+## Renvoie le nombre de segments nécessaires pour envoyer un texte.
+# Un caractère de la table d'extension n'est jamais coupé entre deux segments.
+# @param text Le texte.
+# @return Retourne le nombre de segments.
+def segments(text):
+    total = septets(text)
+    if total is None:
+        return 1 if len(text) <= SINGLE_UCS2 else -(-len(text) // MULTI_UCS2)
+    if total <= SINGLE_SEPTETS:
+        return 1
+    count, used = 1, 0
+    for c in text:
+        septet = cost(c)
+        if used + septet > MULTI_SEPTETS:
+            count, used = count + 1, 0
+        used += septet
+    return count
+
+## Translittère un texte pour qu'il ne contienne que des caractères sûrs (SAFE) : un septet chacun, transmis sans erreur sur l'UART.
+# Les accents sont supprimés, les caractères courants sont remplacés (REPLACEMENTS) et les autres deviennent "?".
+# @param text Le texte.
+# @return Retourne le texte translittéré.
+def transliterate(text):
+    output = []
+    for c in text:
+        if c in SAFE:
+            output.append(c)
+            continue
+        c = REPLACEMENTS.get(c, c)
+        if all(d in SAFE for d in c):
+            output.append(c)
+            continue
+        stripped = "".join(d for d in unicodedata.normalize("NFKD", c) if not unicodedata.combining(d))
+        output.append(stripped if stripped and all(d in SAFE for d in stripped) else "?")
+    return "".join(output)
+
+## Choisit la première mise en page qui tient en un seul segment, après translittération.
+# @param layouts Les mises en page, de la plus lisible à la plus compacte.
+# @return Retourne un tuple (texte, nombre de segments). Si aucune ne tient en un segment, la plus courte est renvoyée.
+def compact(layouts):
+    best = None
+    for layout in layouts:
+        text = transliterate(layout)
+        count = segments(text)
+        if count == 1:
+            return (text, 1)
+        if best is None or septets(text) < septets(best[0]):
+            best = (text, count)
+    return best
@@ -1,13 +1,39 @@
-
 ## @file i2c.py
 # Définition de la classe I2C. Elle permet une utilisation simplifié du protocole et bus I2C.
 ##
 
 
-from time import sleep
+from threading import RLock
+from time import sleep, monotonic
+
+## Temps d'attente fixe (en secondes) utilisé auparavant avant chaque transaction. Sert de référence pour calculer le temps économisé.
+LEGACY_WAIT = 1
+
+## Profil de temporisation par défaut d'un appareil esclave.
+# - settle : délai minimal entre deux transactions sur l'appareil.
+# - min_wait : première attente lorsque l'appareil n'est pas prêt.
+# - max_wait : attente maximale entre deux essais (borne de l'attente exponentielle).
+# - factor : facteur multiplicatif de l'attente exponentielle.
+# - timeout : temps maximal pour qu'une transaction aboutisse.
+# - clock_stretch : l'esclave maintient SCL tant que la réponse n'est pas prête, la lecture peut donc suivre immédiatement l'écriture du registre.
+DEFAULT_PROFILE = {"settle": 0.05, "min_wait": 0.01, "max_wait": 0.5, "factor": 2, "timeout": 3, "clock_stretch": False}
 
-## Classe I2C. 
+## Profils de temporisation connus, indexés par adresse I2C.
+PROFILES = {
+    # MKRFOX 1200 (SAMD21) : la bibliothèque Wire étire l'horloge pendant le traitement de la requête
+    0x55: {"settle": 0.02, "min_wait": 0.01, "max_wait": 0.5, "factor": 2, "timeout": 3, "clock_stretch": True},
+    # ATTINY (USI) : pas d'étirement d'horloge fiable, on laisse le temps à l'esclave de préparer la réponse
+    0x44: {"settle": 0.1, "min_wait": 0.02, "max_wait": 0.5, "factor": 2, "timeout": 3, "clock_stretch": False},
+    # BMP085/BMP180 : registres lisibles dès l'écriture de leur adresse, l'attente des conversions est faite par le pilote
+    0x77: {"settle": 0, "min_wait": 0.005, "max_wait": 0.05, "factor": 2, "timeout": 1, "clock_stretch": True},
+}
+
+## Classe I2C.
 #  Cette classe permet la communication à partir d'un bus I2C.
+#  Plutôt que d'attendre une seconde avant chaque transaction, elle respecte un délai minimal entre deux transactions (profil de l'appareil)
+#  puis réessaie la transaction avec une attente exponentielle bornée tant que l'esclave ne répond pas.
+#  Chaque opération sur les registres est protégée par un verrou : l'écriture de l'adresse d'un registre et la lecture de sa valeur ne peuvent pas être
+#  entrecoupées par une transaction d'un autre thread (par exemple l'attente de l'heure Sigfox par TimeSync).
 class I2C:
 
     ## Constructeur.
@@ -15,15 +41,30 @@ class I2C:
     # @param logger Logger principal.
     # @param i2c_address L'addresse I2C de l'appareil esclave.
     # @param nb_try Nombres d'essais maximum de l'initialisation du bus I2C. La valeur par défaut est 5.
-    def __init__(self, pi, i2c_address, logger, nb_try = 5):
+    # @param profile Profil de temporisation de l'appareil. Par défaut, le profil associé à l'adresse dans PROFILES.
+    def __init__(self, pi, i2c_address, logger, nb_try = 5, profile = None):
         ## Logger principal.
         self.logger = logger
         ## Instance de pigpio
         self.pi = pi
+        ## Adresse I2C de l'appareil esclave.
+        self.address = i2c_address
+        ## Profil de temporisation de l'appareil.
+        self.profile = dict(DEFAULT_PROFILE)
+        self.profile.update(PROFILES.get(i2c_address, {}) if profile is None else profile)
+        ## Instant de la dernière transaction sur l'appareil.
+        self.last_transaction = 0
+        ## Temps passé à attendre le bus depuis le début du cycle.
+        self.wait_time = 0
+        ## Temps qu'auraient coûté les attentes fixes depuis le début du cycle.
+        self.legacy_wait_time = 0
+        ## Référence de la connexion I2C.
+        self.handle = None
+        ## Verrou des opérations sur les registres, partagé entre les threads.
+        self.lock = RLock()
         self.logger.info("Tentative de connexion au bus I2C...")
         for i in range(nb_try):
             try:
-                ## Référence de la connexion I2C.
                 self.handle = self.pi.i2c_open(1, i2c_address) # On tente d'établir la connexion
             except Exception as e: #Si ça ne marche pas on attend avant de rententer
                 logger.error(e)
@@ -33,56 +74,152 @@ class I2C:
                 logger.success("Bus I2C connecté")
                 break
 
+    ## Attend pendant une durée donnée et comptabilise le temps d'attente.
+    # @param duration Durée de l'attente en secondes.
+    def wait(self, duration):
+        if duration > 0:
+            sleep(duration)
+            self.wait_time += duration
+
+    ## Attend que le délai minimal depuis la dernière transaction soit écoulé.
+    def settle(self):
+        self.wait(self.profile["settle"] - (monotonic() - self.last_transaction))
+
+    ## Exécute une transaction en la réessayant avec une attente exponentielle bornée tant que l'esclave n'est pas prêt.
+    # @param transaction Fonction réalisant la transaction. Elle lève une exception si l'esclave ne répond pas.
+    # @return Retourne le résultat de la transaction.
+    def poll(self, transaction):
+        delay = self.profile["min_wait"]
+        deadline = monotonic() + self.profile["timeout"]
+        while True:
+            try:
+                result = transaction()
+            except Exception:
+                if monotonic() + delay > deadline:
+                    raise
+                self.wait(delay)
+                delay = min(delay * self.profile["factor"], self.profile["max_wait"])
+            else:
+                self.last_transaction = monotonic()
+                return result
+
+    ## Écrit des octets sur le bus en attendant que l'esclave soit prêt.
+    # @param data Les octets à écrire.
+    def write(self, data):
+        self.settle()
+        def transaction():
+            if self.pi.i2c_write_device(self.handle, data) < 0:
+                raise Exception("Aucun acquittement de l'appareil " + hex(self.address))
+        self.poll(transaction)
+
+    ## Lit des octets sur le bus en attendant que l'esclave soit prêt.
+    # @param length Le nombre d'octet à lire.
+    # @return Retourne les octets lus.
+    def read(self, length):
+        if not self.profile["clock_stretch"]:
+            self.settle()
+        def transaction():
+            count, data = self.pi.i2c_read_device(self.handle, length)
+            if count != length:
+                raise Exception("Réponse incomplète de l'appareil " + hex(self.address) + " (" + str(count) + "/" + str(length) + " octets)")
+            return data
+        return self.poll(transaction)
+
+    ## Renvoie le temps d'attente économisé sur le bus depuis le début du cycle par rapport aux attentes fixes.
+    # @return Retourne un tuple (temps attendu, temps économisé) en secondes.
+    def getWaitReport(self):
+        return (self.wait_time, self.legacy_wait_time - self.wait_time)
+
     ## Opération de lecture d'un registre sur le bus I2C.
-  
+
     # @param reg L'adresse du registre à lire.
     # @param length Le nombre d'octet à lire.
     # @return Retourne la valeur du registre ou 0 en cas d'erreur.
     def readReg(self, reg, length):
-        try:
-            sleep(1)
-            self.pi.i2c_write_device(self.handle, [reg])
-            sleep(1)
-            buffer = self.pi.i2c_read_device(self.handle, length)
-            self.logger.success("Données " + str(buffer[1]) + " reçues sur le registre " + str(reg))
-            return int.from_bytes(buffer[1], byteorder='big', signed=False) 
-        except Exception as e:
-            self.logger.error(e)
-            self.logger.error("Impossible de lire le registre " + str(reg))
-            return 0
+        with self.lock:
+            self.legacy_wait_time += 2 * LEGACY_WAIT
+            try:
+                self.write([reg])
+                buffer = self.read(length)
+                self.logger.success("Données " + str(buffer) + " reçues sur le registre " + str(reg))
+                return int.from_bytes(buffer, byteorder='big', signed=False)
+            except Exception as e:
+                self.logger.error(e)
+                self.logger.error("Impossible de lire le registre " + str(reg))
+                return 0
 
     ## Opération de lecture de tous les registres sur le bus I2C.
     # @param length Le nombre d'octet à lire.
     # @return Retourne la valeur des registres ou 0 en cas d'erreur.
     def readAll(self, length):
-        try:
-            sleep(1)
-            buffer = self.pi.i2c_read_device(self.handle, length)
-            if buffer[1]:
-                self.logger.success("Données " + str(buffer[1]) + " reçues")
-                return buffer[1]
-            else:
+        with self.lock:
+            self.legacy_wait_time += LEGACY_WAIT
+            try:
+                buffer = self.read(length)
+                if buffer:
+                    self.logger.success("Données " + str(buffer) + " reçues")
+                    return buffer
+                else:
+                    self.logger.error("Impossible de lire les registres de l'ATTINY")
+                    return bytearray([0] * length)
+            except Exception as e:
+                self.logger.error(e)
                 self.logger.error("Impossible de lire les registres de l'ATTINY")
                 return bytearray([0] * length)
-        except Exception as e:
-            self.logger.error(e)
-            self.logger.error("Impossible de lire les registres de l'ATTINY")
-            return bytearray([0] * length)
+
+    ## Opération de lecture de plusieurs registres en une seule transaction sur le bus I2C.
+    # La liste des adresses est transmise en une écriture, puis les valeurs sont lues à la suite en une lecture.
+    # @param regs La liste des adresses des registres à lire, éventuellement précédée d'un octet de commande propre à l'appareil.
+    # @param length Le nombre total d'octet à lire.
+    # @param nb_reg Le nombre de registres de données lus, sans l'octet de commande. Par défaut, le nombre d'adresses de regs.
+    # @return Retourne les octets lus ou None en cas d'erreur.
+    def readBlock(self, regs, length, nb_reg = None):
+        with self.lock:
+            self.legacy_wait_time += 2 * LEGACY_WAIT * (len(regs) if nb_reg is None else nb_reg)
+            try:
+                self.write(bytearray(regs))
+                buffer = self.read(length)
+                self.logger.success("Données " + str(buffer) + " reçues sur les registres " + str(list(regs)))
+                return buffer
+            except Exception as e:
+                self.logger.error(e)
+                self.logger.error("Impossible de lire les registres " + str(list(regs)))
+                return None
+
+    ## Opération d'écriture de plusieurs registres en une seule transaction sur le bus I2C.
+    # @param payload Les octets à écrire, composés pour chaque registre de son adresse suivie de ses données.
+    # @param nb_reg Le nombre de registres contenus dans les données.
+    # @return Retourne True si l'écriture a réussi, False sinon.
+    def writeBlock(self, payload, nb_reg):
+        with self.lock:
+            self.legacy_wait_time += LEGACY_WAIT * nb_reg
+            try:
+                self.write(bytearray(payload))
+                self.logger.success("Données " + str(bytes(payload)) + " transmises sur " + str(nb_reg) + " registres")
+                return True
+            except Exception as e:
+                self.logger.error(e)
+                self.logger.error("Impossible d'envoyer les données " + str(bytes(payload)))
+                return False
 
     ## Opération d'écriture d'un registre sur le bus I2C.
     # @param reg L'adresse du registre à écrire.
     # @param data Les données à écrire dans le registre.
     # @param length Le nombre d'octet à écrire.
+    # @return Retourne True si l'écriture a réussi, False sinon.
     def writeReg(self, reg, data, length):
-        try:
-            if isinstance(data, list):
-                data_array = bytearray(data)
-            else:
-                data_array = bytearray(data.to_bytes(length, 'big'))
-            data_array.insert(0, reg)
-            sleep(1)
-            self.pi.i2c_write_device(self.handle, data_array)
-            self.logger.success("Données transmises sur le registre " + str(reg) + ", données=" + str(data) + ")")
-        except Exception as e:
-            self.logger.error(e)
-            self.logger.error("Impossible d'envoyer les données sur le registre " + str(reg) + ", données=" + str(data) + ")")
\ No newline at end of file
+        with self.lock:
+            self.legacy_wait_time += LEGACY_WAIT
+            try:
+                if isinstance(data, list):
+                    data_array = bytearray(data)
+                else:
+                    data_array = bytearray(data.to_bytes(length, 'big'))
+                data_array.insert(0, reg)
+                self.write(data_array)
+                self.logger.success("Données transmises sur le registre " + str(reg) + ", données=" + str(data) + ")")
+                return True
+            except Exception as e:
+                self.logger.error(e)
+                self.logger.error("Impossible d'envoyer les données sur le registre " + str(reg) + ", données=" + str(data) + ")")
+                return False
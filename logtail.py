@@ -0,0 +1,116 @@
+## @file logtail.py
+# Définition de la classe LogTail. Elle lit les dernières lignes des fichiers de log en partant de la fin, sans parcourir tout le fichier.
+##
+
+import glob
+import os
+
+## Classe LogTail.
+# Cette classe lit les fichiers de log par blocs en remontant depuis la fin, et continue dans les fichiers archivés par la rotation de loguru
+# lorsque le fichier courant ne contient pas assez de lignes. Les positions des lignes déjà trouvées sont conservées,
+# de sorte qu'une nouvelle demande pendant le même cycle ne relit que les lignes demandées.
+class LogTail:
+
+    ## Taille des blocs lus en remontant dans le fichier.
+    BLOCK_SIZE = 4096
+
+    ## Séparateur entre l'heure et le message dans les lignes de log.
+    SEPARATOR = b" | "
+
+    ## Constructeur.
+    def __init__(self):
+        ## Index des fichiers lus. Pour chaque chemin : taille indexée, position du début de la plus ancienne ligne indexée,
+        # et positions (début, fin) des lignes de log trouvées, de la plus récente à la plus ancienne.
+        self.index = {}
+
+    ## Renvoie le fichier courant suivi des fichiers archivés par la rotation, du plus récent au plus ancien.
+    # @param path Le chemin du fichier de log courant.
+    # @return Retourne la liste des chemins.
+    def files(self, path):
+        stem, ext = os.path.splitext(path)
+        return [path] + sorted(glob.glob(glob.escape(stem) + ".*" + ext), reverse=True)
+
+    ## Met à jour l'index d'un fichier jusqu'à contenir au moins le nombre de lignes demandé ou atteindre le début du fichier.
+    # @param path Le chemin du fichier.
+    # @param nb_line Le nombre de lignes souhaité.
+    # @return Retourne l'entrée de l'index du fichier.
+    def scan(self, path, nb_line):
+        size = os.path.getsize(path)
+        entry = self.index.get(path)
+        with open(path, "rb") as logfile:
+            if entry is None or size < entry["size"]:
+                # Fichier inconnu ou remplacé : on part de la fin de la dernière ligne complète
+                logfile.seek(max(0, size - self.BLOCK_SIZE))
+                data = logfile.read()
+                end = size - len(data) + data.rfind(b"\n") + 1 if b"\n" in data else size
+                entry = {"size": end, "position": end, "lines": []}
+                self.index[path] = entry
+            elif size > entry["size"]:
+                # On indexe seulement les lignes complètes ajoutées depuis la dernière lecture
+                logfile.seek(entry["size"])
+                data = logfile.read(size - entry["size"])
+                end = data.rfind(b"\n") + 1
+                entry["lines"] = self.split(data[:end], entry["size"]) + entry["lines"]
+                entry["size"] += end
+            # On remonte par blocs depuis la plus ancienne ligne indexée
+            lines = entry["lines"]
+            position = entry["position"]
+            block_start = position
+            buffer = b""
+            while len(lines) < nb_line and position > 0:
+                new_start = max(0, block_start - self.BLOCK_SIZE)
+                logfile.seek(new_start)
+                buffer = logfile.read(block_start - new_start) + buffer
+                block_start = new_start
+                while buffer and len(lines) < nb_line:
+                    start = buffer.rfind(b"\n", 0, len(buffer) - 1) + 1
+                    if start == 0 and block_start > 0: # Ligne incomplète, il faut lire le bloc précédent
+                        break
+                    if self.SEPARATOR in buffer[start:]:
+                        lines.append((block_start + start, position))
+                    position = block_start + start
+                    buffer = buffer[:start]
+            entry["position"] = position
+        return entry
+
+    ## Découpe un bloc de lignes complètes et renvoie les positions des lignes de log, de la plus récente à la plus ancienne.
+    # @param data Le bloc de lignes.
+    # @param offset La position du bloc dans le fichier.
+    # @return Retourne la liste des positions (début, fin).
+    def split(self, data, offset):
+        lines = []
+        start = 0
+        for line in data[:-1].split(b"\n") if data else []:
+            if self.SEPARATOR in line:
+                lines.append((offset + start, offset + start + len(line) + 1))
+            start += len(line) + 1
+        lines.reverse()
+        return lines
+
+    ## Lit les lignes d'un fichier à partir de leurs positions.
+    # @param path Le chemin du fichier.
+    # @param lines Les positions (début, fin) des lignes, de la plus récente à la plus ancienne.
+    # @return Retourne les lignes, de la plus ancienne à la plus récente.
+    def read(self, path, lines):
+        if not lines:
+            return []
+        first, last = lines[-1][0], lines[0][1]
+        with open(path, "rb") as logfile:
+            logfile.seek(first)
+            data = logfile.read(last - first)
+        return [data[start - first:end - first].decode("utf-8", "replace").rstrip("\r\n") for (start, end) in reversed(lines)]
+
+    ## Renvoie les dernières lignes d'un fichier de log, en poursuivant dans les fichiers archivés si nécessaire.
+    # @param path Le chemin du fichier de log courant.
+    # @param nb_line Le nombre de lignes demandées.
+    # @return Retourne les lignes, de la plus ancienne à la plus récente.
+    def tail(self, path, nb_line):
+        output = []
+        for logfile in self.files(path):
+            if len(output) >= nb_line:
+                break
+            if not os.path.exists(logfile):
+                continue
+            missing = nb_line - len(output)
+            output = self.read(logfile, self.scan(logfile, missing)["lines"][:missing]) + output
+        return output
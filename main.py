@@ -2,28 +2,49 @@
 # Script principal du Raspberry Pi. Il est automatiquement exécuté au démarrage à l'aide d'un service.
 ##
 
-from time import sleep
 from attiny import Attiny
 from config import ConfigFile
 from gsm import Gsm
 from mkrfox import Mkrfox
 from loguru import logger
 from sensors import Sensors
+from onewire import OneWire
 from radio import Radio
 from attiny import Attiny
 from os import system
 from threading import Thread
+from chrono import Chrono
+from timesync import TimeSync
+from outbox import Outbox
 import time
+import sys
 import pigpio
 
 ## Nombre d'essais pour l'initialisation des capteurs
 MESURES_TRY = 3
 ## Temps maximal d'attente pour faire une mesure
 TIMEOUT_MEASURE = 10
+## Temps accordé à une mesure du baromètre (en secondes) : 30 ms permettent la résolution maximale
+BAROMETER_BUDGET = 0.03
+## Temps de suréchantillonnage de chaque grandeur (en secondes). La pression est suréchantillonnée pendant la conversion du thermomètre (750 ms),
+# sans allonger l'acquisition ; "python simulation.py" mesure le bruit de la pression publiée selon ce temps.
+OVERSAMPLING = {"Temperature": 0, "Humidity": 0, "Pressure": 0.5}
+## Temps maximal d'attente de l'heure Sigfox (en secondes)
+SIGFOX_TIME_TIMEOUT = 90
 ## Nom du fichier de configuration
 CONFIG_FILENAME = "config.ini" 
 ## Addresse I2C du MKRFOX
 MKRFOX_ADDR = 0x55 
+## Fichier de la copie locale des registres du MKRFOX
+MKRFOX_SHADOW_FILENAME = "mkrfox.json"
+## Fichier de sauvegarde de la file des SMS signalés par le module GSM et pas encore traités.
+SMS_QUEUE_FILENAME = "sms_queue.json"
+## Fichier de cache des chemins des sondes de température 1-wire
+W1_CACHE_FILENAME = "w1_devices.json"
+## Fichier de sauvegarde de la calibration du baromètre
+BAROMETER_FILENAME = "bmp085.json"
+## Fichier des observations en attente de publication sur Internet
+OUTBOX_FILENAME = "outbox.jsonl"
 ## Addresse I2C du ATTINY
 ATTINY_ADDR = 0x44 
 
@@ -31,6 +52,12 @@ ATTINY_ADDR = 0x44
 TTS_SPEED = 120 
 ## Tonalité de la synthèse vocale
 TTS_PITCH = 30 
+## Répertoire du cache audio des phrases du bulletin radio
+AUDIO_CACHE_DIRECTORY = "audio_cache"
+## Sortie audio du bulletin radio : "alsa", "wav" ou "null"
+AUDIO_OUTPUT = "alsa"
+## Fichier WAV du bulletin radio en simulation
+AUDIO_SIMULATION_FILENAME = "radio_simulation.wav"
 
 ## Numéro de pin du capteur d'humidité DHT11
 GPIO_DHT11 = 23
@@ -39,6 +66,9 @@ GPIO_TW = 5
 ## Numéro de pin du relais contrôlant le push-to-talk
 GPIO_PTT = 6
 
+## Mode simulation : le matériel est remplacé par simulation.SimulatedPi et les commandes système ne sont pas exécutées
+SIMULATION = "--simulation" in sys.argv
+
 
 
 # Configuration des loggers (log, data et batterie)
@@ -56,11 +86,28 @@ logger_log.info("###############################################################
 logger_log.info("###################### DEBUT NOUVEAU CYCLE ######################")
 logger_log.info("#################################################################")
 
+## Chronomètre des phases du cycle
+chrono = Chrono(logger_log)
+chrono.start("initialisation")
+
+## Exécute une commande système. En simulation, la commande est seulement journalisée.
+# @param command La commande à exécuter.
+def run(command):
+    if SIMULATION:
+        logger_log.info("Simulation, commande non exécutée : " + command)
+    else:
+        system(command)
+
 ## Initialisation du fichier de configuration
 config = ConfigFile(filename = CONFIG_FILENAME)
 
 ## Initialise l'instancie pigpio
-pi = pigpio.pi()
+if SIMULATION:
+    from simulation import SimulatedPi
+    pi = SimulatedPi(dht11_gpio = GPIO_DHT11)
+    logger_log.success("Pigpio simulé initialisé")
+else:
+    pi = pigpio.pi()
 if not pi.connected: # On vérifie que le deamon pigpiod est bien en cours d'exécution sinon on le démarre
     logger_log.info("Lancement du deamon pigpiod")
     system("sudo pigpiod") 
@@ -73,79 +120,77 @@ else:
     logger_log.success("Pigpio initialisé")
 
 ## Initialisation de l'instance Mkrfox
-mkrfox = Mkrfox(pi = pi, i2c_address = MKRFOX_ADDR, logger = logger_log, nb_try=MESURES_TRY)
+mkrfox = Mkrfox(pi = pi, i2c_address = MKRFOX_ADDR, logger = logger_log, nb_try=MESURES_TRY, shadow_filename = MKRFOX_SHADOW_FILENAME,
+                block_mode = config.getMkrfoxBlockMode())
 ## Initialisation de l'instance Attiny
 attiny = Attiny(pi = pi, i2c_address = ATTINY_ADDR, logger = logger_log, nb_try=MESURES_TRY)
 ## Initialisation de l'instance Sensors
-sensors = Sensors(dht11_gpio = GPIO_DHT11, config = config, pi = pi, logger = logger_log, logger_data=logger_data, init_nbtry=MESURES_TRY, timeout=TIMEOUT_MEASURE)
+sensors = Sensors(dht11_gpio = GPIO_DHT11, config = config, pi = pi, logger = logger_log, logger_data=logger_data, init_nbtry=MESURES_TRY, timeout=TIMEOUT_MEASURE,
+                  w1_root = pi.w1.root if SIMULATION else OneWire.ROOT, w1_cache_filename = W1_CACHE_FILENAME,
+                  barometer_filename = BAROMETER_FILENAME, barometer_budget = BAROMETER_BUDGET, oversampling = OVERSAMPLING)
 ## Initialisation de l'instance Radio
-radio = Radio(config = config, logger = logger_log, pi = pi, speed = TTS_SPEED, pitch = TTS_PITCH, tw_gpio = GPIO_TW, ptt_gpio = GPIO_PTT)
+radio = Radio(config = config, logger = logger_log, pi = pi, speed = TTS_SPEED, pitch = TTS_PITCH, tw_gpio = GPIO_TW, ptt_gpio = GPIO_PTT, cache_directory = AUDIO_CACHE_DIRECTORY,
+              audio_output = "wav" if SIMULATION else AUDIO_OUTPUT, audio_filename = AUDIO_SIMULATION_FILENAME)
 ## Initialisation de l'instance GSM
-gsm = Gsm(config = config, pi = pi, logger = logger_log, mesures_nbtry=MESURES_TRY)
+gsm = Gsm(config = config, pi = pi, logger = logger_log, init_nbtry=MESURES_TRY, queue_filename = SMS_QUEUE_FILENAME)
+## Initialisation de la file des observations à publier
+outbox = Outbox(filename = OUTBOX_FILENAME, logger = logger_log)
 
+chrono.start("heure")
+## Registres d'état, d'erreur, d'heure et de batterie du MKRFOX, à 0 si la lecture a échoué
+status = mkrfox.readGroup("status")
+if status is None:
+    status = dict.fromkeys(mkrfox.groups["status"], 0)
+# Si le MKRFOX a redémarré, sa configuration doit être entièrement réécrite
+mkrfox.detectReset()
 ## Registre d'état du cycle
-state = mkrfox.read("state")
+state = status["state"]
 state = state | 0b00000001
 mkrfox.write("state",state)
 
-# Si c'est le premier cycle de la journée alors on récupère date et heure du GSM si possible, sinon on recupère sur le MKRFOX
+## Arbitre des sources d'heure
+timesync = TimeSync(logger = logger_log, dry_run = SIMULATION)
+# L'horloge du MKRFOX est toujours proposée, avec la qualité la plus faible
+timesync.offer("mkrfox", status["time"])
+# Si c'est le premier cycle de la journée alors on récupère date et heure du GSM si possible, sinon on demande l'heure au module Sigfox
 if(state & 0b00000100 == 4):
     # Initialise le module GSM avec les commandes AT de configuration
     gsm.setup() 
      # Si le module GSM est connecté au réseau
     if gsm.isConnected():
         # Récupère la date et heure à partir du module GSM
-        epochTime = gsm.getDateTime()
+        gsm_time = timesync.offer("gsm", gsm.getDateTime())
     else:
-        epochTime = 0
+        gsm_time = False
         logger_log.error("Le module GSM n'a pas de réseau.")
-    # Si l'heure est différente de 0 on met à jour l'heure système du Raspberry et on la transmet au MKRFOX, sinon on demande l'heure au module Sigfox
-    if epochTime != 0:
-        mkrfox.write("time", epochTime)
-        system("sudo date -s '@" + str(epochTime) + "'")
+    # Si l'heure GSM est valide on la transmet au MKRFOX, sinon l'heure Sigfox est attendue pendant les mesures
+    if gsm_time:
+        mkrfox.write("time", round(timesync.best()[1]))
     else:
-        logger_log.info("Tentative d'actualiser l'heure depuis le module SigFox...")
-        # On envoie 0 au registre time du MKRFOX pour lui signaler de recupérer l'heure par le module Sigfox 
-        mkrfox.write("time", 0) 
-        state = mkrfox.read("state")
-        # On attends que l'heure soit actualisé par le MKRFOX
-        while(state & 0b00000010 != 2): 
-            state = mkrfox.read("state")
-            sleep(5)
-        sleep(1)
-         # On reçois l'heure du MKRFOX
-        epochTime = mkrfox.read("time")
-        # Si l'heure est différente de 0 on met à jour l'heure système du Raspberry, sinon erreur
-        if epochTime != 0:
-            system("sudo date -s '@" + str(epochTime) + "'")
-            logger_log.success("Date et heure actualisées depuis le module SigFox")
-        else:
-            logger_log.error("Impossible d'actualisées l'heure depuis le module SigFox")
-        state = state & 0b11111101
+        timesync.startSigfox(mkrfox, SIGFOX_TIME_TIMEOUT)
+timesync.apply()
+
+## Vérifie que l'heure actuelle est dans la plage de fonctionnement. Sinon, le cycle est signalé comme terminé au MKRFOX et le Raspberry Pi est éteint si nécessaire.
+def checkOperatingHours():
+    global state
+    if time.localtime().tm_hour > config.getSleepHour() or time.localtime().tm_hour < config.getWakeupHour(): 
+        # On signale au mkrfox que le cycle est terminé
+        state = state & 0b11111110
         mkrfox.write("state", state)
-else:
-    epochTime = mkrfox.read("time")
-    # Si l'heure est différente de 0 on met à jour l'heure système du Raspberry, sinon erreur
-    if epochTime != 0: 
-        system("sudo date -s '@" + str(epochTime) + "'")
-        logger_log.success("Date et heure actualisées depuis le MKRFOX")
-    else:
-        logger_log.error("Impossible d'actualisées l'heure depuis le MKRFOX")
-      
-# Si l'heure actuelle est en dehors de la plage de fonctionnement alors on arrête le script
-if time.localtime().tm_hour > config.getSleepHour() or time.localtime().tm_hour < config.getWakeupHour(): 
-    # On signale au mkrfox que le cycle est terminé
-    state = state & 0b11111110
-    mkrfox.write("state", state)
-    logger_log.info("Heure actuelle en dehors de la plage fonctionnement. Extinction du raspberry immédiate")
-    logger_log.info("#################################################################")
-    logger_log.info("########################### FIN CYCLE ###########################")
-    logger_log.info("#################################################################")
-    logger_log.info("\n\n")
-     # Si le raspberry doit être éteint
-    if(state & 0b00001000 == 8):
-        system("sudo shutdown -h now")
+        logger_log.info("Heure actuelle en dehors de la plage fonctionnement. Extinction du raspberry immédiate")
+        logger_log.info("#################################################################")
+        logger_log.info("########################### FIN CYCLE ###########################")
+        logger_log.info("#################################################################")
+        logger_log.info("\n\n")
+         # Si le raspberry doit être éteint
+        if(state & 0b00001000 == 8):
+            run("sudo shutdown -h now")
 
+# Si l'heure est définitive, on arrête le script tout de suite lorsque l'heure actuelle est en dehors de la plage de fonctionnement
+if timesync.sigfox_thread is None:
+    checkOperatingHours()
+
+chrono.start("mesures")
 ## Requête des données du vent
 attiny.askRead()
 
@@ -158,21 +203,28 @@ windData = attiny.getWindData()
 # Mise à jour des données
 sensorsData.update(windData)
 
+# Si l'heure Sigfox était attendue pendant les mesures, on applique la meilleure heure obtenue avant de vérifier la plage de fonctionnement
+if timesync.sigfox_thread is not None:
+    timesync.finish()
+    checkOperatingHours()
+
 # Logs des données
 logger_data.info(",".join([str(d) for d in sensorsData.items()]))
 
 # Récupère la tension de la batterie et l'enregistre dans un log
-logger_log.info("Lecture de la tension de la batterie...")
-try:
-    battery = mkrfox.read("battery")
-except:
+# La tension a été lue avec le groupe de registres d'état en début de cycle
+battery = status["battery"]
+if battery == 0:
     logger_log.error("Impossible de lire la tension de la batterie")
-    battery = 0
 else:
     logger_log.success("Lecture de la batterie terminée")
 sensorsData["Battery"] = battery
 logger_battery.info(sensorsData['Battery'])
+# Ajout de l'observation à la file de publication sur Internet, si elle est activée
+if config.getUploadUrl():
+    outbox.add(sensorsData)
 
+chrono.start("diffusion")
 ## Joue le message audio sur la radio
 thread_radio = Thread(target = Radio.playVoiceMessage, args=(radio,sensorsData))
 thread_radio.start()
@@ -188,16 +240,28 @@ thread_gsm.start()
 
 
 thread_gsm.join()
+# Publication des observations en attente, en une seule session GPRS tous les upload_cycles cycles
+if config.getUploadUrl() and len(outbox.pending()) >= config.getUploadCycles():
+    gsm.uploadOutbox(outbox, config.getUploadApn(), config.getUploadUrl())
 if(state & 0b00001000 == 8):
     gsm.sleep()
 thread_mkrfox.join()
-## Met à jour la configuration sur le MKRFOX
-configData = {"sleep":config.getSleepHour(),"wakeup":config.getWakeupHour(),"battery_threshold":config.getBatteryLimit()}
-mkrfox.updateConfig(configData)
 thread_radio.join()
-# On signale au mkrfox que le cycle est terminé
+chrono.start("fin de cycle")
+# On met à jour la configuration sur le MKRFOX (uniquement les valeurs modifiées) et on lui signale que le cycle est terminé, en une seule transaction
+mkrfox.updateConfig({"sleep":config.getSleepHour(),"wakeup":config.getWakeupHour(),"battery_threshold":config.getBatteryLimit()})
 state = state & 0b11111110
-mkrfox.write("state", state) 
+mkrfox.stage("state", state)
+mkrfox.flush()
+# Bilan du temps d'attente sur le bus I2C
+for name, device in (("MKRFOX", mkrfox), ("ATTINY", attiny)):
+    wait_time, saved_time = device.i2c_bus.getWaitReport()
+    logger_log.info("Bus I2C " + name + " : " + str(round(wait_time, 2)) + " s d'attente, " + str(round(saved_time, 2)) + " s économisées")
+# Bilan de la durée des phases du cycle
+chrono.report()
+if SIMULATION:
+    for kind, (count, duration) in pi.getStats().items():
+        logger_log.info("Simulation " + kind + " : " + str(count) + " opérations, " + str(round(duration, 3)) + " s")
 logger_log.info("Extinction du raspberry immédiate")
 logger_log.info("#################################################################")
 logger_log.info("########################### FIN CYCLE ###########################")
@@ -209,6 +273,6 @@ pi.stop()
 
 # Si le raspberry doit être éteint
 if(state & 0b00001000 == 8): 
-    system("sudo shutdown -h now")
+    run("sudo shutdown -h now")
 
 
@@ -4,6 +4,8 @@
 ##
 
 from i2c import I2C
+import struct
+import json
 
 ## Classe Mkrfox. 
 #  Cette classe permet la communication avec le microcontrolleur Arduino MKRFOX 1200.
@@ -14,11 +16,23 @@ class Mkrfox:
     # @param logger Logger principal.
     # @param i2c_address Adresse I2C du MKRFOX 1200.
     # @param nb_try Nombres d'essais maximum de l'initialisation du bus I2C. La valeur par défaut est 5.
-    def __init__(self, pi, i2c_address, logger, nb_try):
+    # @param shadow_filename Fichier de sauvegarde de la copie locale des registres. Par défaut, la copie n'est pas sauvegardée.
+    # @param block_mode True si le programme du MKRFOX accepte les transferts groupés (octet BLOCK_READ, couples adresse/données).
+    # Par défaut, les groupes de registres sont lus et écrits registre par registre, comme le programme actuel du MKRFOX l'attend.
+    def __init__(self, pi, i2c_address, logger, nb_try, shadow_filename = None, block_mode = False):
          ## Objet I2C initialisé.
         self.i2c_bus = I2C(pi, i2c_address, logger, nb_try)
         ## Logger principal.
         self.logger = logger
+        ## Fichier de sauvegarde de la copie locale des registres.
+        self.shadow_filename = shadow_filename
+        ## True si les groupes de registres sont transférés en une seule transaction.
+        self.block_mode = block_mode
+        ## Copie locale des dernières valeurs connues des registres du MKRFOX.
+        self.shadow = {}
+        ## Écritures en attente, regroupées jusqu'au prochain appel de flush().
+        self.pending = {}
+        self.loadShadow()
 
     
     ## Liste des nom des registres associés à leurs adresses et nombres d'octects.
@@ -32,34 +46,184 @@ class Mkrfox:
             "battery" : (0x06,4),
             "battery_threshold" :(0x07,4)
     }
-   
+
+    ## Groupes de registres nommés pouvant être lus ou écrits en une seule transaction.
+    groups = {
+            "status" : ("state", "error", "time", "battery"),
+            "config" : ("sleep", "wakeup", "battery_threshold")
+    }
+
+    ## Octet de commande précédant la liste des adresses d'une lecture groupée, pour la distinguer d'une écriture.
+    BLOCK_READ = 0x80
+
+    ## Masque du bit d'état indiquant le premier cycle de la journée.
+    FIRST_CYCLE = 0b00000100
+
+    ## Formats struct associés au nombre d'octets d'un registre (gros-boutiste, non signé).
+    formats = {1 : "B", 2 : "H", 4 : "I"}
+
+    ## Cache des codecs struct déjà construits, indexés par la liste des noms de registres.
+    codecs = {}
+
+    ## Renvoie le codec struct permettant d'encoder ou décoder d'un bloc les registres donnés.
+    # @param names Les noms des registres, dans l'ordre du bloc.
+    # @return Retourne l'objet struct.Struct du bloc.
+    def codec(self, names):
+        names = tuple(names)
+        if names not in self.codecs:
+            fmt = ">"
+            for name in names:
+                length = self.register[name][1]
+                fmt += self.formats.get(length, str(length) + "s")
+            self.codecs[names] = struct.Struct(fmt)
+        return self.codecs[names]
+
+    ## Renvoie la liste des registres d'un groupe nommé ou d'une plage contiguë d'adresses.
+    # @param group Nom d'un groupe de Mkrfox.groups, tuple (premier registre, dernier registre) ou liste de noms de registres.
+    # @return Retourne la liste des noms de registres.
+    def resolve(self, group):
+        if isinstance(group, str):
+            return list(self.groups[group])
+        if isinstance(group, tuple) and len(group) == 2 and group[0] in self.register and group[1] in self.register:
+            first, last = self.register[group[0]][0], self.register[group[1]][0]
+            return [name for name, (address, length) in sorted(self.register.items(), key=lambda reg: reg[1][0]) if first <= address <= last]
+        return list(group)
 
     ## Opération de lecture d'un registre du MKRFOX.
     # @param regName Nom du registre à lire.
     # @param length Le nombre d'octet à lire.
     # @return Retourne la valeur du registre.
     def read(self, regName):
-        return self.i2c_bus.readReg(self.register[regName][0], self.register[regName][1])
+        value = self.i2c_bus.readReg(self.register[regName][0], self.register[regName][1])
+        self.shadow[regName] = value
+        return value
     
     ## Opération d'écriture d'un registre du MKRFOX.
     # @param regName Nom du registre à écrire.
     # @param data Les données à écrire.
     # @param length Le nombre d'octet à écrire.
     def write(self, regName, data):
-        self.i2c_bus.writeReg(self.register[regName][0], data, self.register[regName][1])
+        if self.i2c_bus.writeReg(self.register[regName][0], data, self.register[regName][1]):
+            self.shadow[regName] = data
+            self.pending.pop(regName, None)
 
-    ## Met à jours les différents paramètres du MKRFOX de configuration de la station.
-    # @param data Les paramètres à mettre à jour.
-    def updateConfig(self, data):
+    ## Opération de lecture d'un groupe de registres du MKRFOX, en une seule transaction en mode groupé, sinon registre par registre.
+    # @param group Nom du groupe, plage (premier registre, dernier registre) ou liste de noms de registres.
+    # @return Retourne un dictionnaire associant chaque nom de registre à sa valeur, ou None en cas d'erreur.
+    def readGroup(self, group):
+        names = self.resolve(group)
+        if self.block_mode:
+            codec = self.codec(names)
+            buffer = self.i2c_bus.readBlock([self.BLOCK_READ] + [self.register[name][0] for name in names], codec.size, len(names))
+            if buffer is None:
+                return None
+            values = dict(zip(names, codec.unpack(bytes(buffer))))
+        else:
+            values = {}
+            for name in names:
+                (address, length) = self.register[name]
+                buffer = self.i2c_bus.readBlock([address], length)
+                if buffer is None:
+                    return None
+                values[name] = self.codec([name]).unpack(bytes(buffer))[0]
+        self.shadow.update(values)
+        return values
+
+    ## Opération d'écriture de plusieurs registres du MKRFOX. En mode groupé, chaque registre est transmis sous la forme de son adresse suivie de ses données,
+    # en une seule transaction ; sinon, les registres sont écrits un par un.
+    # @param data Dictionnaire associant les noms des registres à écrire à leurs valeurs.
+    # @return Retourne True si l'écriture a réussi, False sinon.
+    def writeGroup(self, data):
+        if not self.block_mode:
+            success = True
+            for name, value in data.items():
+                success = self.i2c_bus.writeReg(self.register[name][0], value, self.register[name][1]) and success
+            return success
+        payload = bytearray()
+        for name, value in data.items():
+            payload.append(self.register[name][0])
+            payload += self.codec([name]).pack(bytes(value) if isinstance(value, list) else value)
+        return self.i2c_bus.writeBlock(payload, len(data))
+
+    ## Charge la copie locale des registres de configuration depuis le fichier de sauvegarde.
+    def loadShadow(self):
+        if self.shadow_filename is None:
+            return
         try:
-            self.write("sleep",data["sleep"])
-            self.write("wakeup",data["wakeup"])
-            self.write("battery_threshold",data["battery_threshold"])
+            with open(self.shadow_filename, "r") as shadowfile:
+                self.shadow.update(json.load(shadowfile))
+        except FileNotFoundError:
+            self.logger.info("Aucune copie locale des registres du MKRFOX, synchronisation complète au prochain envoi")
         except Exception as e:
             self.logger.error(e)
-            self.logger.error("Impossible de mettre à jours les paramètres sue le MKRFOX")
+            self.logger.error("Impossible de charger la copie locale des registres du MKRFOX")
+
+    ## Sauvegarde la copie locale des registres de configuration dans le fichier de sauvegarde.
+    def saveShadow(self):
+        if self.shadow_filename is None:
+            return
+        try:
+            with open(self.shadow_filename, "w") as shadowfile:
+                json.dump({name: self.shadow[name] for name in self.groups["config"] if name in self.shadow}, shadowfile)
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de sauvegarder la copie locale des registres du MKRFOX")
+
+    ## Prépare l'écriture d'un registre. L'écriture est ignorée si la valeur est identique à la copie locale, sinon elle est regroupée jusqu'au prochain appel de flush().
+    # @param regName Nom du registre à écrire.
+    # @param data Les données à écrire.
+    def stage(self, regName, data):
+        if self.shadow.get(regName) == data:
+            self.pending.pop(regName, None)
         else:
-            self.logger.success("Paramètres mis à jours sur le MKRFOX")
+            self.pending[regName] = data
+
+    ## Transmet en une seule transaction toutes les écritures en attente, puis met à jour la copie locale.
+    # @return Retourne True si les registres sont synchronisés, False sinon.
+    def flush(self):
+        if not self.pending:
+            self.logger.info("Registres du MKRFOX déjà à jour, aucune écriture")
+            return True
+        if not self.writeGroup(self.pending):
+            return False
+        self.shadow.update(self.pending)
+        self.pending = {}
+        self.saveShadow()
+        return True
+
+    ## Force la réécriture de tous les registres de configuration au prochain appel de flush(), par exemple après un redémarrage du MKRFOX.
+    def resync(self):
+        self.logger.info("Resynchronisation complète des registres de configuration du MKRFOX")
+        for name in self.groups["config"]:
+            if name in self.shadow:
+                self.pending.setdefault(name, self.shadow.pop(name))
+
+    ## Détecte un redémarrage du MKRFOX en relisant ses registres de configuration et en les comparant à la copie locale,
+    # et force alors une resynchronisation. Après un redémarrage, les registres de configuration reprennent leurs valeurs par défaut.
+    # Le bit FIRST_CYCLE n'est pas un indicateur de redémarrage : il est positionné au premier cycle de chaque journée.
+    # @return Retourne True si un redémarrage a été détecté.
+    def detectReset(self):
+        expected = {name: self.shadow[name] for name in self.groups["config"] if name in self.shadow}
+        if not expected: # Aucune valeur connue : toute la configuration sera de toute façon écrite
+            return False
+        current = self.readGroup("config")
+        if current is None: # Relecture impossible : on ne conclut pas à un redémarrage
+            self.logger.error("Impossible de relire la configuration du MKRFOX, détection de redémarrage ignorée")
+            return False
+        changed = [name for name in expected if current[name] != expected[name]]
+        if changed:
+            self.logger.info("Registres de configuration du MKRFOX différents de la copie locale : " + ", ".join(changed))
+            self.shadow.update(expected) # readGroup a remplacé la copie locale par les valeurs par défaut relues
+            self.resync()
+            return True
+        return False
+
+    ## Met à jours les différents paramètres du MKRFOX de configuration de la station.
+    # Les écritures sont seulement préparées : elles sont transmises lors du prochain appel de flush(), et uniquement si les valeurs ont changé.
+    # @param data Les paramètres à mettre à jour.
+    def updateConfig(self, data):
+        for name in self.groups["config"]:
+            self.stage(name, data[name])
 
     ## Formate les données des capteurs sous forme d'un tableau d'octet.
     # @param sensorsData Les données des capteurs.
@@ -0,0 +1,173 @@
+## @file onewire.py
+# Définition de la classe OneWire. Elle lit directement dans sysfs les sondes de température 1-wire (DS18B20 et compatibles)
+# branchées sur le Raspberry Pi, avec une seule conversion simultanée pour toutes les sondes.
+##
+
+import json
+import os
+from time import sleep, monotonic
+
+## Classe OneWire.
+# Cette classe découvre les sondes de température du bus 1-wire et conserve leurs chemins d'un cycle à l'autre dans un fichier de cache.
+# Une lecture déclenche une conversion groupée sur chaque maître du bus (therm_bulk_read) puis lit le résultat de chaque sonde avec os.read :
+# la lecture coûte le temps d'une seule conversion, quel que soit le nombre de sondes.
+class OneWire:
+
+    ## Répertoire sysfs des appareils 1-wire.
+    ROOT = "/sys/bus/w1/devices"
+    ## Préfixes (codes de famille) des sondes de température : DS18S20, DS1822, DS18B20, DS1825 et DS28EA00.
+    FAMILIES = ("10-", "22-", "28-", "3b-", "42-")
+    ## Durée d'une conversion en résolution 12 bits, en secondes.
+    CONVERSION_TIME = 0.75
+    ## Temps maximal d'attente de la fin d'une conversion groupée, en secondes.
+    CONVERSION_TIMEOUT = 1.5
+    ## Intervalle entre deux vérifications de la fin de la conversion, en secondes.
+    POLL_INTERVAL = 0.05
+    ## Valeur renvoyée par une sonde à la mise sous tension, avant toute conversion (en m°C).
+    POWER_ON_RESET = 85000
+
+    ## Constructeur.
+    # @param logger Logger principal.
+    # @param root Répertoire des appareils 1-wire. La valeur par défaut est ROOT.
+    # @param cache_filename Fichier de cache des chemins des sondes. Par défaut, les chemins ne sont pas sauvegardés.
+    def __init__(self, logger, root = ROOT, cache_filename = None):
+        ## Logger principal.
+        self.logger = logger
+        ## Répertoire des appareils 1-wire.
+        self.root = root
+        ## Fichier de cache des chemins des sondes.
+        self.cache_filename = cache_filename
+        ## Répertoire de chaque sonde, indexé par identifiant.
+        self.devices = {}
+        ## Répertoire du maître de chaque sonde, indexé par identifiant.
+        self.masters = {}
+        self.loadCache()
+
+    ## Charge les chemins des sondes depuis le fichier de cache.
+    def loadCache(self):
+        if self.cache_filename is None:
+            return
+        try:
+            with open(self.cache_filename, "r") as cachefile:
+                cache = json.load(cachefile)
+            self.devices, self.masters = cache["devices"], cache["masters"]
+        except FileNotFoundError:
+            self.logger.info("Aucun cache des sondes 1-wire, recherche des sondes sur le bus")
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de charger le cache des sondes 1-wire")
+
+    ## Sauvegarde les chemins des sondes dans le fichier de cache.
+    def saveCache(self):
+        if self.cache_filename is None:
+            return
+        try:
+            with open(self.cache_filename, "w") as cachefile:
+                json.dump({"devices": self.devices, "masters": self.masters}, cachefile)
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de sauvegarder le cache des sondes 1-wire")
+
+    ## Recherche les sondes de température sur le bus et met à jour le cache.
+    # @return Retourne le nombre de sondes trouvées.
+    def discover(self):
+        self.devices, self.masters = {}, {}
+        try:
+            names = sorted(os.listdir(self.root))
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de lister les appareils 1-wire")
+            names = []
+        for name in names:
+            if name.startswith(self.FAMILIES):
+                path = os.path.join(self.root, name)
+                self.devices[name] = path
+                self.masters[name] = os.path.dirname(os.path.realpath(path))
+        self.logger.info(str(len(self.devices)) + " sonde(s) 1-wire trouvée(s) : " + ", ".join(self.devices))
+        self.saveCache()
+        return len(self.devices)
+
+    ## Vérifie que les sondes du cache sont toujours présentes, sinon recherche à nouveau les sondes.
+    def checkDevices(self):
+        if not self.devices or not all(os.path.isdir(path) for path in self.devices.values()):
+            self.discover()
+
+    ## Indique si au moins une sonde est branchée sur le bus.
+    # @return Retourne True si une sonde est connue ou trouvée.
+    def present(self):
+        self.checkDevices()
+        return len(self.devices) > 0
+
+    ## Lit un fichier sysfs en une seule lecture.
+    # @param path Chemin du fichier.
+    # @return Retourne le contenu du fichier.
+    def readFile(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            return os.read(fd, 256)
+        finally:
+            os.close(fd)
+
+    ## Déclenche une conversion groupée sur chaque maître du bus et attend sa fin.
+    # @return Retourne True si la conversion est terminée, False si la conversion groupée n'est pas disponible (noyau antérieur à 5.10, droits insuffisants).
+    def convert(self):
+        masters = [os.path.join(master, "therm_bulk_read") for master in set(self.masters.values())]
+        try:
+            for master in masters:
+                fd = os.open(master, os.O_WRONLY)
+                try:
+                    os.write(fd, b"trigger\n")
+                finally:
+                    os.close(fd)
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Conversion groupée impossible, lecture des sondes une par une")
+            return False
+        sleep(self.CONVERSION_TIME)
+        deadline = monotonic() + self.CONVERSION_TIMEOUT - self.CONVERSION_TIME
+        pending = list(masters)
+        while pending:
+            # -1 : au moins une sonde est encore en conversion
+            pending = [master for master in pending if self.readFile(master).strip() == b"-1"]
+            if not pending or monotonic() > deadline:
+                break
+            sleep(self.POLL_INTERVAL)
+        return True
+
+    ## Lit la température d'une sonde. Après une conversion groupée, le fichier "temperature" renvoie le résultat sans nouvelle conversion ;
+    # sans conversion groupée, la lecture de "w1_slave" déclenche une conversion individuelle.
+    # @param name Identifiant de la sonde.
+    # @param bulk True si une conversion groupée vient d'être faite.
+    # @return Retourne la température en °C, ou None si la lecture est invalide.
+    def readDevice(self, name, bulk):
+        path = self.devices[name]
+        if bulk:
+            reading = int(self.readFile(os.path.join(path, "temperature")))
+        else:
+            data = self.readFile(os.path.join(path, "w1_slave"))
+            if b"YES" not in data:
+                return None
+            reading = int(data.partition(b" t=")[2])
+        if reading == self.POWER_ON_RESET:
+            return None
+        return reading / 1000.0
+
+    ## Lit toutes les sondes de température.
+    # @return Retourne un dictionnaire associant l'identifiant de chaque sonde lue à sa température en °C.
+    def read(self):
+        self.checkDevices()
+        if not self.devices:
+            return {}
+        bulk = self.convert()
+        temperatures = {}
+        for name in self.devices:
+            try:
+                temperature = self.readDevice(name, bulk)
+                if temperature is not None:
+                    temperatures[name] = temperature
+            except Exception as e:
+                self.logger.error(e)
+                self.logger.error("Impossible de lire la sonde 1-wire " + name)
+        if len(temperatures) < len(self.devices): # Sonde retirée ou défectueuse : nouvelle recherche au prochain essai
+            self.devices = {}
+        return temperatures
@@ -0,0 +1,74 @@
+## @file outbox.py
+# Définition de la classe Outbox. Elle conserve sur la carte SD les observations en attente de publication sur Internet.
+##
+
+import gzip
+import json
+import os
+
+## Classe Outbox.
+# Cette classe ajoute une observation par cycle dans un fichier (une ligne JSON par observation), et fournit les observations
+# par lots pour les publier en une seule session GPRS. Les observations ne sont retirées qu'une fois leur lot acquitté par le serveur,
+# de sorte qu'une session interrompue reprend au premier lot non publié.
+class Outbox:
+
+    ## Constructeur.
+    # @param filename Le fichier des observations en attente.
+    # @param logger Logger principal.
+    # @param max_size Nombre maximal d'observations conservées. Les plus anciennes sont abandonnées au-delà. La valeur par défaut est 1000.
+    def __init__(self, filename, logger, max_size = 1000):
+        ## Le fichier des observations en attente.
+        self.filename = filename
+        ## Logger principal.
+        self.logger = logger
+        ## Nombre maximal d'observations conservées.
+        self.max_size = max_size
+
+    ## Ajoute une observation à publier.
+    # @param observation Dictionnaire des données de l'observation.
+    def add(self, observation):
+        try:
+            with open(self.filename, "a") as outboxfile:
+                outboxfile.write(json.dumps(observation, default = str) + "\n")
+            if len(self.pending()) > self.max_size:
+                self.acknowledge(len(self.pending()) - self.max_size)
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible d'ajouter l'observation à la file de publication")
+
+    ## Renvoie les observations en attente, de la plus ancienne à la plus récente.
+    # @return Retourne la liste des observations.
+    def pending(self):
+        try:
+            with open(self.filename, "r") as outboxfile:
+                return [json.loads(line) for line in outboxfile if line.strip()]
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de lire la file de publication")
+            return []
+
+    ## Découpe les observations en attente en lots.
+    # @param batch_size Nombre maximal d'observations par lot.
+    # @return Retourne la liste des lots.
+    def batches(self, batch_size):
+        observations = self.pending()
+        return [observations[i:i + batch_size] for i in range(0, len(observations), batch_size)]
+
+    ## Retire les premières observations, publiées avec succès.
+    # @param count Le nombre d'observations à retirer.
+    def acknowledge(self, count):
+        observations = self.pending()[count:]
+        temporary = self.filename + ".tmp"
+        with open(temporary, "w") as outboxfile:
+            for observation in observations:
+                outboxfile.write(json.dumps(observation, default = str) + "\n")
+        os.replace(temporary, self.filename) # Remplacement atomique : une coupure d'alimentation ne corrompt pas la file
+
+    ## Encode un lot d'observations en JSON compressé par gzip.
+    # @param batch Le lot d'observations.
+    # @return Retourne les octets à envoyer.
+    @staticmethod
+    def encode(batch):
+        return gzip.compress(json.dumps(batch, default = str, separators = (",", ":")).encode("utf-8"))
@@ -0,0 +1,137 @@
+## @file oversampling.py
+# Définition de la classe Samples. Elle conserve les mesures successives d'une grandeur, rejette les valeurs aberrantes au fil de l'eau
+# (filtre de Hampel) et fournit des statistiques robustes : médiane, moyenne tronquée et dispersion.
+##
+
+from array import array
+
+try:
+    import numpy
+except ImportError: # NumPy est facultatif : les statistiques sont alors calculées en Python pur
+    numpy = None
+
+## Facteur de conversion de l'écart absolu médian (MAD) en écart-type pour un bruit gaussien.
+MAD_SCALE = 1.4826
+
+## Renvoie les valeurs triées.
+# @param values Les valeurs (array de flottants).
+# @return Retourne une séquence triée.
+def ordered(values):
+    if numpy is not None:
+        return numpy.sort(numpy.frombuffer(values, dtype = numpy.float64))
+    return sorted(values)
+
+## Renvoie la médiane de valeurs triées.
+# @param values Les valeurs triées, au moins une.
+# @return Retourne la médiane.
+def median(values):
+    middle = len(values) // 2
+    return float(values[middle]) if len(values) % 2 else (float(values[middle - 1]) + float(values[middle])) / 2
+
+## Renvoie l'écart absolu médian de valeurs autour d'un centre.
+# @param values Les valeurs, au moins une.
+# @param center Le centre.
+# @return Retourne l'écart absolu médian.
+def deviation(values, center):
+    if numpy is not None:
+        return float(numpy.median(numpy.abs(numpy.asarray(values, dtype = numpy.float64) - center)))
+    return median(sorted(abs(value - center) for value in values))
+
+## Combine les mesures de plusieurs sources d'une même grandeur (par exemple plusieurs sondes), filtrées séparément.
+# Chaque source a son propre décalage (sonde à l'intérieur ou à l'extérieur du boîtier) : ses mesures ne sont comparées qu'entre elles.
+# @param groups Dictionnaire associant chaque source à ses mesures (objet Samples).
+# @return Retourne les mesures de l'unique source, ou un objet Samples contenant la moyenne tronquée de chaque source mesurée.
+def combine(groups):
+    groups = [samples for samples in groups.values() if len(samples) > 0]
+    if len(groups) == 1:
+        return groups[0]
+    combined = Samples()
+    combined.values.extend(samples.trimmedMean() for samples in groups)
+    combined.rejected = sum(samples.rejected for samples in groups)
+    return combined
+
+## Classe Samples.
+# Cette classe accumule les mesures d'une grandeur dans un tableau compact (array de flottants, lu directement par NumPy s'il est installé).
+# Chaque nouvelle mesure est comparée à la médiane des WINDOW dernières mesures reçues : elle est rejetée si elle s'en écarte de plus de
+# THRESHOLD écarts-types robustes, l'écart-type étant estimé par l'écart absolu médian et borné par la résolution du capteur.
+class Samples:
+
+    ## Nombre de mesures récentes servant de référence au filtre de Hampel.
+    WINDOW = 7
+    ## Nombre minimal de mesures avant que le filtre ne rejette une valeur.
+    MIN_WINDOW = 3
+    ## Seuil de rejet, en écarts-types robustes.
+    THRESHOLD = 3
+    ## Fraction des mesures retirée de chaque côté pour la moyenne tronquée.
+    TRIM = 0.2
+
+    ## Constructeur.
+    # @param resolution Résolution du capteur : plus petit écart-type pris en compte par le filtre. La valeur par défaut est 0.
+    def __init__(self, resolution = 0):
+        ## Résolution du capteur.
+        self.resolution = resolution
+        ## Mesures acceptées.
+        self.values = array("d")
+        ## Dernières mesures reçues, acceptées ou non.
+        self.window = []
+        ## Nombre de mesures rejetées.
+        self.rejected = 0
+
+    ## Nombre de mesures acceptées.
+    # @return Retourne le nombre de mesures.
+    def __len__(self):
+        return len(self.values)
+
+    ## Parcourt les mesures acceptées.
+    # @return Retourne un itérateur sur les mesures.
+    def __iter__(self):
+        return iter(self.values)
+
+    ## Ajoute une mesure si le filtre de Hampel l'accepte.
+    # @param value La mesure.
+    # @return Retourne True si la mesure est acceptée.
+    def add(self, value):
+        window = self.window
+        accepted = True
+        if len(window) >= self.MIN_WINDOW:
+            center = median(sorted(window))
+            sigma = max(MAD_SCALE * deviation(window, center), self.resolution)
+            accepted = abs(value - center) <= self.THRESHOLD * sigma
+        window.append(value)
+        if len(window) > self.WINDOW:
+            del window[0]
+        if accepted:
+            self.values.append(value)
+        else:
+            self.rejected += 1
+        return accepted
+
+    ## Renvoie la médiane des mesures acceptées.
+    # @return Retourne la médiane, ou 0 s'il n'y a aucune mesure.
+    def median(self):
+        if not self.values:
+            return 0
+        return median(ordered(self.values))
+
+    ## Renvoie la moyenne des mesures acceptées après retrait de la fraction TRIM des plus petites et des plus grandes.
+    # @return Retourne la moyenne tronquée, ou 0 s'il n'y a aucune mesure.
+    def trimmedMean(self):
+        if not self.values:
+            return 0
+        values = ordered(self.values)
+        cut = int(len(values) * self.TRIM)
+        kept = values[cut:len(values) - cut]
+        return float(sum(kept)) / len(kept)
+
+    ## Renvoie la dispersion des mesures acceptées : écart-type robuste estimé par l'écart absolu médian.
+    # @return Retourne la dispersion, ou 0 s'il n'y a aucune mesure.
+    def spread(self):
+        if not self.values:
+            return 0
+        return MAD_SCALE * deviation(self.values, self.median())
+
+    ## Résume les mesures pour le journal.
+    # @return Retourne une chaîne décrivant le nombre de mesures, la médiane, la moyenne tronquée et la dispersion.
+    def summary(self):
+        return (str(len(self.values)) + " mesure(s), " + str(self.rejected) + " rejetée(s), médiane " + str(round(self.median(), 3)) +
+                ", moyenne tronquée " + str(round(self.trimmedMean(), 3)) + ", dispersion " + str(round(self.spread(), 3)))
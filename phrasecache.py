@@ -0,0 +1,124 @@
+## @file phrasecache.py
+# Définition de la classe PhraseCache. Elle conserve sur disque l'audio de chaque phrase du bulletin radio déjà synthétisée,
+# afin d'assembler le bulletin sans relancer espeak et mbrola à chaque cycle.
+##
+
+import hashlib
+import io
+import os
+import wave
+from array import array
+
+## Classe PhraseCache.
+# Cette classe associe à chaque phrase un fichier WAV nommé d'après l'empreinte du texte, de la voix, de la vitesse et de la tonalité.
+# La synthèse n'est lancée que pour une phrase absente du cache (par exemple après un changement du nom du site par SMS).
+# Le bulletin est assemblé en mémoire en raccordant les phrases par un fondu enchaîné, et des silences marquent les pauses.
+class PhraseCache:
+
+    ## Fréquence d'échantillonnage par défaut (voix mbrola françaises), en Hz.
+    RATE = 16000
+    ## Durée du fondu enchaîné entre deux phrases, en secondes.
+    CROSSFADE = 0.01
+    ## Durée d'une pause entre deux groupes de phrases, en secondes.
+    PAUSE = 0.3
+    ## Phrases fixes du bulletin, synthétisées par warm().
+    FIXED = ("Site de.", "Vent moyen :", "Vent maximal :", "kilomètres par heure", "degrés", "Température :", "degrés celsius", "erreur", "moins", "virgule")
+
+    ## Constructeur.
+    # @param voice Objet Voice de la synthèse vocale.
+    # @param logger Logger principal.
+    # @param directory Répertoire du cache. La valeur par défaut est "audio_cache".
+    def __init__(self, voice, logger, directory = "audio_cache"):
+        ## Objet Voice de la synthèse vocale.
+        self.voice = voice
+        ## Logger principal.
+        self.logger = logger
+        ## Répertoire du cache.
+        self.directory = directory
+        ## Fréquence d'échantillonnage du bulletin, celle de la première phrase lue.
+        self.rate = None
+        ## Nombre de phrases synthétisées et lues dans le cache depuis la création de l'objet.
+        self.misses, self.hits = 0, 0
+        os.makedirs(self.directory, exist_ok = True)
+
+    ## Renvoie le chemin du fichier d'une phrase.
+    # @param text Le texte de la phrase.
+    # @return Retourne le chemin du fichier WAV.
+    def path(self, text):
+        voice = self.voice
+        key = "|".join((text, voice.lang + str(voice.voice_id), str(voice.speed), str(voice.pitch), str(voice.volume)))
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".wav")
+
+    ## Renvoie l'audio d'une phrase, synthétisé et enregistré dans le cache s'il en est absent.
+    # @param text Le texte de la phrase.
+    # @return Retourne les échantillons PCM 16 bits mono.
+    def render(self, text):
+        path = self.path(text)
+        try:
+            with wave.open(path, "rb") as wavfile:
+                rate, pcm = wavfile.getframerate(), wavfile.readframes(wavfile.getnframes())
+            self.hits += 1
+        except FileNotFoundError:
+            wav = self.voice.to_audio(text)
+            with wave.open(io.BytesIO(wav), "rb") as wavfile:
+                rate, pcm = wavfile.getframerate(), wavfile.readframes(wavfile.getnframes())
+            temporary = path + ".tmp"
+            with open(temporary, "wb") as cachefile:
+                cachefile.write(wav)
+            os.replace(temporary, path)
+            self.misses += 1
+        if self.rate is None:
+            self.rate = rate
+        elif rate != self.rate:
+            raise Exception("Fréquence d'échantillonnage incohérente dans le cache audio : " + path)
+        return pcm
+
+    ## Synthétise les phrases absentes du cache : phrases fixes du bulletin et nombres entiers. Ne fait rien si le cache est déjà complet.
+    # @param texts Phrases supplémentaires, par exemple le nom du site.
+    # @param numbers Nombres à synthétiser. Par défaut, de 0 à 360.
+    # @return Retourne le nombre de phrases synthétisées.
+    def warm(self, texts = (), numbers = range(361)):
+        missing = [text for text in list(self.FIXED) + list(texts) + [str(number) for number in numbers] if not os.path.exists(self.path(text))]
+        if missing:
+            self.logger.info("Préparation du cache audio : " + str(len(missing)) + " phrase(s) à synthétiser...")
+            for text in missing:
+                self.render(text)
+            self.logger.info("Cache audio prêt")
+        return len(missing)
+
+    ## Assemble le bulletin à partir des phrases du cache.
+    # @param phrases Liste des phrases à lire ; None insère une pause.
+    # @return Retourne les échantillons PCM 16 bits mono du bulletin.
+    def assemble(self, phrases):
+        output = array("h")
+        for phrase in phrases:
+            if phrase is None:
+                output.frombytes(bytes(2 * int(self.PAUSE * (self.rate or self.RATE))))
+            else:
+                samples = array("h")
+                samples.frombytes(self.render(phrase))
+                self.splice(output, samples)
+        return output.tobytes()
+
+    ## Ajoute des échantillons à la suite du bulletin, avec un fondu enchaîné linéaire sur la jonction.
+    # @param output Les échantillons du bulletin, complétés sur place.
+    # @param samples Les échantillons à ajouter.
+    def splice(self, output, samples):
+        overlap = min(int(self.CROSSFADE * self.rate), len(output), len(samples))
+        start = len(output) - overlap
+        for i in range(overlap):
+            fade = (i + 1) / (overlap + 1)
+            output[start + i] = int(output[start + i] * (1 - fade) + samples[i] * fade)
+        output.extend(samples[overlap:])
+
+    ## Construit un fichier WAV en mémoire.
+    # @param pcm Les échantillons PCM 16 bits mono.
+    # @return Retourne le contenu du fichier WAV.
+    def toWav(self, pcm):
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wavfile:
+            wavfile.setnchannels(1)
+            wavfile.setsampwidth(2)
+            wavfile.setframerate(self.rate or self.RATE)
+            wavfile.writeframes(pcm)
+        return buffer.getvalue()
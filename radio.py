@@ -3,15 +3,20 @@
 # Définition de la classe Radio. Elle permet la manipulation de la radio et l'utilisation de la synthèse vocale pour générer un message.
 ##
 from voxpopuli import Voice
-from time import sleep
-from os import environ
-environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
-from pygame import mixer
+from phrasecache import PhraseCache
+from threading import Thread
+from time import sleep, monotonic
+from audio import openSink
 import pigpio
 
 ## Classe Radio. 
-#  Cette classe permet la communication du rapport météo par la radio. Elle utilise une synthèse vocale sous le nom de Voxpopuli. La fonction mixer de PyGame est utilisé pour lire les fichiers audios générés.
+#  Cette classe permet la communication du rapport météo par la radio. Elle utilise une synthèse vocale sous le nom de Voxpopuli. Les fichiers audios générés sont joués par une sortie du module audio (ALSA, fichier WAV ou sortie nulle).
 class Radio:
+
+    ## Temps de mise sous tension du talkie-walkie avant d'enclencher le PTT, en secondes.
+    WARMUP = 1
+    ## Temps maximal de la synthèse du bulletin, en secondes.
+    SYNTHESIS_TIMEOUT = 60
     
     ## Constructeur.
     # @param config Objet ConfigFile.
@@ -21,7 +26,11 @@ class Radio:
     # @param pitch Pitch de la lecture du message par la synthèse vocale. La valeur par défaut est 40.
     # @param tw_gpio Numéro de pin pour alimenter le talkie-walkie. La valeur par défaut est 5.
     # @param ptt_gpio Numéro de pin pour le push-to-talk du talkie-walkie. La valeur par défaut est 6.
-    def __init__(self, config, logger, pi,speed = 100, pitch = 40, tw_gpio = 5, ptt_gpio = 6):
+    # @param cache_directory Répertoire du cache audio des phrases du bulletin. Par défaut, le bulletin est synthétisé en entier à chaque cycle.
+    # @param bip_filename Fichier du bip d'introduction, chargé en mémoire. La valeur par défaut est "bip.wav".
+    # @param audio_output Sortie audio : "alsa", "wav" ou "null". La valeur par défaut est "alsa".
+    # @param audio_filename Fichier de la sortie audio "wav".
+    def __init__(self, config, logger, pi,speed = 100, pitch = 40, tw_gpio = 5, ptt_gpio = 6, cache_directory = None, bip_filename = "bip.wav", audio_output = "alsa", audio_filename = None):
         ##  Objet ConfigFile.
         self.config = config
         ##  Logger principal.
@@ -42,60 +51,122 @@ class Radio:
         try:
             ## Référence de l'objet Voice de la synthèse vocale
             self.voice = Voice(lang="fr", voice_id=1, speed=speed, pitch=pitch)
-            mixer.init(frequency=16000) #Initialisation du lecteur audio à 16kHz d'échantillonnage pour correspondre aux fichiers audio
+            ## Sortie audio
+            self.sink = openSink(audio_output, self.logger, filename = audio_filename)
         except:
-            self.logger.error("Impossible de charger la synthèse vocale ou le codec audio")
+            self.logger.error("Impossible de charger la synthèse vocale ou la sortie audio")
             self.voice = None
 
-    ## Crée le message qui sera lu par la radio. Pour chaque valeur, on écrit "erreur" si elle n'est pas acccessible.
+        ## Cache audio des phrases du bulletin.
+        self.cache = None
+        if self.voice is not None and cache_directory is not None:
+            try:
+                self.cache = PhraseCache(self.voice, self.logger, cache_directory)
+                # Cache froid (première mise en service, changement de voix ou du nom du site) : les phrases manquantes sont synthétisées une fois pour toutes
+                self.cache.warm([self.config.getSiteName()])
+            except Exception as e:
+                self.logger.error(e)
+                self.logger.error("Impossible d'ouvrir le cache audio, le bulletin sera synthétisé en entier")
+
+        ## Contenu du fichier du bip d'introduction.
+        self.bip = None
+        try:
+            with open(bip_filename, "rb") as bipfile:
+                self.bip = bipfile.read()
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de charger le bip d'introduction")
+        ## Contenu WAV du bulletin, produit par synthesize().
+        self.message = None
+
+    ## Crée la liste des phrases du message qui sera lu par la radio. Pour chaque valeur, on écrit "erreur" si elle n'est pas acccessible.
+    # Chaque phrase est synthétisée séparément, ce qui permet de la conserver dans le cache audio.
     # @param sensorsData Les données des capteurs.
-    # @return Retourne le message sous la forme d'une chaîne de caractère.
-    def createRadioMessage(self,sensorsData):
-        temperature = str(round(sensorsData['Temperature'], 1)).replace(".", ",").replace(",0", "") if float(sensorsData['Temperature']) < 100 and float(sensorsData['Temperature']) > -50 else "erreur"
+    # @return Retourne la liste des phrases, None marquant une pause.
+    def createRadioPhrases(self,sensorsData):
+        temperature = self.sayDecimal(sensorsData['Temperature']) if float(sensorsData['Temperature']) < 100 and float(sensorsData['Temperature']) > -50 else ["erreur"]
         direction = str(int(round(sensorsData['Direction'],0))) if float(sensorsData['Direction']) < 360 and float(sensorsData['Direction']) >= 0 else "erreur"
         direction_max = str(int(round(sensorsData['Direction_max'],0))) if float(sensorsData['Direction_max']) < 360 and float(sensorsData['Direction_max']) >= 0 else "erreur"
         speed = str(int(round(sensorsData['Speed'], 0))).replace(".", ",").replace(",0", "") if float(sensorsData['Speed']) < 300 and float(sensorsData['Speed']) >= 0 else "erreur"
         speed_max = str(int(round(sensorsData['Speed_max'], 0))).replace(".", ",").replace(",0", "") if float(sensorsData['Speed_max']) < 300 and float(sensorsData['Speed']) >= 0 else "erreur"
-        output = "Site de. " + self.config.getSiteName() + ". "
-        output += "Vent moyen : " + speed + " " + " kilomètres par heure . . " + direction + " degrés . "
-        output += "Vent maximal : " + speed_max + " " + " kilomètres par heure . . " + direction_max + " degrés . "
-        output += "Température : " + temperature + " degrés celsius"
+        output = ["Site de.", self.config.getSiteName(), None]
+        output += ["Vent moyen :", speed, "kilomètres par heure", None, direction, "degrés", None]
+        output += ["Vent maximal :", speed_max, "kilomètres par heure", None, direction_max, "degrés", None]
+        output += ["Température :"] + temperature + ["degrés celsius"]
         return output
 
+    ## Découpe un nombre décimal en phrases du cache audio : signe, partie entière et décimale (par exemple -3,2 donne "moins", "3", "virgule", "2").
+    # @param value Le nombre à lire, arrondi au dixième.
+    # @return Retourne la liste des phrases.
+    def sayDecimal(self, value):
+        value = round(float(value), 1)
+        integer, decimal = str(abs(value)).split(".")
+        return (["moins"] if value < 0 else []) + [integer] + (["virgule", decimal] if decimal != "0" else [])
+
+    ## Crée le message qui sera lu par la radio, en une seule chaîne.
+    # @param sensorsData Les données des capteurs.
+    # @return Retourne le message sous la forme d'une chaîne de caractère.
+    def createRadioMessage(self,sensorsData):
+        return " ".join(". " if phrase is None else phrase for phrase in self.createRadioPhrases(sensorsData))
+
+
+    ## Produit le bulletin en mémoire, depuis le cache audio s'il est disponible, sinon en le synthétisant d'un bloc.
+    # @param sensorsData Les données des capteurs.
+    def synthesize(self, sensorsData):
+        try:
+            if self.cache is not None:
+                try:
+                    self.message = self.cache.toWav(self.cache.assemble(self.createRadioPhrases(sensorsData)))
+                    self.logger.info("Bulletin assemblé depuis le cache audio (" + str(self.cache.hits) + " phrase(s) en cache, " + str(self.cache.misses) + " synthétisée(s))")
+                    return
+                except Exception as e:
+                    self.logger.error(e)
+                    self.logger.error("Impossible d'assembler le bulletin depuis le cache audio")
+            self.message = self.voice.to_audio(self.createRadioMessage(sensorsData))
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de synthétiser le bulletin")
 
     ## Joue le message sonore par la radio, et gère la partie I/O associée.
+    # Le talkie-walkie est allumé pendant la synthèse pour que son temps de mise sous tension soit masqué par celle-ci ; le PTT n'est enclenché
+    # qu'une fois le bulletin complet, pour n'émettre que le bip et le message. Le bip et le bulletin sont joués depuis la mémoire, sans passer par la carte SD.
     # @param sensorsData Les données des capteurs.
     def playVoiceMessage(self, sensorsData):
         self.logger.info("Lecture du message audio...")
         if self.voice != None:
-            #On génère et on enregistre le message
-            wav = self.voice.to_audio(self.createRadioMessage(sensorsData))
-            with open("radio.wav", "wb") as wavfile:
-                wavfile.write(wav)
-            #On allume la radio, puis le PTT
+            #On lance la production du message et on allume la radio pendant ce temps
+            self.message = None
+            thread = Thread(target = self.synthesize, args = (sensorsData,), daemon = True)
+            thread.start()
             self.pi.write(self.tw_gpio,1)
-            sleep(1)
+            power_on = monotonic()
+            thread.join(self.SYNTHESIS_TIMEOUT)
+            if thread.is_alive() or self.message is None:
+                self.pi.write(self.tw_gpio,0)
+                self.logger.error("Impossible de jouer le message audio car la synthèse a échoué.")
+                return
+            sleep(max(0, self.WARMUP - (monotonic() - power_on)))
+            #On enclenche le PTT
             self.pi.write(self.ptt_gpio,1)
-            #On joue un bip d'introduction
-            self.playSound("bip.wav")
+            #On joue un bip d'introduction puis le message
+            if self.bip is not None:
+                self.playSound(self.bip)
             sleep(0.1)
-            #On joue le message
-            self.playSound("radio.wav")
+            self.playSound(self.message)
             #On éteint le PTT et la radio
             self.pi.write(self.ptt_gpio,0)
             self.pi.write(self.tw_gpio,0)
-            mixer.quit()
+            self.sink.close()
             self.logger.success("Lecture terminée")
         else:
             self.logger.error("Impossible de jouer le message audio car les modules ne sont pas initialisés.")
             
 
-    ## Joue un son à partir de son chemin d'accès.
-    # @param path Le chemin d'accés du fichier audio.
-    def playSound(self, path):
-        #On charge le son, on le joue, puis on attend qu'il soit fini
-        sound = mixer.Sound(path)
-        sound.play()
-        while mixer.get_busy():
-            continue
-        
\ No newline at end of file
+    ## Joue un son depuis la mémoire et attend la fin de la lecture.
+    # @param wav Le contenu du fichier WAV.
+    def playSound(self, wav):
+        try:
+            self.sink.play(wav)
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de jouer le son sur la sortie audio")
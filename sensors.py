@@ -3,12 +3,13 @@
 # Définition de la classe Sensors. Elle permet la communication avec tous les capteurs connectés au Raspberry Pi.
 ##
 
-from Adafruit_BMP.BMP085 import BMP085
-from time import sleep, strftime,time
+from bmp085 import Bmp085
+from time import sleep, strftime, monotonic
 import math
-import pigpio
 from dht11 import DHT11
-from threading import Thread
+from onewire import OneWire
+from acquisition import Acquisition
+from oversampling import Samples, combine
 
 ## Classe Sensors. 
 # Cette classe permet la gestion de tous les capteurs connectés au Raspberry Pi.
@@ -21,8 +22,15 @@ class Sensors:
     # @param logger_data Logger des données.
     # @param dht11_gpio Numéro de pin du capteur d'humidité DHT11. La valeur par défaut est 23.
     # @param init_nbtry Nombres d'essais maximum de l'initialisation des capteurs. La valeur par défaut est 5.
-    # @param timeout Temps maximal pour réaliser une mesure.
-    def __init__(self, config, pi, logger, logger_data, dht11_gpio = 23, init_nbtry = 5, timeout = 10):
+    # @param timeout Temps maximal de l'acquisition de toutes les grandeurs.
+    # @param w1_root Répertoire sysfs des appareils 1-wire. La valeur par défaut est OneWire.ROOT.
+    # @param w1_cache_filename Fichier de cache des chemins des sondes 1-wire. Par défaut, les chemins ne sont pas sauvegardés.
+    # @param barometer_filename Fichier de sauvegarde de la calibration du baromètre. Par défaut, la calibration est lue à chaque démarrage.
+    # @param barometer_budget Temps accordé à une mesure du baromètre en secondes, qui détermine sa résolution. Par défaut, la meilleure résolution.
+    # @param oversampling Temps de suréchantillonnage de chaque grandeur en secondes ("Temperature", "Humidity", "Pressure").
+    # Par défaut, chaque lecture s'arrête à la première mesure valide.
+    def __init__(self, config, pi, logger, logger_data, dht11_gpio = 23, init_nbtry = 5, timeout = 10, w1_root = OneWire.ROOT, w1_cache_filename = None,
+                 barometer_filename = None, barometer_budget = None, oversampling = None):
         ##  Objet ConfigFile.
         self.config = config
         ## Instance pigpio
@@ -33,14 +41,18 @@ class Sensors:
         self.logger_data = logger_data
         ##  Numéro de pin du capteur d'humidité DHT11.
         self.dht11_gpio = dht11_gpio
-        ##  Nombres de mesures à réaliser à chaque lecture des capteurs.
+        ##  Temps maximal de l'acquisition de toutes les grandeurs.
         self.timeout = timeout
+        ## Temps de suréchantillonnage de chaque grandeur.
+        self.oversampling = oversampling or {}
+        ## Sondes de température 1-wire.
+        self.thermometer = OneWire(logger = logger, root = w1_root, cache_filename = w1_cache_filename)
         self.logger.info("Tentative de connexion aux capteurs...")
 
         for i in range(init_nbtry):
             try:
                 ## Référence du capteur de pression.
-                self.barometre = BMP085() #On tente d'établir la connexion
+                self.barometre = Bmp085(pi = pi, logger = logger, nb_try = 1, calibration_filename = barometer_filename, budget = barometer_budget) #On tente d'établir la connexion
             except Exception as e: #Si ça ne marche pas on attend avant de rententer
                 self.barometre = None
                 self.logger.error(e)
@@ -52,80 +64,97 @@ class Sensors:
 
 
 
-    ## Lit la température via le thermomètre. Si le capteur ne répond pas, la lecture de la température est faite via le baromètre.
-    # @param temperature Variable qui contiendra la réponse
-    # @param nbmesures Nombre de mesure à effectuer
-    def readThermometer(self, temperature):
+    ## Lit une grandeur jusqu'à la première mesure valide ou, en suréchantillonnage, tant que le temps accordé à la grandeur n'est pas écoulé.
+    # Les mesures de chaque source (par exemple chaque sonde) sont filtrées séparément, puis combinées.
+    # @param acquisition Instance Acquisition (échéance et annulation).
+    # @param name Nom de la grandeur.
+    # @param read Fonction réalisant un essai de lecture, renvoyant un dictionnaire associant chaque source à sa mesure valide.
+    # @param interval Attente entre deux mesures valides, en secondes. Après un essai sans mesure, l'attente est d'une seconde.
+    # @param resolution Résolution du capteur.
+    # @return Retourne les mesures (objet Samples).
+    def oversample(self, acquisition, name, read, interval, resolution):
+        groups = {}
+        end = monotonic() + self.oversampling.get(name, 0)
+        while acquisition.running():
+            values = read()
+            for source, value in values.items():
+                groups.setdefault(source, Samples(resolution)).add(value)
+            if any(len(samples) > 0 for samples in groups.values()) and monotonic() >= end:
+                break
+            acquisition.wait(interval if values else 1)
+        if len(groups) > 1:
+            for source, samples in sorted(groups.items()):
+                self.logger.info(name + " " + source + " : " + samples.summary())
+        return combine(groups) if groups else Samples(resolution)
+
+    ## Lit la température via les sondes 1-wire : une seule conversion pour toutes les sondes, chaque sonde lue ajoute sa mesure à ses propres mesures.
+    # Sans sonde sur le bus, la lecture se termine aussitôt et la température est ensuite lue via le baromètre.
+    # @param acquisition Instance Acquisition (échéance et annulation).
+    # @return Retourne les mesures (objet Samples).
+    def readThermometer(self, acquisition):
         self.logger.info("Début des mesures du thermomètre...")
-        start_time = time()
-        while time()-start_time < self.timeout:
+        if not self.thermometer.present():
+            self.logger.info("Aucune sonde 1-wire sur le bus.")
+            return Samples()
+        def read():
             try:
-                h = self.pi.file_open("/sys/bus/w1/devices/28-00000adfb15d/w1_slave", pigpio.FILE_READ)
-                c, data = self.pi.file_read(h, 500)
-                self.pi.file_close(h)
-                if type(data) is not str:
-                    data = data.decode()
-                if "YES" in data:
-                    (discard, sep, reading) = data.partition(' t=')
-                    if reading != 85000:
-                        temperature.append(float(reading)/1000.0)
-                        break
+                temperatures = self.thermometer.read()
+                for name, value in temperatures.items():
+                    self.logger.info("Sonde " + name + " : " + str(value) + " °C")
+                return temperatures
             except Exception as e:
                 self.logger.error(e)
                 self.logger.error("Impossible de lire le thermomètre.")
-                sleep(3)
-
-
-        if len(temperature) == 0:
-            self.logger.info("Prochain essai à l'aide du baromètre.")
-            try:
-                temperature.append(self.barometre.read_temperature())
-            except Exception as e:
-                self.logger.error(e)
-                self.logger.error("Impossible d'obtenir la température.")
+                return {}
+        # La conversion (750 ms) rythme les mesures
+        temperature = self.oversample(acquisition, "Temperature", read, 0, 0.0625)
 
         self.logger.success("Lecture de la température terminée.")
+        return temperature
 
-    ## Lit la température et l'humidité via l'hygromètre.
-    # @param Humidity Variable qui contiendra la réponse
-    # @param nbmesures Nombre de mesure à effectuer
-    def readHygrometer(self, humidity):
+    ## Lit l'humidité via l'hygromètre.
+    # @param acquisition Instance Acquisition (échéance et annulation).
+    # @return Retourne les mesures (objet Samples).
+    def readHygrometer(self, acquisition):
         self.logger.info("Début des mesures de l'humidité...")
-        start_time = time()
+        humidity = Samples()
         try:
             sensor = DHT11(self.pi, self.dht11_gpio)
-            for d in sensor:
-                h = d['humidity']
-                if h <= 100 and h != 0:
-                    humidity.append(h)
-                    break
-                if time()-start_time > self.timeout:
-                    break
-                sleep(1)
-            sensor.close()
+            def read():
+                d = next(sensor)
+                # d vaut None si la trame est incomplète ou si sa somme de contrôle est fausse : nouvelle lecture
+                if d is not None and d['humidity'] <= 100 and d['humidity'] != 0:
+                    return {"DHT11": d['humidity']}
+                return {}
+            try:
+                # Le DHT11 ne peut pas être interrogé plus d'une fois par seconde
+                humidity = self.oversample(acquisition, "Humidity", read, 1, 1)
+            finally:
+                sensor.close()
         except Exception as e:
             self.logger.error(e)
             self.logger.error("Impossible de lire l'hygromètre.")
 
         self.logger.success("Lecture de l'humidité terminée.")
+        return humidity
 
     ## Lit la pression via le baromètre.
-    # @return Retourne la pression ou 0 en cas d'erreur.
-    def readBarometer(self, pressure):
+    # @param acquisition Instance Acquisition (échéance et annulation).
+    # @return Retourne les mesures (objet Samples).
+    def readBarometer(self, acquisition):
         self.logger.info("Début des mesures de la pression...")
-        start_time = time()
-        while time()-start_time < self.timeout:
+        def read():
             try:
-                buffer = self.barometre.read_pressure()
-                if buffer != 0:
-                    pressure.append(buffer/100)
-                    break
+                buffer = self.barometre.measure(fresh = True)[1]
+                return {"BMP085": buffer/100} if buffer != 0 else {}
             except Exception as e:
                 self.logger.error(e)
                 self.logger.error("Impossible de lire le baromètre.")
-            sleep(1)
+                return {}
+        pressure = self.oversample(acquisition, "Pressure", read, 0.05, 0.01)
 
         self.logger.success("Lecture du baromètre terminée.")
+        return pressure
 
     ## Calcule la hauteur de la base des nuages grâce à l'approximation de Magnus-Tetens.
     # @param T Température.
@@ -150,31 +179,26 @@ class Sensors:
     # @return Retourne le dictionnaire contenant les données des capteurs.
     def getRPISensorsData(self):
         #Température, humidité, pression
-        #Pour chaque grandeur, un thread met à jour le tableau avec les nouvelles mesures
-        H,T,P = [], [],[]
-        thread_hydro = Thread(target = Sensors.readHygrometer, args=(self,H))
-        thread_temp = Thread(target = Sensors.readThermometer, args=(self,T))
-        thread_press = Thread(target = Sensors.readBarometer, args=(self,P))
-        thread_hydro.start()
-        thread_temp.start()
-        thread_press.start()
-        thread_hydro.join()
-        thread_temp.join()
-        thread_press.join()
-
-        #On renvoie un tableau contenant toutes les gradeurs moyennées
-        rpiSensorsData = {"Time":strftime("%Hh%M"), "Temperature":average(T),"Humidity":average(H),"Pressure":average(P), "Cloud":self.getCloudBase(average(T), average(H))}
-        return rpiSensorsData
-
-   
-
-        
-## Calcule la moyenne d'un tableau
-# @param arr Tableau à moyenner
-# @return Retourne la moyenne du tableau ou 0 si le tableau est vide.
-def average(arr):
-    if(len(arr) == 0):
-        return 0
-    else:
-        return sum(arr) / len(arr)
+        #Chaque grandeur est lue dans un thread, avec une échéance commune : l'acquisition se termine dès que chaque grandeur a une mesure
+        acquisition = Acquisition(self.logger, self.timeout)
+        acquisition.submit("Temperature", self.readThermometer)
+        acquisition.submit("Humidity", self.readHygrometer)
+        if self.barometre is not None:
+            acquisition.submit("Pressure", self.readBarometer)
+        results = acquisition.collect()
+        H, T, P = results.get("Humidity") or Samples(), results.get("Temperature") or Samples(), results.get("Pressure") or Samples()
+
+        if len(T) == 0 and self.barometre is not None:
+            self.logger.info("Température lue à l'aide du baromètre.")
+            try:
+                T.add(self.barometre.measure()[0]) # Conversion partagée avec la lecture de la pression
+            except Exception as e:
+                self.logger.error(e)
+                self.logger.error("Impossible d'obtenir la température.")
 
+        for name, samples in (("Temperature", T), ("Humidity", H), ("Pressure", P)):
+            if len(samples) > 1:
+                self.logger.info(name + " : " + samples.summary())
+        #On renvoie un tableau contenant toutes les grandeurs, moyennées sans les valeurs extrêmes
+        rpiSensorsData = {"Time":strftime("%Hh%M"), "Temperature":T.trimmedMean(),"Humidity":H.trimmedMean(),"Pressure":P.trimmedMean(), "Cloud":self.getCloudBase(T.trimmedMean(), H.trimmedMean())}
+        return rpiSensorsData
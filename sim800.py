@@ -0,0 +1,313 @@
+## @file sim800.py
+# Définition de la classe Sim800. Elle émule le module GSM SIM800L derrière les appels pi.serial_* utilisés par la classe Gsm,
+# et fournit des scénarios de charge pour mesurer le débit de réponse aux SMS.
+# Utilisation : python sim800.py [scénario...]
+##
+
+from time import monotonic, localtime, strftime, perf_counter
+from threading import Thread, Lock
+import urllib.request
+import urllib.error
+import sys
+
+## Scénarios de charge : latences du modèle de temps remplacées et nombre de SMS présents sur la carte SIM au début du test.
+SCENARIOS = {
+    "vide": {"latencies": {}, "sms": 0},
+    "10_sms": {"latencies": {}, "sms": 10},
+    "200_sms": {"latencies": {"sms_send": 0.05}, "sms": 200},
+    "reseau_lent": {"latencies": {"modem_response": 0.5, "sms_send": 4}, "sms": 10},
+}
+
+## Textes des SMS générés par les scénarios, envoyés à tour de rôle.
+SCENARIO_TEXTS = ["Meteo", "aide?", "altitude?", "Meteo stp", "nom?"]
+
+## Nombre de numéros différents envoyant les SMS des scénarios.
+SCENARIO_NUMBERS = 20
+
+## Classe Sim800.
+# Automate AT du module GSM branché sur l'UART : il stocke les SMS reçus, répond aux commandes après une latence configurable
+# (prise dans les latences de l'instance SimulatedPi) et peut émettre des notifications non sollicitées.
+class Sim800:
+
+    ## Constructeur.
+    # @param sim Instance SimulatedPi.
+    # @param capacity Nombre maximal de SMS stockés sur la carte SIM. La valeur par défaut est 30.
+    def __init__(self, sim, capacity = 30):
+        ## Instance SimulatedPi.
+        self.sim = sim
+        ## Nombre maximal de SMS stockés sur la carte SIM.
+        self.capacity = capacity
+        ## Octets reçus et pas encore traités.
+        self.input = b""
+        ## Octets émis vers le Raspberry Pi, sous la forme (instant de disponibilité, octet).
+        self.output = []
+        ## Verrou protégeant le tampon de sortie.
+        self.lock = Lock()
+        ## Commande (+CMGS ou +CMGW) en attente du texte du SMS.
+        self.prompt = None
+        ## Module enregistré sur le réseau.
+        self.registered = True
+        ## Qualité du signal renvoyée par +CSQ (0 à 31).
+        self.signal = 18
+        ## Compteur des SMS envoyés.
+        self.sent = 0
+        ## SMS envoyés, sous la forme (numéro, texte).
+        self.outbox = []
+        ## SMS enregistrés par +CMGW (état "STO UNSENT"), indexés par leur indice. Ils partagent la mémoire de la carte SIM avec les SMS reçus.
+        self.drafts = {}
+        ## SMS reçus sur la carte SIM, indexés par leur indice : (numéro, horodatage, texte).
+        self.inbox = {}
+        ## Connexion GPRS ouverte.
+        self.bearer = False
+        ## Compteur des ouvertures de la connexion GPRS.
+        self.bearer_setups = 0
+        ## Paramètres HTTP (+HTTPPARA), indexés par nom.
+        self.http = {}
+        ## Nombre d'octets de données HTTP restant à recevoir après +HTTPDATA.
+        self.download = 0
+        ## Données HTTP à envoyer par +HTTPACTION.
+        self.http_data = b""
+
+    ## Renvoie l'horodatage actuel au format du module.
+    # @return Retourne l'horodatage.
+    def timestamp(self):
+        return strftime("%y/%m/%d,%H:%M:%S", localtime()) + "+08"
+
+    ## Simule la réception d'un SMS.
+    # @param number Le numéro de l'expéditeur.
+    # @param text Le texte du SMS.
+    # @param notify Notification émise : "CMTI" (SMS stocké puis signalé), "CMT" (SMS transmis directement) ou None (SMS stocké sans notification).
+    # @return Retourne l'indice du SMS, ou None s'il n'a pas été stocké.
+    def receiveSMS(self, number, text, notify = "CMTI"):
+        if notify == "CMT":
+            self.inject("+CMT: \"" + number + "\",\"\",\"" + self.timestamp() + "\"\r\n" + text)
+            return None
+        index = self.allocate()
+        if index is None:
+            return None
+        self.inbox[index] = (number, self.timestamp(), text)
+        if notify == "CMTI":
+            self.inject("+CMTI: \"SM\"," + str(index))
+        return index
+
+    ## Réserve un indice dans la mémoire de la carte SIM, commune aux SMS reçus et enregistrés.
+    # @return Retourne l'indice suivant le plus grand indice occupé, ou None si la carte SIM est pleine.
+    def allocate(self):
+        if len(self.inbox) + len(self.drafts) >= self.capacity:
+            return None
+        return max(list(self.inbox) + list(self.drafts), default = 0) + 1
+
+    ## Émet une notification non sollicitée, immédiatement.
+    # @param urc Le texte de la notification, sans les retours à la ligne qui l'encadrent.
+    def inject(self, urc):
+        self.respond("\r\n" + urc + "\r\n", 0)
+
+    ## Émet une réponse vers le Raspberry Pi, disponible octet par octet au rythme de l'UART.
+    # @param text La réponse.
+    # @param delay Délai avant le premier octet. Par défaut, la latence de réponse du modem.
+    def respond(self, text, delay = None):
+        start = monotonic() + (self.sim.latencies["modem_response"] if delay is None else delay)
+        with self.lock:
+            if self.output:
+                start = max(start, self.output[-1][0])
+            for i, byte in enumerate(text.encode("8859")):
+                self.output.append((start + i * self.sim.latencies["uart_byte"], byte))
+
+    ## Reçoit des octets depuis le Raspberry Pi.
+    # @param data Les octets reçus.
+    def write(self, data):
+        self.input += bytes(data)
+        if self.download > 0:
+            chunk, self.input = self.input[:self.download], self.input[self.download:]
+            self.http_data += chunk
+            self.download -= len(chunk)
+            if self.download == 0:
+                self.respond("\r\nOK\r\n")
+            return
+        if self.prompt is not None:
+            if b"\x1a" in self.input:
+                text, self.input = self.input.split(b"\x1a", 1)
+                self.submit(text.decode("8859"))
+            return
+        while b"\r" in self.input:
+            line, self.input = self.input.split(b"\r", 1)
+            line = line.decode("8859").strip()
+            if line.upper().startswith("AT"):
+                self.command(line[2:])
+
+    ## Traite le texte d'un SMS saisi après l'invite "> ".
+    # @param text Le texte du SMS.
+    def submit(self, text):
+        if self.prompt.startswith("+CMGW"):
+            index = self.allocate()
+            if index is None:
+                self.respond("\r\n+CMS ERROR: 322\r\n")
+            else:
+                self.drafts[index] = text
+                self.respond("\r\n+CMGW: " + str(index) + "\r\n\r\nOK\r\n")
+        elif not self.registered:
+            self.respond("\r\n+CMS ERROR: 331\r\n", self.sim.latencies["sms_send"])
+        else:
+            self.sent += 1
+            self.outbox.append((self.prompt[6:].strip('"'), text))
+            self.respond("\r\n+CMGS: " + str(self.sent) + "\r\n\r\nOK\r\n", self.sim.latencies["sms_send"])
+        self.prompt = None
+
+    ## Exécute une commande AT.
+    # @param command La commande sans le préfixe "AT".
+    def command(self, command):
+        if command.startswith("+CMGS=") or command.startswith("+CMGW"):
+            self.prompt = command
+            self.respond("\r\n> ")
+        elif command.startswith("+CMSS="):
+            arguments = command[6:].split(",")
+            text = self.drafts.get(int(arguments[0]))
+            if text is None or not self.registered:
+                self.respond("\r\n+CMS ERROR: " + ("321" if text is None else "331") + "\r\n", self.sim.latencies["sms_send"])
+            else:
+                self.sent += 1
+                self.outbox.append((arguments[1].strip('"') if len(arguments) > 1 else "", text))
+                self.respond("\r\n+CMSS: " + str(self.sent) + "\r\n\r\nOK\r\n", self.sim.latencies["sms_send"])
+        elif command == "+CCLK?":
+            self.respond("\r\n+CCLK: \"" + self.timestamp() + "\"\r\n\r\nOK\r\n")
+        elif command == "+CREG?":
+            self.respond("\r\n+CREG: 0," + ("1" if self.registered else "2") + "\r\n\r\nOK\r\n")
+        elif command == "+CSQ":
+            self.respond("\r\n+CSQ: " + str(self.signal) + ",0\r\n\r\nOK\r\n")
+        elif command == "+CPMS?":
+            used = str(len(self.inbox) + len(self.drafts)) + "," + str(self.capacity)
+            self.respond("\r\n+CPMS: \"SM\"," + used + ",\"SM\"," + used + ",\"SM\"," + used + "\r\n\r\nOK\r\n")
+        elif command.startswith("+CMGL"):
+            listing = ""
+            for index in sorted(list(self.inbox) + list(self.drafts)):
+                if index in self.drafts:
+                    listing += "\r\n+CMGL: " + str(index) + ",\"STO UNSENT\",\"\",\"\"\r\n" + self.drafts[index]
+                else:
+                    (number, timestamp, text) = self.inbox[index]
+                    listing += "\r\n+CMGL: " + str(index) + ",\"REC UNREAD\",\"" + number + "\",\"\",\"" + timestamp + "\"\r\n" + text
+            self.respond(listing + "\r\n\r\nOK\r\n")
+        elif command.startswith("+CMGR="):
+            index = int(command[6:])
+            message = self.inbox.get(index)
+            if index in self.drafts:
+                self.respond("\r\n+CMGR: \"STO UNSENT\",\"\",\"\"\r\n" + self.drafts[index] + "\r\n\r\nOK\r\n")
+            elif message is None:
+                self.respond("\r\nOK\r\n")
+            else:
+                self.respond("\r\n+CMGR: \"REC UNREAD\",\"" + message[0] + "\",\"\",\"" + message[1] + "\"\r\n" + message[2] + "\r\n\r\nOK\r\n")
+        elif command.startswith("+CMGD="):
+            arguments = command[6:].split(",")
+            if len(arguments) > 1 and arguments[1] == "4":
+                self.inbox.clear()
+                self.drafts.clear()
+            else:
+                self.inbox.pop(int(arguments[0]), None)
+                self.drafts.pop(int(arguments[0]), None)
+            self.respond("\r\nOK\r\n")
+        elif command.startswith("+SAPBR="):
+            self.bearerCommand(command[7:].split(","))
+        elif command.startswith("+HTTPPARA="):
+            name, value = command[10:].split(",", 1)
+            self.http[name.strip('"')] = value.strip('"')
+            self.respond("\r\nOK\r\n")
+        elif command.startswith("+HTTPDATA="):
+            self.download = int(command[10:].split(",")[0])
+            self.http_data = b""
+            self.respond("\r\nDOWNLOAD\r\n")
+        elif command.startswith("+HTTPACTION="):
+            self.respond("\r\nOK\r\n")
+            Thread(target = self.httpAction, daemon = True).start()
+        else:
+            self.respond("\r\nOK\r\n")
+
+    ## Exécute une commande +SAPBR de gestion de la connexion GPRS.
+    # @param arguments Les arguments de la commande.
+    def bearerCommand(self, arguments):
+        if arguments[0] == "1":
+            if self.bearer or not self.registered:
+                self.respond("\r\nERROR\r\n")
+                return
+            self.bearer = True
+            self.bearer_setups += 1
+            self.respond("\r\nOK\r\n", self.sim.latencies["gprs_bearer"])
+        elif arguments[0] == "0":
+            self.bearer = False
+            self.respond("\r\nOK\r\n")
+        elif arguments[0] == "2":
+            self.respond("\r\n+SAPBR: 1," + ("1" if self.bearer else "3") + ",\"10.0.0.2\"\r\n\r\nOK\r\n")
+        else:
+            self.respond("\r\nOK\r\n")
+
+    ## Transmet la requête HTTP POST au serveur indiqué par le paramètre URL, puis notifie le résultat par +HTTPACTION.
+    def httpAction(self):
+        if not self.bearer:
+            self.inject("+HTTPACTION: 1,601,0")
+            return
+        headers = {"Content-Type": self.http.get("CONTENT", "text/plain")}
+        if ":" in self.http.get("USERDATA", ""):
+            name, value = self.http["USERDATA"].split(":", 1)
+            headers[name.strip()] = value.strip()
+        request = urllib.request.Request(self.http.get("URL", ""), data = self.http_data, headers = headers, method = "POST")
+        try:
+            with urllib.request.urlopen(request, timeout = 30) as response:
+                status, length = response.status, len(response.read())
+        except urllib.error.HTTPError as e:
+            status, length = e.code, 0
+        except Exception:
+            status, length = 603, 0 # Erreur réseau (DNS, connexion refusée...)
+        self.inject("+HTTPACTION: 1," + str(status) + "," + str(length))
+
+    ## Renvoie le nombre d'octets disponibles.
+    # @return Retourne le nombre d'octets disponibles.
+    def available(self):
+        now = monotonic()
+        with self.lock:
+            return sum(1 for (ready, byte) in self.output if ready <= now)
+
+    ## Lit les octets disponibles.
+    # @param count Le nombre maximal d'octets à lire.
+    # @return Retourne les octets lus.
+    def read(self, count):
+        now = monotonic()
+        with self.lock:
+            ready = [byte for (instant, byte) in self.output[:count] if instant <= now]
+            del self.output[:len(ready)]
+        return bytearray(ready)
+
+
+## Mesure le débit de réponse aux SMS de la classe Gsm dans un scénario de charge.
+# Les SMS du scénario sont stockés sur la carte SIM sans notification, comme s'ils étaient arrivés pendant que le Raspberry Pi était éteint.
+# @param name Le nom du scénario dans SCENARIOS.
+# @param logger Logger transmis à la classe Gsm.
+# @return Retourne un dictionnaire : nombre de SMS traités, nombre de SMS envoyés, durée (s) et débit (SMS/s).
+def benchmark(name, logger):
+    # Import local : simulation.py importe ce module
+    from simulation import SimulatedPi
+    from config import ConfigFile
+    from gsm import Gsm
+    import tempfile
+    import os
+    scenario = SCENARIOS[name]
+    pi = SimulatedPi(latencies = scenario["latencies"])
+    modem = pi.serial_device
+    modem.capacity = max(modem.capacity, scenario["sms"])
+    for i in range(scenario["sms"]):
+        modem.receiveSMS("+336000000" + str(i % SCENARIO_NUMBERS).zfill(2), SCENARIO_TEXTS[i % len(SCENARIO_TEXTS)], notify = None)
+    with tempfile.TemporaryDirectory() as directory:
+        config = ConfigFile(os.path.join(directory, "config.ini"))
+        gsm = Gsm(config = config, pi = pi, logger = logger, queue_filename = os.path.join(directory, "sms_queue.json"))
+        sensorsData = {"Time": strftime("%H:%M", localtime()), "Temperature": 21.5, "Speed": 12, "Speed_max": 25, "Direction": 270, "Direction_max": 250,
+                       "Pressure": 1013, "Humidity": 45, "Cloud": 1200, "Battery": 12500}
+        start = perf_counter()
+        gsm.respondToSMS(sensorsData)
+        duration = perf_counter() - start
+    return {"sms": scenario["sms"], "sent": modem.sent, "duration": duration, "throughput": scenario["sms"] / duration if duration > 0 else 0}
+
+
+if __name__ == "__main__":
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level = "WARNING")
+    for name in sys.argv[1:] or SCENARIOS:
+        result = benchmark(name, logger)
+        print(name + " : " + str(result["sms"]) + " SMS traités, " + str(result["sent"]) + " SMS envoyés en " + str(round(result["duration"], 2)) + " s, soit " + str(round(result["throughput"], 1)) + " SMS/s")
@@ -0,0 +1,498 @@
+## @file simulation.py
+# Définition de la classe SimulatedPi. Elle remplace l'instance pigpio.pi afin d'exécuter un cycle complet de la station sans le matériel,
+# avec un modèle de temps configurable pour mesurer le temps d'éveil du Raspberry Pi.
+##
+
+from time import sleep, time, monotonic
+from threading import Thread
+import os
+import random
+import shutil
+import sys
+import tempfile
+from mkrfox import Mkrfox
+from bmp085 import Bmp085, CALIBRATION, compensate
+from sim800 import Sim800
+import pigpio
+
+## Latences par défaut du modèle de temps, en secondes.
+# - i2c_transaction : coût fixe d'une transaction I2C (aller-retour vers pigpiod compris).
+# - i2c_byte : coût d'un octet sur le bus I2C à 100 kHz.
+# - uart_byte : coût d'un octet sur l'UART à 115200 bauds.
+# - gpio : coût d'une commande GPIO envoyée à pigpiod.
+# - dht11_response : délai entre la fin de l'impulsion de démarrage et la trame du DHT11.
+# - modem_response : délai de réponse du module GSM à une commande AT.
+# - sms_send : durée d'envoi d'un SMS sur le réseau GSM (+CMGS, +CMSS).
+# - sigfox_time : délai pour obtenir l'heure depuis le réseau Sigfox.
+# - gprs_bearer : durée d'ouverture de la connexion GPRS.
+LATENCIES = {
+    "i2c_transaction": 0.0005,
+    "i2c_byte": 0.00009,
+    "uart_byte": 0.000087,
+    "gpio": 0.0001,
+    "dht11_response": 0.005,
+    "modem_response": 0.05,
+    "sms_send": 1,
+    "sigfox_time": 5,
+    "gprs_bearer": 2,
+}
+
+## Classe SimulatedMkrfox.
+# Modèle du MKRFOX 1200 sur le bus I2C. Les registres suivent la table Mkrfox.register.
+class SimulatedMkrfox:
+
+    ## Constructeur.
+    # @param sim Instance SimulatedPi.
+    # @param state Valeur initiale du registre d'état. Par défaut, premier cycle de la journée.
+    # @param battery Tension de la batterie en mV.
+    def __init__(self, sim, state = 0b00000100, battery = 12150):
+        ## Instance SimulatedPi.
+        self.sim = sim
+        ## Adresses des registres à renvoyer lors de la prochaine lecture.
+        self.pointer = []
+        ## Valeurs des registres, indexées par adresse.
+        self.values = {address: 0 for (address, length) in Mkrfox.register.values()}
+        ## Nombre d'octets de chaque registre, indexé par adresse.
+        self.lengths = {address: length for (address, length) in Mkrfox.register.values()}
+        self.values[Mkrfox.register["state"][0]] = state
+        self.values[Mkrfox.register["battery"][0]] = battery
+        self.values[Mkrfox.register["time"][0]] = round(time())
+
+    ## Reçoit une écriture I2C : une liste d'adresses à lire (précédée de Mkrfox.BLOCK_READ) ou des couples adresse/données.
+    # @param data Les octets reçus.
+    def write(self, data):
+        data = bytes(data)
+        if len(data) == 1:
+            self.pointer = [data[0]]
+        elif data[0] == Mkrfox.BLOCK_READ:
+            self.pointer = list(data[1:])
+        else:
+            i = 0
+            while i < len(data):
+                address = data[i]
+                length = self.lengths[address]
+                value = data[i + 1:i + 1 + length]
+                self.values[address] = int.from_bytes(value, "big") if length <= 4 else value
+                self.pointer = [address]
+                if address == Mkrfox.register["time"][0] and self.values[address] == 0:
+                    Thread(target = self.sigfoxTime, daemon = True).start()
+                i += 1 + length
+
+    ## Simule la récupération de l'heure par le réseau Sigfox.
+    def sigfoxTime(self):
+        sleep(self.sim.latencies["sigfox_time"])
+        self.values[Mkrfox.register["time"][0]] = round(time())
+        self.values[Mkrfox.register["state"][0]] |= 0b00000010
+
+    ## Répond à une lecture I2C avec les valeurs des registres pointés.
+    # @param count Le nombre d'octet demandés.
+    # @return Retourne les octets lus.
+    def read(self, count):
+        output = bytearray()
+        for address in self.pointer:
+            value = self.values[address]
+            output += value.to_bytes(self.lengths[address], "big") if isinstance(value, int) else value
+        return output[:count]
+
+
+## Classe SimulatedAttiny.
+# Modèle de l'ATTINY mesurant la vitesse et la direction du vent.
+class SimulatedAttiny:
+
+    ## Constructeur.
+    # @param sim Instance SimulatedPi.
+    # @param wind Les 8 octets renvoyés par l'ATTINY (direction, période, direction max, période max).
+    # Par défaut, vent moyen de 18 km/h et vent maximal de 28 km/h, de direction 184°.
+    def __init__(self, sim, wind = b"\x0d\x65\x22\x9f\x0d\x51\x16\x42"):
+        ## Instance SimulatedPi.
+        self.sim = sim
+        ## Octets renvoyés lors d'une lecture.
+        self.wind = bytes(wind)
+
+    ## Reçoit une écriture I2C (requête de mesure).
+    # @param data Les octets reçus.
+    def write(self, data):
+        pass
+
+    ## Répond à une lecture I2C avec les données du vent.
+    # @param count Le nombre d'octet demandés.
+    # @return Retourne les octets lus.
+    def read(self, count):
+        return bytearray(self.wind[:count])
+
+
+## Classe SimulatedBmp085.
+# Modèle du baromètre BMP085 : identifiant, EEPROM de calibration (valeurs d'exemple de la documentation) et conversions.
+# Les valeurs brutes renvoyées sont calculées pour que la compensation donne la température et la pression simulées.
+class SimulatedBmp085:
+
+    ## Décalage d'une mesure de pression aberrante, en Pa.
+    SPIKE = 500
+    ## Coefficients de calibration de l'exemple de la documentation du BMP085.
+    CALIBRATION = {"AC1": 408, "AC2": -72, "AC3": -14383, "AC4": 32741, "AC5": 32757, "AC6": 23153, "B1": 6190, "B2": 4, "MB": -32768, "MC": -8711, "MD": 2868}
+
+    ## Constructeur.
+    # @param sim Instance SimulatedPi.
+    # @param temperature Température renvoyée, en °C.
+    # @param pressure Pression renvoyée, en Pa.
+    # @param noise Écart-type du bruit gaussien ajouté à chaque mesure de pression, en Pa. Par défaut, aucun bruit.
+    # @param spikes Probabilité qu'une mesure de pression soit aberrante (décalée de SPIKE Pa). Par défaut, aucune.
+    # @param seed Graine du générateur aléatoire.
+    def __init__(self, sim, temperature = 21.5, pressure = 101325, noise = 0, spikes = 0, seed = None):
+        ## Instance SimulatedPi.
+        self.sim = sim
+        ## Température renvoyée.
+        self.temperature = temperature
+        ## Pression renvoyée.
+        self.pressure = pressure
+        ## Écart-type du bruit de pression.
+        self.noise = noise
+        ## Probabilité d'une mesure aberrante.
+        self.spikes = spikes
+        ## Générateur aléatoire du bruit.
+        self.random = random.Random(seed)
+        ## Registres, indexés par adresse.
+        self.registers = bytearray(256)
+        self.registers[Bmp085.REG_CHIP_ID] = Bmp085.CHIP_ID
+        self.registers[Bmp085.REG_CHIP_ID + 1] = 0x02
+        for i, name in enumerate(CALIBRATION):
+            address = Bmp085.REG_CALIBRATION + 2 * i
+            self.registers[address:address + 2] = self.CALIBRATION[name].to_bytes(2, "big", signed = self.CALIBRATION[name] < 0)
+        ## Registre pointé par la prochaine lecture.
+        self.pointer = 0
+        ## Nombre de conversions réalisées.
+        self.conversions = 0
+
+    ## Recherche par dichotomie la plus petite valeur brute dont la compensation atteint la valeur simulée (la compensation est croissante).
+    # @param index 0 pour la température, 1 pour la pression.
+    # @param target La valeur simulée.
+    # @param mode Le mode de suréchantillonnage.
+    # @param ut La valeur brute de la température, pour la pression.
+    # @return Retourne la valeur brute.
+    def raw(self, index, target, mode, ut = 0):
+        low, high = 0, (1 << 16) if index == 0 else (1 << (16 + mode))
+        while low < high:
+            middle = (low + high) // 2
+            value = compensate(self.CALIBRATION, middle if index == 0 else ut, middle, mode)[index]
+            if value < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    ## Reçoit une écriture I2C : adresse d'un registre, éventuellement suivie d'une commande de conversion.
+    # @param data Les octets reçus.
+    def write(self, data):
+        data = bytes(data)
+        self.pointer = data[0]
+        if self.pointer != Bmp085.REG_CONTROL or len(data) < 2:
+            return
+        self.conversions += 1
+        ut = self.raw(0, self.temperature, 0)
+        if data[1] == Bmp085.READ_TEMPERATURE:
+            self.registers[Bmp085.REG_DATA:Bmp085.REG_DATA + 2] = ut.to_bytes(2, "big")
+        else:
+            mode = data[1] >> 6
+            pressure = self.pressure + self.random.gauss(0, self.noise)
+            if self.random.random() < self.spikes:
+                pressure += self.random.choice((-1, 1)) * self.SPIKE
+            up = self.raw(1, pressure, mode, ut) << (8 - mode)
+            self.registers[Bmp085.REG_DATA:Bmp085.REG_DATA + 3] = up.to_bytes(3, "big")
+
+    ## Répond à une lecture I2C avec les registres à partir du registre pointé.
+    # @param count Le nombre d'octet demandés.
+    # @return Retourne les octets lus.
+    def read(self, count):
+        return bytearray(self.registers[self.pointer:self.pointer + count])
+
+
+## Classe SimulatedDHT11.
+# Modèle du capteur d'humidité DHT11 : après l'impulsion de démarrage, il émet une trame de 40 bits sur les callbacks de la pin.
+class SimulatedDHT11:
+
+    ## Constructeur.
+    # @param sim Instance SimulatedPi.
+    # @param gpio Numéro de pin du capteur.
+    # @param humidity Humidité renvoyée, en %.
+    # @param temperature Température renvoyée, en °C.
+    def __init__(self, sim, gpio, humidity = 45, temperature = 21):
+        ## Instance SimulatedPi.
+        self.sim = sim
+        ## Numéro de pin du capteur.
+        self.gpio = gpio
+        ## Humidité renvoyée.
+        self.humidity = humidity
+        ## Température renvoyée.
+        self.temperature = temperature
+
+    ## Construit la liste des fronts (niveau, durée depuis le front précédent en µs) d'une trame complète.
+    # @return Retourne la liste des fronts.
+    def edges(self):
+        frame = [self.humidity, 0, self.temperature, 0]
+        frame.append(sum(frame) & 255)
+        edges = [(1, 17000), (0, 30), (1, 80), (0, 80)]
+        for byte in frame:
+            for i in range(7, -1, -1):
+                edges.append((1, 50))
+                edges.append((0, 70 if byte >> i & 1 else 26))
+        edges.append((1, 50))
+        return edges
+
+    ## Émet la trame sur les callbacks de la pin, après la latence de réponse du capteur.
+    def emit(self):
+        sleep(self.sim.latencies["dht11_response"])
+        tick = self.sim.get_current_tick()
+        for level, duration in self.edges():
+            tick = (tick + duration) & 0xFFFFFFFF
+            self.sim.edge(self.gpio, level, tick)
+        if self.sim.watchdogs.get(self.gpio):
+            self.sim.edge(self.gpio, pigpio.TIMEOUT, (tick + self.sim.watchdogs[self.gpio] * 1000) & 0xFFFFFFFF)
+
+
+## Classe SimulatedW1Bus.
+# Arborescence sysfs du bus 1-wire, créée dans un répertoire temporaire : un maître (w1_bus_master1) avec son fichier therm_bulk_read,
+# et pour chaque sonde un répertoire contenant "temperature" et "w1_slave", lié depuis le répertoire des appareils comme dans /sys/bus/w1/devices.
+class SimulatedW1Bus:
+
+    ## Constructeur.
+    # @param thermometers Températures des sondes en °C, indexées par identifiant.
+    def __init__(self, thermometers):
+        ## Répertoire temporaire contenant l'arborescence.
+        self.directory = tempfile.mkdtemp(prefix = "w1_")
+        ## Répertoire des appareils, équivalent de /sys/bus/w1/devices.
+        self.root = os.path.join(self.directory, "bus")
+        master = os.path.join(self.directory, "devices", "w1_bus_master1")
+        os.makedirs(self.root)
+        os.makedirs(master)
+        with open(os.path.join(master, "therm_bulk_read"), "w") as bulkfile:
+            bulkfile.write("0\n")
+        for device, temperature in thermometers.items():
+            path = os.path.join(master, device)
+            os.makedirs(path)
+            reading = str(round(temperature * 1000))
+            with open(os.path.join(path, "temperature"), "w") as temperaturefile:
+                temperaturefile.write(reading + "\n")
+            with open(os.path.join(path, "w1_slave"), "w") as slavefile:
+                slavefile.write("72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n72 01 4b 46 7f ff 0e 10 57 t=" + reading + "\n")
+            os.symlink(path, os.path.join(self.root, device))
+
+    ## Supprime l'arborescence.
+    def remove(self):
+        shutil.rmtree(self.directory, ignore_errors = True)
+
+
+## Classe SimulatedCallback.
+# Équivalent du callback pigpio, annulable.
+class SimulatedCallback:
+
+    ## Constructeur.
+    # @param sim Instance SimulatedPi.
+    # @param gpio Numéro de pin surveillée.
+    # @param edge Type de front surveillé.
+    # @param func Fonction appelée avec (gpio, niveau, tick).
+    def __init__(self, sim, gpio, edge, func):
+        ## Instance SimulatedPi.
+        self.sim = sim
+        ## Numéro de pin surveillée.
+        self.gpio = gpio
+        ## Type de front surveillé.
+        self.edge = edge
+        ## Fonction appelée à chaque front.
+        self.func = func
+
+    ## Supprime le callback.
+    def cancel(self):
+        if self in self.sim.callbacks:
+            self.sim.callbacks.remove(self)
+
+
+## Classe SimulatedPi.
+# Remplace pigpio.pi : elle implémente les appels utilisés par la station (I2C, UART, GPIO, callbacks) sur des modèles
+# d'appareils et comptabilise le temps passé dans chaque type d'opération.
+class SimulatedPi:
+
+    ## Constructeur.
+    # @param latencies Latences du modèle de temps, complétant ou remplaçant LATENCIES.
+    # @param dht11_gpio Numéro de pin du capteur DHT11.
+    # @param thermometers Températures des sondes 1-wire, indexées par identifiant de sonde.
+    def __init__(self, latencies = None, dht11_gpio = 23, thermometers = None):
+        ## Latences du modèle de temps.
+        self.latencies = dict(LATENCIES)
+        self.latencies.update(latencies or {})
+        ## Le démon est toujours "connecté".
+        self.connected = True
+        ## Appareils I2C, indexés par adresse.
+        self.i2c_devices = {0x55: SimulatedMkrfox(self), 0x44: SimulatedAttiny(self), Bmp085.ADDRESS: SimulatedBmp085(self)}
+        ## Appareil branché sur l'UART.
+        self.serial_device = Sim800(self)
+        ## Capteurs DHT11, indexés par pin.
+        self.dht11 = {dht11_gpio: SimulatedDHT11(self, dht11_gpio)}
+        ## Températures des sondes 1-wire en °C, indexées par identifiant.
+        self.thermometers = thermometers if thermometers is not None else {"28-00000adfb15d": 22.5}
+        ## Bus 1-wire simulé, lu directement par onewire.OneWire.
+        self.w1 = SimulatedW1Bus(self.thermometers)
+        ## Callbacks enregistrés.
+        self.callbacks = []
+        ## Watchdogs des pins, en ms.
+        self.watchdogs = {}
+        ## Niveaux et modes des pins.
+        self.levels, self.modes = {}, {}
+        ## Handles ouverts (I2C, UART).
+        self.handles = {}
+        ## Temps simulé et nombre d'appels par type d'opération.
+        self.stats = {}
+
+    ## Attend la latence d'une opération et la comptabilise.
+    # @param kind Le type d'opération.
+    # @param duration La durée de l'opération.
+    def spend(self, kind, duration):
+        count, total = self.stats.get(kind, (0, 0))
+        self.stats[kind] = (count + 1, total + duration)
+        sleep(duration)
+
+    ## Renvoie le bilan des opérations simulées.
+    # @return Retourne un dictionnaire associant chaque type d'opération à (nombre d'appels, temps total).
+    def getStats(self):
+        return dict(self.stats)
+
+    ## Crée un nouveau handle.
+    # @param target L'objet associé au handle.
+    # @return Retourne le handle.
+    def open(self, target):
+        handle = len(self.handles)
+        self.handles[handle] = target
+        return handle
+
+    def i2c_open(self, bus, address, flags = 0):
+        return self.open(address)
+
+    def i2c_close(self, handle):
+        self.handles.pop(handle, None)
+
+    def i2c_write_device(self, handle, data):
+        self.spend("i2c", self.latencies["i2c_transaction"] + len(data) * self.latencies["i2c_byte"])
+        device = self.i2c_devices.get(self.handles[handle])
+        if device is None:
+            raise pigpio.error("I2C write failed")
+        device.write(data)
+        return 0
+
+    def i2c_read_device(self, handle, count):
+        self.spend("i2c", self.latencies["i2c_transaction"] + count * self.latencies["i2c_byte"])
+        device = self.i2c_devices.get(self.handles[handle])
+        if device is None:
+            raise pigpio.error("I2C read failed")
+        data = device.read(count)
+        return len(data), data
+
+    def serial_open(self, tty, baudrate, flags = 0):
+        return self.open(tty)
+
+    def serial_close(self, handle):
+        self.handles.pop(handle, None)
+
+    def serial_write(self, handle, data):
+        self.spend("uart", len(data) * self.latencies["uart_byte"])
+        self.serial_device.write(data)
+        return 0
+
+    def serial_data_available(self, handle):
+        return self.serial_device.available()
+
+    def serial_read(self, handle, count = 1000):
+        self.spend("uart", self.latencies["gpio"])
+        data = self.serial_device.read(count)
+        return len(data), data
+
+    def set_mode(self, gpio, mode):
+        self.spend("gpio", self.latencies["gpio"])
+        previous = self.modes.get(gpio)
+        self.modes[gpio] = mode
+        # Le DHT11 émet sa trame lorsque la pin est relâchée après l'impulsion de démarrage
+        if gpio in self.dht11 and mode == pigpio.INPUT and previous != pigpio.INPUT and self.levels.get(gpio) == 0:
+            Thread(target = self.dht11[gpio].emit, daemon = True).start()
+        return 0
+
+    def get_mode(self, gpio):
+        return self.modes.get(gpio, pigpio.INPUT)
+
+    def write(self, gpio, level):
+        self.spend("gpio", self.latencies["gpio"])
+        self.levels[gpio] = level
+        self.modes[gpio] = pigpio.OUTPUT
+        return 0
+
+    def read(self, gpio):
+        self.spend("gpio", self.latencies["gpio"])
+        return self.levels.get(gpio, 1)
+
+    def set_pull_up_down(self, gpio, pud):
+        self.spend("gpio", self.latencies["gpio"])
+        return 0
+
+    def set_watchdog(self, gpio, timeout):
+        self.spend("gpio", self.latencies["gpio"])
+        self.watchdogs[gpio] = timeout
+        return 0
+
+    def get_current_tick(self):
+        return int(monotonic() * 1000000) & 0xFFFFFFFF
+
+    def callback(self, gpio, edge = pigpio.RISING_EDGE, func = None):
+        callback = SimulatedCallback(self, gpio, edge, func)
+        self.callbacks.append(callback)
+        return callback
+
+    ## Transmet un changement de niveau d'une pin aux callbacks concernés.
+    # @param gpio Numéro de pin.
+    # @param level Nouveau niveau (0, 1 ou pigpio.TIMEOUT).
+    # @param tick Instant du changement, en µs.
+    def edge(self, gpio, level, tick):
+        for callback in list(self.callbacks):
+            if callback.gpio != gpio or callback.func is None:
+                continue
+            if level == pigpio.TIMEOUT or callback.edge == pigpio.EITHER_EDGE or (callback.edge == pigpio.RISING_EDGE) == (level == 1):
+                callback.func(gpio, level, tick)
+
+    def stop(self):
+        self.handles.clear()
+        self.w1.remove()
+
+
+## Mesure l'effet du suréchantillonnage sur le bruit de la pression publiée : pour chaque temps accordé, le baromètre simulé (bruité,
+# avec des mesures aberrantes) est lu plusieurs fois par Sensors.readBarometer et l'erreur quadratique moyenne de la valeur publiée est calculée.
+# @param logger Logger principal.
+# @param budgets Temps de suréchantillonnage à comparer, en secondes.
+# @param repeats Nombre de lectures pour chaque temps.
+# @param noise Écart-type du bruit de pression, en Pa.
+# @param spikes Probabilité d'une mesure aberrante.
+# @return Retourne une liste de dictionnaires (budget, mesures par lecture, durée d'une lecture, erreur en hPa).
+def benchmarkOversampling(logger, budgets = (0, 0.1, 0.25, 0.5, 1, 2), repeats = 20, noise = 6, spikes = 0.05):
+    # Imports locaux : sensors.py importe les pilotes réels
+    from sensors import Sensors
+    from acquisition import Acquisition
+    pi = SimulatedPi(thermometers = {})
+    barometer = SimulatedBmp085(pi, noise = noise, spikes = spikes, seed = 1)
+    pi.i2c_devices[Bmp085.ADDRESS] = barometer
+    results = []
+    for budget in budgets:
+        sensors = Sensors(config = None, pi = pi, logger = logger, logger_data = logger, init_nbtry = 1, w1_root = pi.w1.root, oversampling = {"Pressure": budget})
+        count, duration, error = 0, 0, 0
+        for i in range(repeats):
+            start = monotonic()
+            samples = sensors.readBarometer(Acquisition(logger, 10))
+            duration += monotonic() - start
+            count += len(samples) + samples.rejected
+            error += (samples.trimmedMean() - barometer.pressure / 100) ** 2
+        results.append({"budget": budget, "samples": count / repeats, "duration": duration / repeats, "error": (error / repeats) ** 0.5})
+    pi.stop()
+    return results
+
+
+if __name__ == "__main__":
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level = "WARNING")
+    for result in benchmarkOversampling(logger):
+        print("Suréchantillonnage " + str(result["budget"]) + " s : " + str(round(result["samples"], 1)) + " mesure(s) en " + str(round(result["duration"], 3)) +
+              " s, erreur quadratique moyenne " + str(round(result["error"], 3)) + " hPa")
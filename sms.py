@@ -0,0 +1,75 @@
+## @file sms.py
+# Définition de la classe SmsParser. Elle analyse au fil de l'eau les réponses +CMGL/+CMGR du module GSM en SMS structurés.
+##
+
+from collections import namedtuple
+import re
+
+## SMS reçu : indice dans la mémoire de la carte SIM, état ("REC UNREAD", "REC READ"...), numéro de l'expéditeur, horodatage et texte.
+SMS = namedtuple("SMS", ["index", "status", "number", "timestamp", "text"])
+
+## En-tête d'un SMS dans la réponse à +CMGL (avec indice) ou +CMGR (sans indice). Les SMS enregistrés (état "STO ...") n'ont pas d'horodatage.
+HEADER = re.compile(r'^\+CMG[LR]: (?:(\d+),)?"([^"]*)","([^"]*)",(?:"[^"]*"|[^,]*)(?:,"([^"]*)")?')
+## Préfixe de l'état des SMS reçus ("REC UNREAD", "REC READ"). Les autres (SMS enregistrés ou envoyés par le module) sont ignorés.
+RECEIVED = "REC"
+## Codes de résultat finaux terminant la réponse.
+FINAL_RESULT = re.compile(r"^(OK|ERROR|\+CMS ERROR:.*|\+CME ERROR:.*)$")
+
+## Classe SmsParser.
+# Cette classe reçoit les lignes de la réponse une à une et renvoie chaque SMS dès que son texte est complet,
+# sans conserver la réponse entière en mémoire. Le texte d'un SMS peut s'étendre sur plusieurs lignes et contenir des virgules.
+class SmsParser:
+
+    ## Constructeur.
+    # @param index Indice attribué aux SMS dont l'en-tête n'en contient pas (réponse à +CMGR).
+    def __init__(self, index = None):
+        ## Indice attribué aux SMS dont l'en-tête n'en contient pas.
+        self.index = index
+        ## En-tête du SMS en cours sous la forme (indice, état, numéro, horodatage), ou None.
+        self.header = None
+        ## Lignes de texte du SMS en cours.
+        self.lines = []
+        ## Indique si la ligne précédente était vide.
+        self.blank = True
+        ## Indique si le code de résultat final a été reçu.
+        self.done = False
+        ## Code de résultat final reçu.
+        self.result = None
+        ## Indices des entrées ignorées parce qu'il ne s'agit pas de SMS reçus.
+        self.ignored = []
+
+    ## Termine le SMS en cours.
+    # @return Retourne le SMS, ou None s'il n'y en avait pas ou s'il ne s'agit pas d'un SMS reçu.
+    def flush(self):
+        if self.header is None:
+            return None
+        while self.lines and self.lines[-1] == "":
+            self.lines.pop()
+        index, status, number, timestamp = self.header
+        sms = SMS(int(index) if index is not None else self.index, status, number, timestamp or "", "\n".join(self.lines))
+        self.header = None
+        self.lines = []
+        if not status.startswith(RECEIVED):
+            if sms.index is not None:
+                self.ignored.append(sms.index)
+            return None
+        return sms
+
+    ## Analyse une ligne de la réponse.
+    # @param line La ligne, sans le "\r\n" final.
+    # @return Retourne le SMS terminé par cette ligne, ou None.
+    def feed(self, line):
+        sms = None
+        match = HEADER.match(line)
+        # Un code de résultat n'est final qu'en dehors du texte d'un SMS : après une ligne vide ou sans SMS en cours
+        if (self.header is None or (self.blank and self.lines)) and FINAL_RESULT.match(line):
+            sms = self.flush()
+            self.done = True
+            self.result = line
+        elif match:
+            sms = self.flush()
+            self.header = match.groups()
+        elif self.header is not None:
+            self.lines.append(line)
+        self.blank = line == ""
+        return sms
@@ -0,0 +1,45 @@
+## @file smsbudget.py
+# Définition de la classe SmsBudget. Elle limite le nombre de SMS envoyés et le temps passé à répondre pendant un cycle, selon la charge de la batterie.
+##
+
+from time import monotonic
+
+## Classe SmsBudget.
+# Cette classe attribue à chaque cycle un budget d'envois et de temps proportionnel à la marge entre la tension de la batterie et le seuil d'alerte.
+# Batterie pleine, le budget est complet ; proche du seuil, il se réduit au minimum réservé aux réponses prioritaires.
+class SmsBudget:
+
+    ## Nombre maximal de SMS envoyés par cycle, batterie pleine.
+    MAX_SENDS = 20
+    ## Temps maximal (en secondes) passé à envoyer des SMS par cycle, batterie pleine.
+    MAX_TIME = 180
+    ## Nombre minimal de SMS envoyés par cycle, quelle que soit la batterie (réponse au numéro maître).
+    MIN_SENDS = 1
+    ## Temps minimal (en secondes) accordé par cycle, quelle que soit la batterie.
+    MIN_TIME = 30
+    ## Marge (en mV) au-dessus du seuil d'alerte à partir de laquelle le budget est complet.
+    FULL_MARGIN = 1000
+    ## Fraction du budget accordée lorsque la tension de la batterie est inconnue (lecture à 0).
+    UNKNOWN_RATIO = 0.5
+
+    ## Constructeur.
+    # @param battery La tension de la batterie en mV, 0 si elle est inconnue.
+    # @param limit Le seuil d'alerte de la batterie en mV.
+    # @param max_sends Nombre maximal de SMS, batterie pleine. La valeur par défaut est MAX_SENDS.
+    # @param max_time Temps maximal en secondes, batterie pleine. La valeur par défaut est MAX_TIME.
+    def __init__(self, battery, limit, max_sends = MAX_SENDS, max_time = MAX_TIME):
+        ## Fraction du budget accordée.
+        self.ratio = self.UNKNOWN_RATIO if battery == 0 else min(1, max(0, (battery - limit) / self.FULL_MARGIN))
+        ## Nombre de SMS restant à envoyer.
+        self.sends = max(self.MIN_SENDS, round(max_sends * self.ratio))
+        ## Instant au-delà duquel plus aucun SMS n'est envoyé.
+        self.deadline = monotonic() + max(self.MIN_TIME, max_time * self.ratio)
+
+    ## Indique si un SMS peut encore être envoyé.
+    # @return Retourne True s'il reste des envois et du temps.
+    def allow(self):
+        return self.sends > 0 and monotonic() < self.deadline
+
+    ## Décompte un SMS envoyé.
+    def spend(self):
+        self.sends -= 1
@@ -0,0 +1,17 @@
+## @file conftest.py
+# Configuration commune des tests : les modules de la station sont à la racine du dépôt.
+##
+
+import os
+import sys
+
+import pytest
+from loguru import logger
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+## Logger des tests, sans sortie.
+@pytest.fixture
+def log():
+    logger.remove()
+    return logger
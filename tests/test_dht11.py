@@ -0,0 +1,63 @@
+## @file test_dht11.py
+# Tests du décodage des trames du DHT11 (dht11.decode) sur des traces de fronts générées par SimulatedDHT11.
+##
+
+from array import array
+
+import pytest
+
+from dht11 import decode, BAD_PULSE
+from simulation import SimulatedDHT11
+
+
+## Convertit une liste de fronts (niveau, durée depuis le front précédent) en ticks et niveaux, comme les enregistre DHT11.
+# @param edges La liste des fronts.
+# @param start Tick du premier front, proche du débordement 32 bits par défaut.
+# @return Retourne un tuple (ticks, niveaux, nombre de fronts).
+def trace(edges, start = 0xFFFFF000):
+    ticks, levels = array("L"), bytearray()
+    tick = start
+    for level, duration in edges:
+        tick = (tick + duration) & 0xFFFFFFFF
+        ticks.append(tick)
+        levels.append(level)
+    return ticks, levels, len(edges)
+
+
+def test_valid_frame():
+    edges = SimulatedDHT11(None, 23, humidity = 55, temperature = 19).edges()
+    assert decode(*trace(edges)) == bytes([55, 0, 19, 0, 74])
+
+
+@pytest.mark.parametrize("start", [0, 0xFFFFFFFF - 500])
+def test_valid_frame_across_tick_wrap(start):
+    edges = SimulatedDHT11(None, 23, humidity = 80, temperature = 3).edges()
+    assert decode(*trace(edges, start)) == bytes([80, 0, 3, 0, 83])
+
+
+def test_start_pulse_edge_is_ignored():
+    # Front descendant de l'impulsion de démarrage enregistré avant la réponse du capteur
+    edges = [(0, 0)] + SimulatedDHT11(None, 23).edges()
+    assert decode(*trace(edges)) == bytes([45, 0, 21, 0, 66])
+
+
+def test_checksum_failure():
+    edges = SimulatedDHT11(None, 23).edges()
+    # Inverse le dernier bit de la somme de contrôle
+    level, duration = edges[-2]
+    edges[-2] = (level, 26 if duration == 70 else 70)
+    assert decode(*trace(edges)) is None
+
+
+def test_truncated_trace():
+    edges = SimulatedDHT11(None, 23).edges()
+    assert decode(*trace(edges[:40])) is None
+    assert decode(array("L"), bytearray(), 0) is None
+
+
+def test_bad_pulse():
+    edges = SimulatedDHT11(None, 23).edges()
+    level, _ = edges[21]
+    assert level == 0 # Fin de l'impulsion haute d'un bit de données
+    edges[21] = (level, BAD_PULSE)
+    assert decode(*trace(edges)) is None
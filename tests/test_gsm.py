@@ -0,0 +1,44 @@
+## @file test_gsm.py
+# Tests des réponses aux SMS de la classe Gsm, sur l'émulateur du SIM800.
+##
+
+import pytest
+
+from config import ConfigFile
+from gsm import Gsm
+from simulation import SimulatedPi
+
+## Latences réduites de l'émulateur, pour des tests rapides.
+FAST = {"modem_response": 0.001, "uart_byte": 0, "gprs_bearer": 0.001, "sms_send": 0.001}
+
+
+@pytest.fixture
+def gsm(tmp_path, log):
+    pi = SimulatedPi(latencies = FAST)
+    return Gsm(config = ConfigFile(str(tmp_path / "config.ini")), pi = pi, logger = log, queue_filename = str(tmp_path / "sms_queue.json"))
+
+
+def test_battery_alert_does_not_starve_master_reply(gsm):
+    modem = gsm.pi.serial_device
+    master = gsm.config.getGsmMaster()
+    limit = gsm.config.getBatteryLimit()
+    modem.receiveSMS(master, "altitude?", notify = None)
+    # Batterie au seuil : le budget du cycle se réduit à une seule réponse
+    gsm.respondToSMS({"Battery": limit, "Time": "10h00"})
+    assert [number for (number, text) in modem.outbox] == [master, master]
+    assert "La tension de la batterie" in modem.outbox[0][1]
+    assert "La tension de la batterie" not in modem.outbox[1][1]
+    assert gsm.pending_replies == []
+
+
+def test_stale_stored_sms_is_deleted_after_full_listing(gsm):
+    modem = gsm.pi.serial_device
+    # SMS enregistré par +CMGW et resté sur la carte SIM (coupure pendant l'envoi d'un bulletin)
+    stale = gsm.storeSMS("Bulletin")
+    modem.receiveSMS("+33600000001", "altitude?", notify = None)
+    assert gsm.countSMS() == 2
+    gsm.respondToSMS({"Battery": 13000, "Time": "10h00"})
+    assert [number for (number, text) in modem.outbox] == ["+33600000001"]
+    assert stale not in modem.drafts
+    # Carte SIM vide : le cycle suivant n'a plus besoin de la lire en entier
+    assert gsm.countSMS() == 0
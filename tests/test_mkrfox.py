@@ -0,0 +1,55 @@
+## @file test_mkrfox.py
+# Tests de la détection de redémarrage du MKRFOX, sur l'émulateur du bus I2C.
+##
+
+import threading
+
+import pytest
+
+from mkrfox import Mkrfox
+from simulation import SimulatedPi
+
+## Configuration écrite sur le MKRFOX au cycle précédent.
+CONFIG = {"sleep": 10, "wakeup": 7, "battery_threshold": 11500}
+
+
+## MKRFOX émulé dont la configuration a déjà été transmise.
+@pytest.fixture
+def mkrfox(log):
+    pi = SimulatedPi()
+    mkrfox = Mkrfox(pi, 0x55, log, 1)
+    mkrfox.i2c_bus.profile["timeout"] = 0
+    mkrfox.updateConfig(CONFIG)
+    assert mkrfox.flush()
+    return mkrfox
+
+
+def test_unchanged_config_is_not_a_reset(mkrfox):
+    assert not mkrfox.detectReset()
+    assert mkrfox.pending == {}
+
+
+def test_default_config_forces_resync(mkrfox):
+    mkrfox.i2c_bus.pi.i2c_devices[0x55].values[Mkrfox.register["sleep"][0]] = 0
+    assert mkrfox.detectReset()
+    assert mkrfox.pending == CONFIG
+
+
+def test_failed_read_back_is_not_a_reset(mkrfox):
+    del mkrfox.i2c_bus.pi.i2c_devices[0x55]
+    assert mkrfox.readGroup("config") is None
+    assert not mkrfox.detectReset()
+    assert mkrfox.pending == {}
+
+
+def test_concurrent_reads_are_not_interleaved(mkrfox):
+    # Le thread d'attente de l'heure Sigfox lit le registre d'état pendant que le thread principal lit la configuration
+    device = mkrfox.i2c_bus.pi.i2c_devices[0x55]
+    state = device.values[Mkrfox.register["state"][0]]
+    results = []
+    thread = threading.Thread(target = lambda: results.extend(mkrfox.read("state") for i in range(10)))
+    thread.start()
+    configs = [mkrfox.readGroup("config") for i in range(10)]
+    thread.join()
+    assert results == [state] * 10
+    assert configs == [CONFIG] * 10
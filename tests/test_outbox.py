@@ -0,0 +1,115 @@
+## @file test_outbox.py
+# Tests de la file des observations (Outbox) et de leur publication HTTP par la classe Gsm, sur l'émulateur du SIM800.
+##
+
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from config import ConfigFile
+from gsm import Gsm
+from outbox import Outbox
+from simulation import SimulatedPi
+
+## Latences réduites de l'émulateur, pour des tests rapides.
+FAST = {"modem_response": 0.001, "uart_byte": 0, "gprs_bearer": 0.001, "sms_send": 0.001}
+
+
+## Serveur HTTP local : enregistre les lots reçus et répond avec les statuts de la liste "statuses" (200 une fois la liste épuisée).
+@pytest.fixture
+def server():
+    received, statuses = [], []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append((self.headers.get("Content-Encoding"), json.loads(gzip.decompress(body))))
+            self.send_response(statuses.pop(0) if statuses else 200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target = httpd.serve_forever, daemon = True)
+    thread.start()
+    httpd.url = "http://127.0.0.1:" + str(httpd.server_port) + "/observations"
+    httpd.received, httpd.statuses = received, statuses
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def gsm(tmp_path, log):
+    pi = SimulatedPi(latencies = FAST)
+    return Gsm(config = ConfigFile(str(tmp_path / "config.ini")), pi = pi, logger = log, queue_filename = str(tmp_path / "sms_queue.json"))
+
+
+def test_add_and_persist(tmp_path, log):
+    filename = str(tmp_path / "outbox.jsonl")
+    outbox = Outbox(filename, log)
+    outbox.add({"Time": "10h00", "Temperature": 21.5})
+    outbox.add({"Time": "10h10", "Temperature": 21.7})
+    # Une nouvelle instance relit les observations depuis le fichier
+    assert Outbox(filename, log).pending() == [{"Time": "10h00", "Temperature": 21.5}, {"Time": "10h10", "Temperature": 21.7}]
+
+
+def test_max_size_drops_oldest(tmp_path, log):
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"), log, max_size = 3)
+    for i in range(5):
+        outbox.add({"n": i})
+    assert [observation["n"] for observation in outbox.pending()] == [2, 3, 4]
+
+
+def test_batches_and_acknowledge(tmp_path, log):
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"), log)
+    for i in range(5):
+        outbox.add({"n": i})
+    assert [[observation["n"] for observation in batch] for batch in outbox.batches(2)] == [[0, 1], [2, 3], [4]]
+    outbox.acknowledge(2)
+    assert [observation["n"] for observation in outbox.pending()] == [2, 3, 4]
+
+
+def test_encode_is_gzipped_json():
+    assert json.loads(gzip.decompress(Outbox.encode([{"n": 1}]))) == [{"n": 1}]
+
+
+def test_upload(tmp_path, gsm, server):
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"), gsm.logger)
+    for i in range(5):
+        outbox.add({"n": i})
+    assert gsm.uploadOutbox(outbox, "apn", server.url, batch_size = 2) == 5
+    assert [batch for (_, batch) in server.received] == [[{"n": 0}, {"n": 1}], [{"n": 2}, {"n": 3}], [{"n": 4}]]
+    assert all(encoding == "gzip" for (encoding, _) in server.received)
+    assert outbox.pending() == []
+    # Une seule session GPRS pour tous les lots, fermée à la fin
+    modem = gsm.pi.serial_device
+    assert modem.bearer_setups == 1 and not modem.bearer
+
+
+def test_resend_after_failed_post(tmp_path, gsm, server):
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"), gsm.logger)
+    for i in range(4):
+        outbox.add({"n": i})
+    server.statuses.extend([200, 500])
+    # Le premier lot est acquitté, le second échoue : il reste dans la file
+    assert gsm.uploadOutbox(outbox, "apn", server.url, batch_size = 2) == 2
+    assert [observation["n"] for observation in outbox.pending()] == [2, 3]
+    # Session suivante : la publication reprend au lot non acquitté
+    assert gsm.uploadOutbox(outbox, "apn", server.url, batch_size = 2) == 2
+    assert [batch for (_, batch) in server.received] == [[{"n": 0}, {"n": 1}], [{"n": 2}, {"n": 3}], [{"n": 2}, {"n": 3}]]
+    assert outbox.pending() == []
+
+
+def test_upload_without_network(tmp_path, gsm, server):
+    outbox = Outbox(str(tmp_path / "outbox.jsonl"), gsm.logger)
+    outbox.add({"n": 0})
+    gsm.pi.serial_device.registered = False
+    assert gsm.uploadOutbox(outbox, "apn", server.url) == 0
+    assert server.received == []
+    assert len(outbox.pending()) == 1
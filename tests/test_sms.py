@@ -0,0 +1,43 @@
+## @file test_sms.py
+# Tests de l'analyse des réponses +CMGL/+CMGR (sms.SmsParser).
+##
+
+from sms import SmsParser
+
+
+## Analyse une réponse complète.
+# @param lines Les lignes de la réponse.
+# @param index Indice attribué aux SMS sans indice (+CMGR).
+# @return Retourne le tuple (SMS renvoyés, analyseur).
+def parse(lines, index = None):
+    parser = SmsParser(index)
+    messages = [sms for sms in map(parser.feed, lines) if sms is not None]
+    return messages, parser
+
+
+def test_cmgl_multiline_text():
+    messages, parser = parse(['+CMGL: 1,"REC UNREAD","+33600000001","","24/05/01,10:00:00+08"', "Meteo, svp", "",
+                              '+CMGL: 2,"REC READ","+33600000002","","24/05/01,10:01:00+08"', "ligne 1", "ligne 2", "", "OK"])
+    assert [(sms.index, sms.number, sms.text) for sms in messages] == [(1, "+33600000001", "Meteo, svp"), (2, "+33600000002", "ligne 1\nligne 2")]
+    assert messages[0].timestamp == "24/05/01,10:00:00+08"
+    assert parser.done and parser.result == "OK"
+
+
+def test_cmgl_skips_stored_entries():
+    # Les SMS enregistrés par +CMGW n'ont pas d'horodatage et ne sont pas des SMS reçus
+    messages, parser = parse(['+CMGL: 1,"REC UNREAD","+33600000001","","24/05/01,10:00:00+08"', "aide?", "",
+                              '+CMGL: 2,"STO UNSENT","",""', "Bulletin meteo", "",
+                              '+CMGL: 3,"REC UNREAD","+33600000003","","24/05/01,10:02:00+08"', "nom?", "", "OK"])
+    assert [(sms.index, sms.text) for sms in messages] == [(1, "aide?"), (3, "nom?")]
+    assert parser.ignored == [2]
+    assert parser.result == "OK"
+
+
+def test_cmgr_uses_given_index():
+    messages, _ = parse(['+CMGR: "REC READ","+33600000001","","24/05/01,10:00:00+08"', "altitude?", "", "OK"], index = 7)
+    assert [(sms.index, sms.status, sms.text) for sms in messages] == [(7, "REC READ", "altitude?")]
+
+
+def test_cmgr_error():
+    messages, parser = parse(["+CMS ERROR: 321"], index = 7)
+    assert messages == [] and parser.result == "+CMS ERROR: 321"
@@ -0,0 +1,139 @@
+## @file timesync.py
+# Définition de la classe TimeSync. Elle choisit la meilleure source d'heure disponible (GSM, Sigfox, MKRFOX) et règle l'horloge système, sans lancer de sous-processus lorsque le droit CAP_SYS_TIME est accordé.
+##
+
+from threading import Thread, Lock
+from time import sleep, monotonic
+import subprocess
+import time
+
+## Classe TimeSync.
+# Cette classe recueille les heures proposées par les différentes sources, les classe par qualité puis par fraîcheur,
+# et règle l'horloge système directement avec clock_settime, ou avec "sudo date" si le processus n'a pas le droit CAP_SYS_TIME. L'attente de l'heure Sigfox se fait dans un thread
+# avec un délai maximal, pendant que le cycle continue.
+class TimeSync:
+
+    ## Qualité de chaque source d'heure : l'heure réseau GSM et Sigfox est préférée à l'horloge du MKRFOX, qui dérive entre deux synchronisations.
+    quality = {"gsm": 3, "sigfox": 2, "mkrfox": 1}
+
+    ## Plus petit timestamp UNIX plausible (1er janvier 2020). Les heures antérieures (horloge non initialisée) sont ignorées.
+    MIN_EPOCH = 1577836800
+
+    ## Bit d'état positionné par le MKRFOX lorsque l'heure Sigfox est disponible.
+    SIGFOX_READY = 0b00000010
+
+    ## Intervalle entre deux lectures du registre d'état pendant l'attente de l'heure Sigfox.
+    SIGFOX_POLL = 1
+
+    ## Constructeur.
+    # @param logger Logger principal.
+    # @param dry_run Si True, l'horloge système n'est pas modifiée (mode simulation).
+    def __init__(self, logger, dry_run = False):
+        ## Logger principal.
+        self.logger = logger
+        ## L'horloge système n'est pas modifiée.
+        self.dry_run = dry_run
+        ## Heures proposées, indexées par source : (timestamp UNIX, instant monotone de la lecture).
+        self.candidates = {}
+        ## Source de la dernière heure appliquée.
+        self.applied = None
+        ## Verrou protégeant les heures proposées, alimentées aussi par le thread Sigfox.
+        self.lock = Lock()
+        ## Thread d'attente de l'heure Sigfox.
+        self.sigfox_thread = None
+
+    ## Propose une heure lue sur une source.
+    # @param source Nom de la source ("gsm", "sigfox" ou "mkrfox").
+    # @param epoch Timestamp UNIX lu sur la source. Les valeurs non plausibles (0 en cas d'erreur) sont ignorées.
+    # @return Retourne True si l'heure a été retenue.
+    def offer(self, source, epoch):
+        if epoch is None or epoch < self.MIN_EPOCH:
+            self.logger.error("Heure non valide reçue de la source " + source + " : " + str(epoch))
+            return False
+        with self.lock:
+            self.candidates[source] = (epoch, monotonic())
+        return True
+
+    ## Renvoie la meilleure source disponible, classée par qualité puis par fraîcheur de la lecture.
+    # @return Retourne un tuple (source, timestamp UNIX actuel estimé) ou None si aucune heure n'est disponible.
+    def best(self):
+        with self.lock:
+            if not self.candidates:
+                return None
+            source = max(self.candidates, key = lambda name: (self.quality[name], self.candidates[name][1]))
+            epoch, read_at = self.candidates[source]
+        # L'heure lue est avancée du temps écoulé depuis la lecture
+        return (source, epoch + (monotonic() - read_at))
+
+    ## Règle l'horloge système sur la meilleure source disponible, si elle est différente de la dernière appliquée.
+    # @return Retourne la source appliquée, ou None si aucune heure n'est disponible.
+    def apply(self):
+        best = self.best()
+        if best is None:
+            self.logger.error("Aucune source d'heure disponible")
+            return None
+        source, epoch = best
+        if source != self.applied and self.setClock(epoch):
+            self.applied = source
+            self.logger.success("Date et heure actualisées depuis la source " + source)
+        return self.applied
+
+    ## Règle l'horloge système avec clock_settime, ou avec "sudo date" si le processus n'a pas le droit CAP_SYS_TIME.
+    # @param epoch Timestamp UNIX à appliquer.
+    # @return Retourne True si l'horloge a été réglée.
+    def setClock(self, epoch):
+        if self.dry_run:
+            self.logger.info("Simulation, horloge non modifiée : " + str(round(epoch)))
+            return True
+        try:
+            time.clock_settime(time.CLOCK_REALTIME, epoch)
+            return True
+        except PermissionError:
+            self.logger.info("Droit CAP_SYS_TIME absent, réglage de l'horloge avec sudo date")
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de régler l'horloge système")
+            return False
+        try:
+            subprocess.run(["sudo", "-n", "date", "-s", "@" + str(round(epoch))], check = True, stdout = subprocess.DEVNULL, timeout = 10)
+            return True
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible de régler l'horloge système avec sudo date")
+            return False
+
+    ## Attend que le MKRFOX ait obtenu l'heure du réseau Sigfox, puis la propose.
+    # @param mkrfox Instance Mkrfox. Le registre time doit déjà avoir été mis à 0 pour déclencher la demande.
+    # @param deadline Instant monotone au-delà duquel l'attente est abandonnée.
+    def waitSigfox(self, mkrfox, deadline):
+        try:
+            state = mkrfox.read("state")
+            while state & self.SIGFOX_READY == 0:
+                if monotonic() + self.SIGFOX_POLL > deadline:
+                    self.logger.error("Heure Sigfox non reçue avant le délai maximal")
+                    return
+                sleep(self.SIGFOX_POLL)
+                state = mkrfox.read("state")
+            if self.offer("sigfox", mkrfox.read("time")):
+                self.logger.success("Heure reçue du module SigFox")
+            mkrfox.write("state", state & ~self.SIGFOX_READY)
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Impossible d'actualiser l'heure depuis le module SigFox")
+
+    ## Lance l'attente de l'heure Sigfox dans un thread.
+    # @param mkrfox Instance Mkrfox.
+    # @param timeout Temps maximal d'attente en secondes.
+    def startSigfox(self, mkrfox, timeout):
+        self.logger.info("Tentative d'actualiser l'heure depuis le module SigFox...")
+        mkrfox.write("time", 0) # On signale au MKRFOX de récupérer l'heure par le module Sigfox
+        self.sigfox_thread = Thread(target = self.waitSigfox, args = (mkrfox, monotonic() + timeout), daemon = True)
+        self.sigfox_thread.start()
+
+    ## Attend la fin de l'attente de l'heure Sigfox, s'il y en a une, puis applique la meilleure source.
+    # @return Retourne la source appliquée, ou None si aucune heure n'est disponible.
+    def finish(self):
+        if self.sigfox_thread is not None:
+            self.sigfox_thread.join()
+            self.sigfox_thread = None
+        return self.apply()
@@ -6,13 +6,13 @@ import logging
 import os
 import re
 import wave
+from functools import lru_cache
 from pathlib import Path
-from shlex import quote
 from shutil import which
 from struct import pack
-from subprocess import PIPE, run
+from subprocess import DEVNULL, PIPE, Popen, TimeoutExpired, run
 from sys import platform
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
 from typing import Union
 
 from .phonemes import BritishEnglishPhonemes, GermanPhonemes, FrenchPhonemes, \
@@ -71,9 +71,9 @@ class Voice:
         mbrola_binary = 'mbrola'
         mbrola_voices_folder = "/usr/share/mbrola"
     elif platform == 'win32':
-        # If the path has spaces it needs to be enclosed in double quotes.
-        espeak_binary = '"C:\\Program Files (x86)\\eSpeak\\command_line\\espeak"'
-        mbrola_binary = '"C:\\Program Files (x86)\\Mbrola Tools\\mbrola"'
+        # Binaries are run without a shell, so paths with spaces need no quoting.
+        espeak_binary = 'C:\\Program Files (x86)\\eSpeak\\command_line\\espeak'
+        mbrola_binary = 'C:\\Program Files (x86)\\Mbrola Tools\\mbrola'
         mbrola_voices_folder = os.path.expanduser('~\\.mbrola\\')
 
         if not os.path.exists(mbrola_voices_folder):
@@ -144,8 +144,23 @@ class Voice:
         # default to 1 if no voice are found (although it'll probably fail then)
         return 1
 
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _which(binary: str) -> Optional[str]:
+        """Resolves a binary to its full path once per process"""
+        return which(binary)
+
     def _mbrola_exists(self):
-        return which(self.mbrola_binary) is not None
+        return self._which(self.mbrola_binary) is not None
+
+    @staticmethod
+    def _env() -> Optional[Dict[str, str]]:
+        """Environment of the espeak and mbrola processes.
+        On Linux, MALLOC_CHECK_=0 tells the C library to ignore allocation
+        problems (which happen but don't compromise espeak's outputs)"""
+        if platform in ('linux', 'darwin'):
+            return dict(os.environ, MALLOC_CHECK_='0')
+        return None
 
     @property
     def player(self):
@@ -163,7 +178,7 @@ class Voice:
         return wav[:4] + pack('<I', len(wav) - 8) + wav[8:40] + pack('<I', len(
             wav) - 44) + wav[44:]
 
-    def _str_to_phonemes(self, text: str) -> PhonemeList:
+    def _espeak_args(self) -> List[str]:
         espeak_voice_name_template = ('mb/mb-%s%d'
                                       if platform in ('linux', 'darwin')
                                       else 'mb-%s%d')
@@ -171,35 +186,18 @@ class Voice:
 
         # Detailed explanation of options:
         # http://espeak.sourceforge.net/commands.html
-        phoneme_synth_args = [
-            self.espeak_binary,
+        # The text is written to espeak's stdin, so it is never parsed
+        # by a shell nor mistaken for an option.
+        return [
+            self._which(self.espeak_binary) or self.espeak_binary,
             '-s', str(self.speed),
             '-p', str(self.pitch),
             '--pho',  # outputs mbrola phoneme data
             '-q',  # quiet mode
             '-v', voice_filename,
-            '%s' % text]
-
-        # Linux-specific memory management setting
-        # Tells Clib to ignore allocations problems (which happen but doesn't
-        # compromise espeak's outputs)
-        if platform in ('linux', 'darwin'):
-            phoneme_synth_args.insert(0, 'MALLOC_CHECK_=0')
+            '--stdin']
 
-        logging.debug("Running espeak command %s"
-                      % " ".join(phoneme_synth_args))
-
-        # Since MALLOC_CHECK_ has to be used before anything else,
-        # we need to compile the full command as a single
-        # string and we need to use `shell=True`.
-        return PhonemeList.from_pho_str(
-            run(' '.join(phoneme_synth_args), shell=True, stdout=PIPE,
-                stderr=PIPE)
-                .stdout
-                .decode("utf-8")
-                .strip())
-
-    def _phonemes_to_audio(self, phonemes: PhonemeList) -> bytes:
+    def _mbrola_args(self) -> List[str]:
         voice_path_template = ('%s/%s%d/%s%d'
                                if platform in ("linux", "darwin")
                                else '%s\\%s%d\\%s%d')
@@ -207,8 +205,8 @@ class Voice:
                              % (self.mbrola_voices_folder, self.lang,
                                 self.voice_id, self.lang, self.voice_id))
 
-        audio_synth_string = [
-            self.mbrola_binary,
+        return [
+            self._which(self.mbrola_binary) or self.mbrola_binary,
             '-v', str(self.volume),
             '-e',  # ignores fatal errors on unknown diphone
             voice_phonemic_db,
@@ -216,38 +214,93 @@ class Voice:
             '-.wav'  # output file; `-` instead of a file means stdout
         ]
 
-        if platform in ('linux', 'darwin'):
-            audio_synth_string.insert(0, 'MALLOC_CHECK_=0')
+    def _str_to_phonemes(self, text: str) -> PhonemeList:
+        phoneme_synth_args = self._espeak_args()
+        logging.debug("Running espeak command %s"
+                      % " ".join(phoneme_synth_args))
+        return PhonemeList.from_pho_str(
+            run(phoneme_synth_args, stdout=PIPE, stderr=DEVNULL,
+                input=text.encode("utf-8"), env=self._env())
+                .stdout
+                .decode("utf-8")
+                .strip())
 
+    def _phonemes_to_audio(self, phonemes: PhonemeList) -> bytes:
+        audio_synth_args = self._mbrola_args()
         logging.debug(
-            "Running mbrola command %s" % " ".join(audio_synth_string))
+            "Running mbrola command %s" % " ".join(audio_synth_args))
         return self._wav_format(
-            run(" ".join(audio_synth_string), shell=True, stdout=PIPE,
-                stderr=PIPE, input=str(phonemes).encode("utf-8")).stdout)
+            run(audio_synth_args, stdout=PIPE, stderr=DEVNULL,
+                input=str(phonemes).encode("utf-8"), env=self._env()).stdout)
 
-    def _str_to_audio(self, text: str) -> bytes:
+    def _check_mbrola(self):
+        if not self._mbrola_exists():
+            raise RuntimeError("Can't synthesize sound: mbrola executable is "
+                               "not present. "
+                               "Install using apt get install mbrola or from"
+                               "the official mbrola repository on github")
 
-        phonemes_list = self._str_to_phonemes(text)
-        audio = self._phonemes_to_audio(phonemes_list)
+    def stream_audio(self, text: str, chunk_size: int = 4096) -> Iterator[bytes]:
+        """Renders a str to wave data, yielding chunks as mbrola produces them.
+        espeak's phoneme output is fed to mbrola through an OS pipe, without
+        going through Python. The first chunk holds the whole 44-byte header,
+        whose size fields are the placeholders written by mbrola since the
+        length of the audio is not known in advance."""
+        self._check_mbrola()
+        env = self._env()
+        espeak_args, mbrola_args = self._espeak_args(), self._mbrola_args()
+        logging.debug("Running espeak command %s | mbrola command %s"
+                      % (" ".join(espeak_args), " ".join(mbrola_args)))
+        espeak = Popen(espeak_args, stdin=PIPE, stdout=PIPE, stderr=DEVNULL,
+                       env=env)
+        try:
+            mbrola = Popen(mbrola_args, stdin=espeak.stdout, stdout=PIPE,
+                           stderr=DEVNULL, env=env)
+        except Exception:
+            espeak.kill()
+            espeak.wait()
+            raise
+        # mbrola holds the read end now: closing ours lets espeak get
+        # SIGPIPE if mbrola exits early
+        espeak.stdout.close()
+        try:
+            espeak.stdin.write(text.encode("utf-8"))
+            espeak.stdin.close()
+            pending = b''
+            while True:
+                chunk = mbrola.stdout.read1(chunk_size)
+                if not chunk:
+                    break
+                pending += chunk
+                if len(pending) >= 44:
+                    yield pending
+                    pending = b''
+            if pending:
+                yield pending
+        finally:
+            mbrola.stdout.close()
+            for process in (mbrola, espeak):
+                try:
+                    process.wait(timeout=1)
+                except TimeoutExpired:
+                    process.kill()
+                    process.wait()
 
-        return audio
+    def _str_to_audio(self, text: str) -> bytes:
+        return self._wav_format(b''.join(self.stream_audio(text)))
 
     def to_phonemes(self, text: str) -> PhonemeList:
-        return self._str_to_phonemes(quote(text))
+        return self._str_to_phonemes(text)
 
     def to_audio(self, speech: Union[PhonemeList, str], filename=None) -> bytes:
         """Renders a str or a `PhonemeList` to a wave byte object.
         If a filename is specified, it saves the audio file to wave as well
         Throws a `InvalidVoiceParameters` if the voice isn't found"""
 
-        if not self._mbrola_exists():
-            raise RuntimeError("Can't synthesize sound: mbrola executable is "
-                               "not present. "
-                               "Install using apt get install mbrola or from"
-                               "the official mbrola repository on github")
+        self._check_mbrola()
 
         if isinstance(speech, str):
-            wav = self._str_to_audio(quote(speech))
+            wav = self._str_to_audio(speech)
         elif isinstance(speech, PhonemeList):
             wav = self._phonemes_to_audio(speech)
 
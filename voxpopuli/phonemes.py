@@ -1,7 +1,7 @@
 
 """Objects and functions used for parsing and manipulating mbrola phonemes"""
 from typing import Tuple, List, Union, Iterable
-from collections import MutableSequence
+from collections.abc import MutableSequence
 
 
 def pairwise(iterable):